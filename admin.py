@@ -0,0 +1,705 @@
+"""Admin-only handlers for TAP&EAT.
+
+Imported lazily by boot.admin_features() the first time the admin opens the
+panel, so none of this is loaded on a cold start.
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from config import ADMIN_ID
+import runtime
+from runtime import store, shutdown_hooks
+from boot import (
+    format_order_for_admin, order_actions_keyboard, order_deadlines, catalog, backups, loop_monitor, admission,
+    renders
+)
+from catalog import diff_catalog, parse_catalog_file
+from charts import ChartCache, time_bucket
+from analytics import PEAK_HOURS_DAYS, PERIODS, format_peak_hours, format_period_report, since_bucket
+from storage import ROLLUP_FIELDS
+from models import Order
+from exports import EXPORT_HELP, describe_filters, export_to_file, parse_export_args
+from delivery import plan_delivery_runs
+from notifications import send_many
+from profiling import PROFILE_MAX_SECONDS, folded, hottest_frames, sample_stacks
+
+# Customer message per new status, shared by single and bulk updates
+STATUS_MESSAGES = {
+    'accepted': 'accepted ✅\n\nYour order is being prepared!',
+    'rejected': 'rejected ❌\n\nPlease contact admin for details.',
+    'delivered': 'delivered 🚚\n\nEnjoy your meal!'
+}
+
+# Bulk action -> (new status, statuses it applies to)
+BULK_ACTIONS = {
+    'accept': ('accepted', ('pending',)),
+    'reject': ('rejected', ('pending',)),
+    'deliver': ('delivered', ('pending', 'accepted')),
+}
+BULK_LIST_SIZE = 30
+
+def status_update_text(order_id, order_code, status):
+    status_msg = STATUS_MESSAGES.get(status, f'{status}')
+    return f"📢 Order Update!\n\nOrder #{order_id} ({order_code}) has been {status_msg}\n\nThank you for using TAP&EAT!"
+
+chart_cache = ChartCache()
+shutdown_hooks.append(chart_cache.close)
+runtime.metrics['charts'] = chart_cache.metrics
+
+# ===================== KEYBOARDS =====================
+def admin_keyboard():
+    """Create admin panel keyboard"""
+    keyboard = [
+        [InlineKeyboardButton("📊 View Orders", callback_data='view_orders')],
+        [InlineKeyboardButton("☑️ Bulk Actions", callback_data='bulk_orders')],
+        [InlineKeyboardButton("🛵 Delivery Runs", callback_data='delivery_runs')],
+        [InlineKeyboardButton("📈 Stats", callback_data='stats')],
+        [InlineKeyboardButton("🏠 Main Menu", callback_data='back_to_main')]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def stats_keyboard():
+    """Stats screen: period reports from the rollups"""
+    keyboard = [
+        [InlineKeyboardButton("📅 Today", callback_data='stats_today'),
+         InlineKeyboardButton("🗓️ This Week", callback_data='stats_week')],
+        [InlineKeyboardButton("⏰ Peak Hours", callback_data='stats_peak')],
+        [InlineKeyboardButton("📊 Orders Chart", callback_data='chart_hourly'),
+         InlineKeyboardButton("💰 Revenue Chart", callback_data='chart_revenue')],
+        [InlineKeyboardButton("🔙 Admin Panel", callback_data='admin_panel')]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def delivery_runs_keyboard(runs):
+    """One button per planned delivery run"""
+    keyboard = [
+        [InlineKeyboardButton(f"🛵 Run {i + 1}: {run.dorm} / {run.block} ({len(run.orders)})", callback_data=f'run_{i}')]
+        for i, run in enumerate(runs)
+    ]
+    keyboard.append([InlineKeyboardButton("🔙 Admin Panel", callback_data='admin_panel')])
+    return InlineKeyboardMarkup(keyboard)
+
+def delivery_run_keyboard(index):
+    keyboard = [
+        [InlineKeyboardButton("✅ Mark Run Delivered", callback_data=f'rundone_{index}')],
+        [InlineKeyboardButton("🔙 Delivery Runs", callback_data='delivery_runs')]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def bulk_orders_keyboard(orders, selected, restaurants):
+    """Toggle button per open order, select-all per restaurant and the bulk actions"""
+    status_icons = {'pending': '⏳', 'accepted': '✅'}
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'☑️' if order_id in selected else '⬜'} #{order_id} {status_icons.get(status, '')} {food_name} (x{quantity})",
+            callback_data=f'sel_{order_id}'
+        )]
+        for order_id, _, food_name, quantity, status in orders
+    ]
+    for i, restaurant_name in enumerate(restaurants):
+        keyboard.append([InlineKeyboardButton(f"☑️ All pending: {restaurant_name}", callback_data=f'selr_{i}')])
+    keyboard.append([
+        InlineKeyboardButton("✅ Accept", callback_data='bulk_accept'),
+        InlineKeyboardButton("❌ Reject", callback_data='bulk_reject'),
+        InlineKeyboardButton("🚚 Deliver", callback_data='bulk_deliver')
+    ])
+    keyboard.append([
+        InlineKeyboardButton("🧹 Clear", callback_data='sel_none'),
+        InlineKeyboardButton("🔙 Admin Panel", callback_data='admin_panel')
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+# ===================== ADMIN FUNCTIONS =====================
+async def show_admin_panel(query, context):
+    """Show the admin panel"""
+    await renders.edit_text(
+        query,
+        "👑 Admin Panel\n\nManage orders and view stats:",
+        reply_markup=admin_keyboard(),
+        parse_mode='HTML'
+    )
+
+async def show_admin_orders(query, context):
+    """Show pending orders to admin"""
+    try:
+        orders = await store.list_pending_orders(limit=10)
+        
+        if not orders:
+            await renders.edit_text(
+                query,
+                "📭 No pending orders!\n\nAll orders are processed.",
+                reply_markup=admin_keyboard(),
+                parse_mode='HTML'
+            )
+            return
+        
+        # Show first order with actions
+        order = orders[0]
+        await renders.edit_text(
+            query,
+            format_order_for_admin(order),
+            reply_markup=order_actions_keyboard(order.id),
+            parse_mode='HTML'
+        )
+        
+        # Store remaining orders
+        if len(orders) > 1:
+            context.user_data['pending_orders'] = orders[1:]
+    except Exception as e:
+        print(f"❌ Error in show_admin_orders: {e}")
+        await renders.edit_text(query, "❌ Error loading orders.")
+
+async def update_order_status(query, context, order_id, status):
+    """Update order status"""
+    try:
+        # Update status and get order details for notification
+        order = await store.set_order_status(order_id, status)
+        order_deadlines.resolve(order_id)
+        runtime.kitchen.status_changed([order_id], status)
+        admission.status_changed([order_id], status)
+        
+        if order:
+            user_id, order_code, customer_name = order
+            
+            # Notify user
+            try:
+                await context.bot.send_message(user_id, status_update_text(order_id, order_code, status))
+            except Exception as e:
+                print(f"⚠️ Could not notify user {user_id}: {e}")
+        
+        await query.answer(f"✅ Order {status}!")
+        
+        # Show next order or go back
+        if context.user_data.get('pending_orders'):
+            # Saved sessions come back from JSON as plain lists
+            next_order = Order._make(context.user_data['pending_orders'].pop(0))
+            await renders.edit_text(
+                query,
+                format_order_for_admin(next_order),
+                reply_markup=order_actions_keyboard(next_order.id),
+                parse_mode='HTML'
+            )
+        else:
+            await renders.edit_text(
+                query,
+                f"✅ Order #{order_id} has been {status}!\n\nView more orders:",
+                reply_markup=admin_keyboard(),
+                parse_mode='HTML'
+            )
+    except Exception as e:
+        print(f"❌ Error in update_order_status: {e}")
+        await query.answer("❌ Error updating order!", show_alert=True)
+
+async def show_customer_phone(query, context, order_id):
+    """Show customer phone to admin"""
+    try:
+        order = await store.get_order_contact(order_id)
+        
+        if order:
+            phone, name = order
+            await query.answer(f"📞 Customer: {name}\nPhone: {phone}", show_alert=True)
+        else:
+            await query.answer("Order not found!", show_alert=True)
+    except Exception as e:
+        print(f"❌ Error in show_customer_phone: {e}")
+        await query.answer("Error loading order!", show_alert=True)
+
+async def show_stats(query, context):
+    """Show statistics to admin"""
+    try:
+        if query.from_user.id != ADMIN_ID:
+            await query.answer("❌ Admin access required!", show_alert=True)
+            return
+        
+        stats = await store.get_stats()
+        
+        stats_text = f"""📈 TAP&EAT Statistics
+
+👥 Total Users: {stats['users']}
+🏪 Restaurants: {stats['restaurants']}
+📦 Total Orders: {stats['orders']}
+⏳ Pending Orders: {stats['pending']}
+✅ Delivered Orders: {stats['delivered']}
+💰 Total Revenue: ${stats['revenue']:.2f}
+
+Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"""
+        
+        await renders.edit_text(
+            query,
+            stats_text,
+            reply_markup=stats_keyboard()
+        )
+    except Exception as e:
+        print(f"❌ Error in show_stats: {e}")
+        await renders.edit_text(query, "❌ Error loading statistics.")
+
+async def show_period_stats(query, context, period):
+    """Today / this week / peak hours, summed from the hourly rollups"""
+    try:
+        if period == 'peak':
+            rows = await store.get_rollup_hours(since_bucket(PEAK_HOURS_DAYS))
+            text = format_peak_hours(rows)
+        else:
+            title, days_back = PERIODS[period]
+            text = format_period_report(title, await store.get_rollup_totals(since_bucket(days_back)))
+        
+        await renders.edit_text(query, text, reply_markup=stats_keyboard())
+    except Exception as e:
+        print(f"❌ Error in show_period_stats: {e}")
+        await renders.edit_text(query, "❌ Error loading statistics.")
+
+async def load_chart_data(chart):
+    """(kind, title, labels, values) for a chart, from the rollups"""
+    if chart == 'hourly':
+        orders_by_hour = {hour: orders for hour, orders, _ in await store.get_rollup_hours(since_bucket(PEAK_HOURS_DAYS))}
+        hours = [f"{hour:02d}" for hour in range(24)]
+        return 'hourly', f"Orders per hour, last {PEAK_HOURS_DAYS} days", hours, [orders_by_hour.get(hour, 0) for hour in hours]
+    
+    title, days_back = PERIODS['week']
+    rows = await store.get_rollup_totals(since_bucket(days_back))
+    revenue_index = 1 + ROLLUP_FIELDS.index('revenue')
+    return 'revenue', "Revenue per restaurant, last 7 days", [row[0] for row in rows], [row[revenue_index] or 0 for row in rows]
+
+async def send_chart(query, context, chart):
+    """Send a chart image; rendered off the event loop and reused by file_id within its time bucket"""
+    captions = {
+        'hourly': f"📊 Orders per hour (UTC), last {PEAK_HOURS_DAYS} days",
+        'revenue': "💰 Revenue per restaurant, last 7 days",
+    }
+    try:
+        await chart_cache.send(
+            context.bot, query.message.chat_id, chart,
+            lambda: load_chart_data(chart),
+            caption=f"{captions[chart]}\n🕒 As of {time_bucket()} UTC"
+        )
+    except Exception as e:
+        print(f"❌ Error in send_chart: {e}")
+        # button_handler already answered the tap - a second answer would be rejected
+        await context.bot.send_message(query.message.chat_id, "❌ Error rendering chart!")
+
+# ===================== DELIVERY RUNS =====================
+async def show_delivery_runs(query, context, notice=""):
+    """Plan accepted orders into courier runs grouped by dorm/block and restaurant (notice: shown on top)"""
+    try:
+        runs = plan_delivery_runs(await store.list_accepted_orders())
+        
+        if not runs:
+            await renders.edit_text(
+                query,
+                f"{notice}📭 Nothing to deliver!\n\nAccepted orders will show up here.",
+                reply_markup=admin_keyboard()
+            )
+            return
+        
+        # Remember the planned order ids so a run means the same orders when tapped
+        context.user_data['delivery_runs'] = [
+            [run.dorm, run.block, run.restaurant_name, [list(order) for order in run.orders]] for run in runs
+        ]
+        
+        total = sum(len(run.orders) for run in runs)
+        runs_text = f"{notice}🛵 Delivery Runs\n\n📦 {total} accepted orders in {len(runs)} runs:\n\n"
+        for i, run in enumerate(runs):
+            runs_text += f"{i + 1}. 🏢 {run.dorm} / Block {run.block} - {run.restaurant_name} ({len(run.orders)} orders)\n"
+        
+        await renders.edit_text(query, runs_text, reply_markup=delivery_runs_keyboard(runs))
+    except Exception as e:
+        print(f"❌ Error in show_delivery_runs: {e}")
+        await renders.edit_text(query, "❌ Error planning deliveries.")
+
+async def show_delivery_run(query, context, index):
+    """Show the stops of one delivery run in drop-off order"""
+    try:
+        runs = context.user_data.get('delivery_runs') or []
+        if index >= len(runs):
+            await show_delivery_runs(query, context)
+            return
+        
+        dorm, block, restaurant_name, orders = runs[index]
+        run_text = f"🛵 Run {index + 1}\n\n🏪 Pick up: {restaurant_name}\n🏢 Drop off: {dorm} / Block {block}\n\n"
+        for order_id, _, order_code, _, food_name, quantity, _, _, room in orders:
+            run_text += f"🚪 Room {room} - #{order_id} ({order_code})\n    {food_name} (x{quantity})\n"
+        
+        await renders.edit_text(query, run_text, reply_markup=delivery_run_keyboard(index))
+    except Exception as e:
+        print(f"❌ Error in show_delivery_run: {e}")
+        await renders.edit_text(query, "❌ Error loading delivery run.")
+
+async def deliver_run(query, context, index):
+    """Mark a whole run delivered with one UPDATE and notify its customers together"""
+    try:
+        # button_handler already answered the tap: results go into the redrawn run list
+        runs = context.user_data.get('delivery_runs') or []
+        if index >= len(runs):
+            await show_delivery_runs(query, context, notice="🔄 Delivery runs changed, reloaded.\n\n")
+            return
+        
+        # Orders delivered (or changed) meanwhile are skipped by the status check
+        order_ids = [order[0] for order in runs[index][3]]
+        delivered = await store.set_orders_status(order_ids, 'delivered', ('accepted',))
+        runtime.kitchen.status_changed([order.id for order in delivered], 'delivered')
+        admission.status_changed([order.id for order in delivered], 'delivered')
+        await send_many(context.bot, [
+            (user_id, status_update_text(order_id, order_code, 'delivered'))
+            for order_id, user_id, order_code in delivered
+        ])
+        print(f"🚚 Delivery run delivered {len(delivered)} orders")
+        
+        await show_delivery_runs(query, context, notice=f"✅ {len(delivered)} orders delivered!\n\n")
+    except Exception as e:
+        print(f"❌ Error in deliver_run: {e}")
+        await renders.edit_text(query, "❌ Error updating orders!", reply_markup=admin_keyboard())
+
+# ===================== BULK ACTIONS =====================
+async def show_bulk_orders(query, context, reload=True, notice=""):
+    """Show open orders with multi-select toggles (notice: outcome of the last action, shown on top)"""
+    try:
+        if reload or 'bulk_orders' not in context.user_data:
+            orders = await store.list_open_orders(limit=BULK_LIST_SIZE)
+            context.user_data['bulk_orders'] = [list(order) for order in orders]
+            context.user_data['bulk_restaurants'] = sorted(
+                {order.restaurant_name for order in orders if order.status == 'pending'}
+            )
+            open_ids = {order.id for order in orders}
+            context.user_data['bulk_selected'] = [
+                order_id for order_id in context.user_data.get('bulk_selected', []) if order_id in open_ids
+            ]
+        
+        orders = context.user_data['bulk_orders']
+        selected = set(context.user_data['bulk_selected'])
+        if not orders:
+            await renders.edit_text(
+                query,
+                f"{notice}📭 No open orders!\n\nAll orders are processed.",
+                reply_markup=admin_keyboard()
+            )
+            return
+        
+        await renders.edit_text(
+            query,
+            f"{notice}☑️ Bulk Actions\n\n📦 {len(orders)} open orders, {len(selected)} selected.\n\n"
+            f"Tap orders to select them, then choose an action:",
+            reply_markup=bulk_orders_keyboard(orders, selected, context.user_data['bulk_restaurants'])
+        )
+    except Exception as e:
+        print(f"❌ Error in show_bulk_orders: {e}")
+        await renders.edit_text(query, "❌ Error loading orders.")
+
+async def toggle_bulk_selection(query, context, data):
+    """Handle sel_<id>, sel_none and selr_<restaurant index>"""
+    if 'bulk_orders' not in context.user_data:
+        await show_bulk_orders(query, context)
+        return
+    
+    selected = context.user_data['bulk_selected']
+    if data == 'sel_none':
+        selected.clear()
+    elif data.startswith('selr_'):
+        index = int(data.split('_')[1])
+        restaurants = context.user_data['bulk_restaurants']
+        if index < len(restaurants):
+            for order_id, restaurant_name, _, _, status in context.user_data['bulk_orders']:
+                if restaurant_name == restaurants[index] and status == 'pending' and order_id not in selected:
+                    selected.append(order_id)
+    else:
+        order_id = int(data.split('_')[1])
+        if order_id in selected:
+            selected.remove(order_id)
+        else:
+            selected.append(order_id)
+    
+    await show_bulk_orders(query, context, reload=False)
+
+async def apply_bulk_action(query, context, action):
+    """Apply accept/reject/deliver to the selected orders with one UPDATE"""
+    try:
+        # button_handler already answered the tap: results go into the redrawn list
+        selected = context.user_data.get('bulk_selected') or []
+        if not selected:
+            await show_bulk_orders(query, context, reload=False, notice="⚠️ Select some orders first!\n\n")
+            return
+        
+        status, from_statuses = BULK_ACTIONS[action]
+        changed = await store.set_orders_status(selected, status, from_statuses)
+        for order_id, _, _ in changed:
+            order_deadlines.resolve(order_id)
+        runtime.kitchen.status_changed([order.id for order in changed], status)
+        admission.status_changed([order.id for order in changed], status)
+        
+        sent, failed = await send_many(context.bot, [
+            (user_id, status_update_text(order_id, order_code, status))
+            for order_id, user_id, order_code in changed
+        ])
+        skipped = len(selected) - len(changed)
+        print(f"☑️ Bulk {action}: {len(changed)} orders {status}, {skipped} skipped, {sent} notified, {failed} failed")
+        
+        context.user_data['bulk_selected'] = []
+        notice = f"✅ {len(changed)} orders {status}" + (f", {skipped} skipped (status changed)" if skipped else "")
+        await show_bulk_orders(query, context, notice=notice + "\n\n")
+    except Exception as e:
+        print(f"❌ Error in apply_bulk_action: {e}")
+        await renders.edit_text(query, "❌ Error updating orders!", reply_markup=admin_keyboard())
+
+# ===================== CATALOG =====================
+CATALOG_HELP = """🗂️ Catalog commands:
+
+/catalog - list restaurants and items with their IDs
+/addrestaurant <name>
+/additem <restaurant_id> <price> <name>
+/edititem <item_id> <price> [new name]
+/disable restaurant <id>  |  /disable item <id>
+/enable restaurant <id>  |  /enable item <id>
+/itemphoto <item_id> <image URL>  |  /itemphoto <item_id> off
+📷 Or send a photo with the caption /itemphoto <item_id>
+
+📎 Send a .csv (restaurant,item,price,available) or .json file to import whole menus."""
+
+def format_catalog(rows):
+    """Render get_catalog() rows, disabled entries marked 🚫"""
+    lines = ["🗂️ Catalog"]
+    last_restaurant = None
+    for restaurant_id, restaurant_name, is_active, item_id, item_name, price, is_available in rows:
+        if restaurant_id != last_restaurant:
+            lines.append(f"\n{'🏪' if is_active else '🚫'} [{restaurant_id}] {restaurant_name}")
+            last_restaurant = restaurant_id
+        if item_id is not None:
+            lines.append(f"   {'•' if is_available else '🚫'} [{item_id}] {item_name} - ${price:.2f}")
+    text = "\n".join(lines)
+    # Telegram messages are capped at 4096 characters
+    return text if len(text) < 4000 else text[:3990] + "\n…"
+
+async def handle_catalog_command(update, context):
+    """Dispatch /catalog, /addrestaurant, /additem, /edititem, /enable and /disable"""
+    command = update.message.text.split()[0].lstrip('/').split('@')[0].lower()
+    args = context.args or []
+    try:
+        rows = await store.get_catalog()
+        restaurants = {row[0]: row[1] for row in rows}
+        items = {row[3]: row for row in rows if row[3] is not None}
+        changes = None
+        
+        if command == 'catalog':
+            await update.message.reply_text(format_catalog(rows))
+            await update.message.reply_text(CATALOG_HELP)
+            return
+        
+        elif command == 'addrestaurant' and args:
+            name = ' '.join(args)
+            if name in restaurants.values():
+                await update.message.reply_text(f"⚠️ {name} already exists.")
+                return
+            changes = {'add_restaurants': [name]}
+            done = f"🏪 Added restaurant {name}"
+        
+        elif command == 'additem' and len(args) >= 3:
+            restaurant_id, price, name = int(args[0]), float(args[1]), ' '.join(args[2:])
+            if restaurant_id not in restaurants:
+                await update.message.reply_text("❌ Restaurant not found!")
+                return
+            changes = {'add_items': [(restaurants[restaurant_id], name, round(price, 2))]}
+            done = f"🍽️ Added {name} (${price:.2f}) to {restaurants[restaurant_id]}"
+        
+        elif command == 'edititem' and len(args) >= 2:
+            item_id, price = int(args[0]), float(args[1])
+            if item_id not in items:
+                await update.message.reply_text("❌ Item not found!")
+                return
+            name = ' '.join(args[2:]) or items[item_id][4]
+            changes = {'update_items': [(name, round(price, 2), bool(items[item_id][6]), item_id)]}
+            done = f"✏️ Item [{item_id}] is now {name} - ${price:.2f}"
+        
+        elif command in ('enable', 'disable') and len(args) == 2 and args[0] in ('restaurant', 'item'):
+            enabled = (command == 'enable')
+            kind, entry_id = args[0], int(args[1])
+            if kind == 'restaurant':
+                if entry_id not in restaurants:
+                    await update.message.reply_text("❌ Restaurant not found!")
+                    return
+                changes = {'restaurant_active': [(enabled, entry_id)]}
+                done = f"{'✅' if enabled else '🚫'} {restaurants[entry_id]} {command}d"
+            else:
+                if entry_id not in items:
+                    await update.message.reply_text("❌ Item not found!")
+                    return
+                _, _, _, _, name, price, _ = items[entry_id]
+                changes = {'update_items': [(name, price, enabled, entry_id)]}
+                done = f"{'✅' if enabled else '🚫'} {name} {command}d"
+        
+        elif command == 'itemphoto' and len(args) == 2:
+            item_id, source = int(args[0]), args[1]
+            if item_id not in items:
+                await update.message.reply_text("❌ Item not found!")
+                return
+            if source.lower() == 'off':
+                changes = {'item_images': [(None, None, item_id)]}
+                done = f"🖼️ Photo removed from {items[item_id][4]}"
+            elif source.startswith(('http://', 'https://')):
+                # Uploaded from the URL on first view, then reused by file_id
+                changes = {'item_images': [(source, None, item_id)]}
+                done = f"🖼️ Photo set for {items[item_id][4]}"
+        
+        if changes is None:
+            await update.message.reply_text(CATALOG_HELP)
+            return
+        
+        version = await store.apply_catalog_changes(**changes)
+        catalog.invalidate()
+        print(f"🗂️ Catalog {command} applied (version {version})")
+        await update.message.reply_text(f"{done}\n\n🔖 Catalog version {version}")
+    except ValueError:
+        await update.message.reply_text(f"❌ Invalid number.\n\n{CATALOG_HELP}")
+    except Exception as e:
+        print(f"❌ Error in handle_catalog_command: {e}")
+        await update.message.reply_text("❌ Error updating catalog.")
+
+async def set_item_photo(update, context):
+    """Admin sent a photo captioned /itemphoto <item_id>: it's already on Telegram, keep its file_id"""
+    try:
+        args = (update.message.caption or '').split()
+        if len(args) != 2 or not args[1].isdigit():
+            await update.message.reply_text(CATALOG_HELP)
+            return
+        
+        item_id = int(args[1])
+        if not any(row[3] == item_id for row in await store.get_catalog()):
+            await update.message.reply_text("❌ Item not found!")
+            return
+        
+        file_id = update.message.photo[-1].file_id
+        version = await store.apply_catalog_changes(item_images=[('telegram', file_id, item_id)])
+        catalog.invalidate()
+        await update.message.reply_text(f"🖼️ Photo saved for item [{item_id}]\n\n🔖 Catalog version {version}")
+    except Exception as e:
+        print(f"❌ Error in set_item_photo: {e}")
+        await update.message.reply_text("❌ Error saving photo.")
+
+async def import_catalog(update, context):
+    """Import whole menus from an uploaded CSV/JSON file in one transaction"""
+    document = update.message.document
+    try:
+        telegram_file = await document.get_file()
+        data = await telegram_file.download_as_bytearray()
+        incoming = parse_catalog_file(document.file_name or '', data)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Could not read {document.file_name}: {e}\n\n{CATALOG_HELP}")
+        return
+    except Exception as e:
+        print(f"❌ Error downloading catalog file: {e}")
+        await update.message.reply_text("❌ Error downloading the file. Please try again.")
+        return
+    
+    try:
+        changes, summary = diff_catalog(await store.get_catalog(), incoming)
+        report = (
+            f"🏪 Restaurants: +{summary['restaurants_added']} new, {summary['restaurants_enabled']} re-enabled\n"
+            f"🍽️ Items: +{summary['items_added']} new, {summary['items_updated']} updated, "
+            f"{summary['items_disabled']} disabled, {summary['unchanged']} unchanged"
+        )
+        if not any(changes.values()):
+            await update.message.reply_text(f"✅ Catalog already up to date.\n\n{report}")
+            return
+        
+        version = await store.apply_catalog_changes(**changes)
+        catalog.invalidate()
+        print(f"🗂️ Catalog imported from {document.file_name} (version {version})")
+        await update.message.reply_text(f"✅ Catalog imported!\n\n{report}\n\n🔖 Catalog version {version}")
+    except Exception as e:
+        print(f"❌ Error in import_catalog: {e}")
+        await update.message.reply_text("❌ Import failed - nothing was changed.")
+
+# ===================== EXPORTS =====================
+async def export_orders(update, context):
+    """Stream matching orders (or daily summaries) to a temp file and send it as a document"""
+    text = update.message.text.partition(' ')[2]
+    try:
+        kind, fmt, filters = parse_export_args(text)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}\n\n{EXPORT_HELP}")
+        return
+    
+    directory = tempfile.mkdtemp(prefix="tap_eat_export_")
+    try:
+        await update.message.reply_text(f"⏳ Exporting {kind} ({describe_filters(filters)})...")
+        path, count = await export_to_file(store, directory, kind, fmt, filters)
+        with open(path, 'rb') as f:
+            await context.bot.send_document(
+                update.effective_chat.id,
+                document=f,
+                filename=os.path.basename(path),
+                caption=f"📤 {count} {'orders' if kind == 'orders' else 'summary rows'} - {describe_filters(filters)}"
+            )
+        print(f"📤 Exported {count} {kind} rows ({fmt})")
+    except Exception as e:
+        print(f"❌ Error in export_orders: {e}")
+        await update.message.reply_text("❌ Export failed. Please try again.")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# ===================== BACKUPS =====================
+async def backup_now(update, context):
+    """Take a database backup right away and report it"""
+    if not backups.enabled:
+        await update.message.reply_text("ℹ️ Backups are handled by the PostgreSQL server, not the bot.")
+        return
+    try:
+        result = await backups.run()
+        if result is None:
+            await update.message.reply_text("⏳ A backup is already running.")
+            return
+        name, size, seconds = result
+        await update.message.reply_text(
+            f"💾 Backup saved: {name}\n"
+            f"📦 {size / 1024:.0f} KB in {seconds:.2f}s\n"
+            f"🗂️ {backups.metrics()['kept']} backups kept in {backups.directory}/"
+        )
+    except Exception as e:
+        print(f"❌ Error in backup_now: {e}")
+        await update.message.reply_text("❌ Backup failed. Please try again.")
+
+# ===================== PROFILING =====================
+PROFILE_DEFAULT_SECONDS = 10
+profile_running = False
+
+async def profile_bot(update, context):
+    """Start a sampling run in the background; the result arrives as a folded-stacks file"""
+    global profile_running
+    arg = update.message.text.partition(' ')[2].strip()
+    try:
+        seconds = min(float(arg or PROFILE_DEFAULT_SECONDS), PROFILE_MAX_SECONDS)
+    except ValueError:
+        await update.message.reply_text(f"Usage: /profile [seconds] (up to {PROFILE_MAX_SECONDS})")
+        return
+    if profile_running:
+        await update.message.reply_text("⏳ A profile is already running.")
+        return
+    
+    profile_running = True
+    await update.message.reply_text(f"⏳ Profiling for {seconds:g}s - keep using the bot as usual...")
+    # Sample outside this update, so the bot keeps handling updates while we watch it
+    context.application.create_task(send_profile(context.bot, update.effective_chat.id, seconds))
+
+async def send_profile(bot, chat_id, seconds):
+    global profile_running
+    try:
+        counts = await asyncio.to_thread(sample_stacks, seconds, loop=asyncio.get_running_loop())
+        top = hottest_frames(counts, 8)
+        caption = "🔥 Busiest frames (samples):\n" + "\n".join(f"{count} - {frame}" for frame, count in top) if top \
+            else "😴 No busy frames - the bot was idle"
+        stalls = loop_monitor.metrics()['recent_stalls'][-3:]
+        if stalls:
+            caption += "\n\n🐢 Recent loop stalls:\n" + "\n".join(
+                f"{stall['at']} {stall['blocked_ms']:.0f} ms - {stall['update']}" for stall in stalls
+            )
+        await bot.send_document(
+            chat_id,
+            document=folded(counts).encode(),
+            filename=f"tap_eat-profile-{datetime.utcnow():%Y%m%d-%H%M%S}.folded",
+            caption=caption[:1024]
+        )
+    except Exception as e:
+        print(f"❌ Error in send_profile: {e}")
+        await bot.send_message(chat_id, "❌ Profiling failed.")
+    finally:
+        profile_running = False
@@ -0,0 +1,154 @@
+"""Per-restaurant admission control for TAP&EAT.
+
+Each restaurant cooks at most `limit` orders at a time (pending or accepted
+orders are "in flight") and takes about `prep_minutes` per round. A new
+order is:
+
+* accepted while fewer than `limit` orders are in flight,
+* queued with an ETA for the next `queue` orders past the limit - the
+  customer sees the wait on the order summary before confirming,
+* deferred once limit + queue orders are in flight: the menu and checkout
+  say the restaurant is at capacity and when to try again, and no order is
+  created.
+
+Defaults come from RESTAURANT_ORDER_LIMIT, RESTAURANT_QUEUE_LIMIT and
+RESTAURANT_PREP_MINUTES; RESTAURANT_LIMITS overrides them per restaurant:
+
+    RESTAURANT_LIMITS='{"☕ Coffee Corner": {"limit": 6, "queue": 4, "prep_minutes": 5}}'
+
+A limit of 0 turns admission control off for that restaurant.
+
+The in-flight counts live in memory and move with the same events the
+kitchen display gets (order placed, status changed), so deciding costs no
+query. Every ADMISSION_SYNC_SECONDS, on the next decision, they are reloaded
+from the (status, created_at) index to pick up orders placed or closed by
+other worker processes or replicas.
+
+A single process sees every order, so its counts are exact. Between syncs
+each of several processes only sees its own orders, though, and the counts
+alone could let every one admit up to the limit. With shared=True (replicas,
+or more than one worker) the deferral is therefore enforced once more by the
+store at checkout (create_order with max_open counts the restaurant's open
+orders inside the order's transaction); when it refuses, the counts are
+reloaded right away.
+"""
+import collections
+import json
+import os
+import time
+
+from storage import ARCHIVED_STATUSES
+
+ADMISSION_SYNC_SECONDS = 30
+DEFAULT_LIMIT = int(os.environ.get("RESTAURANT_ORDER_LIMIT", 20))
+DEFAULT_QUEUE = int(os.environ.get("RESTAURANT_QUEUE_LIMIT", 20))
+DEFAULT_PREP_MINUTES = float(os.environ.get("RESTAURANT_PREP_MINUTES", 15))
+
+ACCEPT = 'accept'
+QUEUE = 'queue'
+DEFER = 'defer'
+DECISION_STATS = {ACCEPT: 'accepted', QUEUE: 'queued', DEFER: 'deferred'}
+
+# decision, orders already in flight, minutes until ready (or, when deferred, until it's worth retrying)
+Admission = collections.namedtuple('Admission', 'decision, ahead, eta_minutes')
+
+
+def load_limits():
+    """Per-restaurant overrides from RESTAURANT_LIMITS (JSON)"""
+    raw = os.environ.get("RESTAURANT_LIMITS", "").strip()
+    if not raw:
+        return {}
+    try:
+        limits = json.loads(raw)
+        if not isinstance(limits, dict):
+            raise ValueError("expected an object")
+        return limits
+    except ValueError as e:
+        print(f"⚠️ Invalid RESTAURANT_LIMITS ({e}), using the defaults")
+        return {}
+
+
+class AdmissionControl:
+    """In-memory in-flight order counts per restaurant, and the decision for the next order"""
+
+    def __init__(self, store, limits=None, sync_interval=ADMISSION_SYNC_SECONDS, shared=False):
+        self.store = store
+        self.shared = shared  # other processes place orders too
+        self.limits = load_limits() if limits is None else limits
+        self.sync_interval = sync_interval
+        self.synced_at = float('-inf')
+        self.open = {}  # order_id -> restaurant_name, for pending/accepted orders
+        self.counts = collections.Counter()  # restaurant_name -> in-flight orders
+        self.stats = {'accepted': 0, 'queued': 0, 'deferred': 0, 'refused': 0, 'syncs': 0}
+
+    def capacity(self, restaurant_name):
+        """(limit, queue, prep_minutes) for a restaurant"""
+        override = self.limits.get(restaurant_name) or {}
+        return (
+            int(override.get('limit', DEFAULT_LIMIT)),
+            int(override.get('queue', DEFAULT_QUEUE)),
+            float(override.get('prep_minutes', DEFAULT_PREP_MINUTES)),
+        )
+
+    async def refresh(self):
+        """Reload the counts from the database (at most every sync_interval)"""
+        now = time.monotonic()
+        if now - self.synced_at < self.sync_interval:
+            return
+        self.synced_at = now
+        rows = await self.store.list_open_order_restaurants()
+        self.open = dict(rows)
+        self.counts = collections.Counter(self.open.values())
+        self.stats['syncs'] += 1
+
+    async def admit(self, restaurant_name, checkout=False):
+        """Admission for a new order at restaurant_name; checkout=True counts it in the stats"""
+        await self.refresh()
+        limit, queue, prep = self.capacity(restaurant_name)
+        ahead = self.counts[restaurant_name]
+        if limit <= 0:
+            admission = Admission(ACCEPT, ahead, round(prep))
+        elif ahead < limit + queue:
+            # Orders are cooked limit at a time: the ones ahead decide which round this one is in
+            admission = Admission(ACCEPT if ahead < limit else QUEUE, ahead, round(prep * (ahead // limit + 1)))
+        else:
+            admission = Admission(DEFER, ahead, round(prep * ((ahead - limit - queue) // limit + 1)))
+        if checkout:
+            self.stats[DECISION_STATS[admission.decision]] += 1
+        return admission
+
+    def max_open(self, restaurant_name):
+        """In-flight orders at which create_order refuses new ones (None: no check needed)"""
+        if not self.shared:
+            return None
+        limit, queue, _ = self.capacity(restaurant_name)
+        return limit + queue if limit > 0 else None
+
+    async def refused(self, restaurant_name):
+        """The store turned an admitted order away: other processes filled the kitchen since the last sync"""
+        self.stats['refused'] += 1
+        self.synced_at = float('-inf')
+        return await self.admit(restaurant_name)
+
+    def order_placed(self, order):
+        if order.id not in self.open:
+            self.open[order.id] = order.restaurant_name
+            self.counts[order.restaurant_name] += 1
+
+    def status_changed(self, order_ids, status):
+        """Closed orders (delivered, rejected, expired) free their restaurant's slot"""
+        if status not in ARCHIVED_STATUSES:
+            return
+        for order_id in order_ids:
+            restaurant_name = self.open.pop(order_id, None)
+            if restaurant_name is not None:
+                self.counts[restaurant_name] -= 1
+                if self.counts[restaurant_name] <= 0:
+                    del self.counts[restaurant_name]
+
+    def metrics(self):
+        return {
+            **self.stats,
+            'in_flight': dict(self.counts),
+            'synced_seconds_ago': round(time.monotonic() - self.synced_at, 1) if self.stats['syncs'] else None,
+        }
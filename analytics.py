@@ -0,0 +1,68 @@
+"""Admin analytics for TAP&EAT, read from the hourly order_rollups table.
+
+Every order event (placed, accepted, delivered, rejected/expired) updates its
+restaurant's row for the hour the order was placed in, inside the same
+transaction as the order change. Reports therefore sum at most a few hundred
+small rows instead of scanning orders. Buckets are in UTC.
+"""
+from datetime import datetime, timedelta
+
+from storage import ROLLUP_FIELDS
+
+PERIODS = {
+    'today': ("📅 Today", 0),
+    'week': ("🗓️ Last 7 Days", 6),
+}
+PEAK_HOURS_DAYS = 28
+
+
+def since_bucket(days_back, now=None):
+    """First hourly bucket of the day days_back days ago"""
+    start = (now or datetime.utcnow()) - timedelta(days=days_back)
+    return start.strftime('%Y-%m-%d 00')
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    return f"{seconds / 60:.0f} min"
+
+
+def format_period_report(title, rows):
+    """Render get_rollup_totals() rows as a per-restaurant report with a total line"""
+    if not rows:
+        return f"{title}\n\n📭 No orders in this period."
+
+    totals = dict.fromkeys(ROLLUP_FIELDS, 0)
+    lines = [title, ""]
+    for restaurant_name, *values in rows:
+        stats = dict(zip(ROLLUP_FIELDS, values))
+        for field in ROLLUP_FIELDS:
+            totals[field] += stats[field] or 0
+        lines.append(f"🏪 {restaurant_name}: {stats['orders']} orders, {stats['items']} items, ${stats['revenue'] or 0:.2f}")
+
+    lines += [
+        "",
+        f"📦 Orders: {totals['orders']} ({totals['items']} items, ${totals['order_value']:.2f} ordered)",
+        f"🚚 Delivered: {totals['delivered']}  ❌ Rejected/expired: {totals['cancelled']}",
+        f"💰 Revenue: ${totals['revenue']:.2f}",
+    ]
+    if totals['accepted']:
+        lines.append(f"⏱️ Avg time to accept: {format_duration(totals['accept_seconds'] / totals['accepted'])}")
+    if totals['delivered_timed']:
+        lines.append(f"🛵 Avg order-to-delivery: {format_duration(totals['delivery_seconds'] / totals['delivered_timed'])}")
+    return "\n".join(lines)
+
+
+def format_peak_hours(rows, width=12):
+    """Render get_rollup_hours() rows as a text bar chart"""
+    if not rows:
+        return f"⏰ Peak Hours (last {PEAK_HOURS_DAYS} days)\n\n📭 No orders yet."
+    busiest = max(orders for _, orders, _ in rows)
+    lines = [f"⏰ Peak Hours (last {PEAK_HOURS_DAYS} days, UTC)", ""]
+    for hour, orders, revenue in rows:
+        bar = "█" * max(1, round(width * orders / busiest))
+        lines.append(f"{hour}:00 {bar} {orders}")
+    top = sorted(rows, key=lambda row: row[1], reverse=True)[:3]
+    lines += ["", "🔥 Busiest: " + ", ".join(f"{hour}:00" for hour, _, _ in top)]
+    return "\n".join(lines)
@@ -0,0 +1,475 @@
+"""Benchmarks for TAP&EAT.
+
+Run from the repo root:  python bench.py <benchmark> [options]
+None of them talk to Telegram; each runs against a throwaway database.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def bench_env():
+    """Environment for benchmark subprocesses: fake token, repo on the path"""
+    return dict(
+        os.environ,
+        BOT_TOKEN=os.environ.get("BOT_TOKEN") or "123456:bench-token",
+        PYTHONPATH=ROOT,
+        DATABASE_URL="",
+    )
+
+
+def clear_dir(path):
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+
+
+# ===================== STARTUP =====================
+STARTUP_SCRIPT = '''
+import asyncio, time
+t0 = time.perf_counter()
+import boot
+t1 = time.perf_counter()
+
+async def init():
+    await boot.init_database()
+    await boot.store.close()
+
+asyncio.run(init())
+t2 = time.perf_counter()
+boot.build_application(track_offsets=True)
+t3 = time.perf_counter()
+print(t1 - t0, t2 - t1, t3 - t2)
+'''
+
+
+def run_startup_once(cwd):
+    """Time one bot process from exec to 'ready to poll'"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        cwd=cwd, env=bench_env(), capture_output=True, text=True, check=True
+    )
+    total = time.perf_counter() - started
+    imports, database, application = map(float, result.stdout.strip().splitlines()[-1].split())
+    return {"total": total, "imports": imports, "database": database, "application": application}
+
+
+def bench_startup(args):
+    """Process start to ready-to-poll, cold (new database) and warm (existing database)"""
+    runs = {"cold": [], "warm": []}
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(args.runs):
+            clear_dir(cwd)
+            runs["cold"].append(run_startup_once(cwd))
+            runs["warm"].append(run_startup_once(cwd))
+
+    print(f"🚀 Startup time, median of {args.runs} runs (ms)")
+    print(f"{'':6} {'total':>8} {'imports':>8} {'database':>9} {'app':>8}")
+    for kind, samples in runs.items():
+        medians = {key: statistics.median(s[key] for s in samples) * 1000 for key in samples[0]}
+        print(f"{kind:6} {medians['total']:8.1f} {medians['imports']:8.1f} "
+              f"{medians['database']:9.1f} {medians['application']:8.1f}")
+
+    warm_total = statistics.median(s["total"] for s in runs["warm"]) * 1000
+    if args.budget_ms and warm_total > args.budget_ms:
+        print(f"❌ Warm startup {warm_total:.1f} ms is over the {args.budget_ms} ms budget")
+        return 1
+    return 0
+
+
+# ===================== IMPORT TIME =====================
+# Budgets for `python -X importtime` (cumulative ms). "runtime" is everything
+# needed before /health can answer; "boot" is the whole bot.
+IMPORT_BUDGETS_MS = {
+    "runtime": 150,
+    "boot": 900,
+}
+
+
+def import_profile(module):
+    """Return {module: (self_us, cumulative_us, depth)} from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=bench_env(), capture_output=True, text=True, check=True
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        profile[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return profile
+
+
+def bench_imports(args):
+    """Import-time profile of the startup path, checked against IMPORT_BUDGETS_MS"""
+    failed = False
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        samples = [import_profile(module) for _ in range(args.runs)]
+        total = statistics.median(p[module][1] for p in samples) / 1000
+        status = "✅" if total <= budget else "❌"
+        failed |= total > budget
+        print(f"{status} import {module}: {total:.1f} ms (budget {budget} ms)")
+
+        # Heaviest direct dependencies from the last run
+        children = [
+            (cumulative, name) for name, (_, cumulative, depth) in samples[-1].items()
+            if depth == 1 and name != module
+        ]
+        for cumulative, name in sorted(children, reverse=True)[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+    return 1 if failed else 0
+
+
+# ===================== BULK ORDER ACTIONS =====================
+class FakeBot:
+    """Counts Bot API calls and sleeps like a round trip to Telegram"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    async def edit_message_text(self, text, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+
+async def seed_pending_orders(store, count):
+    await store.init_schema()
+    for i in range(count):
+        await store.create_order(f"B{i:06d}", 1000 + i, "Bench Grill", "Burger", 1, 5.0,
+                                 "Bench", "+100", "D1", "B1", str(100 + i))
+    rows = await store.fetchall("SELECT id FROM orders WHERE status = 'pending'")
+    return [row[0] for row in rows]
+
+
+async def run_bulk_comparison(path, orders, latency):
+    from storage import SQLiteStore
+    from notifications import send_many
+    results = {}
+
+    store = SQLiteStore(path)
+    await store.connect()
+    order_ids = await seed_pending_orders(store, orders)
+
+    # One tap per order: UPDATE ... RETURNING, notify the customer, redraw the admin message
+    bot = FakeBot(latency)
+    db_time = 0
+    started = time.perf_counter()
+    for order_id in order_ids:
+        db_started = time.perf_counter()
+        user_id, order_code, _ = await store.set_order_status(order_id, 'accepted')
+        db_time += time.perf_counter() - db_started
+        await bot.send_message(user_id, order_code)
+        await bot.edit_message_text("next order")
+    results["per-order"] = (time.perf_counter() - started, db_time, len(order_ids), bot.calls)
+
+    # Bulk: one UPDATE ... WHERE id IN (...) RETURNING, batched notifications, one redraw
+    bot = FakeBot(latency)
+    started = time.perf_counter()
+    changed = await store.set_orders_status(order_ids, 'delivered', ('accepted',))
+    db_time = time.perf_counter() - started
+    await send_many(bot, [(user_id, order_code) for _, user_id, order_code in changed])
+    await bot.edit_message_text("bulk done")
+    results["bulk"] = (time.perf_counter() - started, db_time, 1, bot.calls)
+    await store.close()
+    return results
+
+
+def bench_bulk(args):
+    """Per-order admin taps vs one bulk action on the same orders"""
+    with tempfile.TemporaryDirectory() as cwd:
+        results = asyncio.run(run_bulk_comparison(
+            os.path.join(cwd, "bench.db"), args.orders, args.api_latency_ms / 1000
+        ))
+
+    print(f"☑️ Updating {args.orders} orders ({args.api_latency_ms:g} ms simulated Bot API latency)")
+    print(f"{'':10} {'total ms':>9} {'db ms':>8} {'db ms/order':>12} {'UPDATEs':>8} {'API calls':>10}")
+    for kind, (elapsed, db_time, statements, api_calls) in results.items():
+        print(f"{kind:10} {elapsed * 1000:9.1f} {db_time * 1000:8.1f} {db_time * 1000 / args.orders:12.3f} "
+              f"{statements:8} {api_calls:10}")
+    print("ℹ️ Bulk notifications are paced at notifications.NOTIFY_CHUNK_SIZE messages/second")
+    return 0
+
+
+# ===================== ROW MODELS =====================
+def seed_orders_sync(path, count):
+    import sqlite3
+    from storage import SQLITE_SCHEMA
+    conn = sqlite3.connect(path)
+    for statement in SQLITE_SCHEMA:
+        conn.execute(statement)
+    conn.executemany('''
+        INSERT INTO orders (order_code, user_id, restaurant_name, food_name, quantity, total_price,
+                            customer_name, phone, dorm, block, room, status)
+        VALUES (?, 1, '🍔 Burger Barn', 'Classic Burger', ?, ?, 'Bench User', '+100', 'D1', 'B1', ?, 'delivered')
+    ''', [(f"B{i:06d}", 1 + i % 3, 8.99 * (1 + i % 3), str(100 + i % 400)) for i in range(count)])
+    conn.commit()
+    return conn
+
+
+def format_history(orders, fields):
+    """The My Orders text for each row, with fields() pulling (id, code, food, qty, total, time)"""
+    lines = []
+    for order in orders:
+        order_id, code, food, qty, total, created_at = fields(order)
+        lines.append(f"Order #{order_id} ({code})\n{food} (x{qty})\nTotal: ${total:.2f}\nTime: {created_at[:16]}\n")
+    return lines
+
+
+def row_shapes(conn):
+    """name -> (load, fields) for each way of reading a page of orders"""
+    from models import ORDER_HISTORY_COLUMNS, OrderHistoryEntry, many
+
+    def load_dicts():
+        cursor = conn.execute("SELECT * FROM orders")
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    return {
+        "dict, SELECT *": (
+            load_dicts,
+            lambda o: (o['id'], o['order_code'], o['food_name'], o['quantity'], o['total_price'], o['created_at']),
+        ),
+        "tuple, SELECT *": (
+            lambda: conn.execute("SELECT * FROM orders").fetchall(),
+            lambda o: (o[0], o[1], o[4], o[5], o[6], o[13]),
+        ),
+        "record, projected": (
+            lambda: many(OrderHistoryEntry, conn.execute(f"SELECT {ORDER_HISTORY_COLUMNS} FROM orders").fetchall()),
+            lambda o: (o.id, o.order_code, o.food_name, o.quantity, o.total_price, o.created_at),
+        ),
+    }
+
+
+def measure_rows(load, fields, runs):
+    import gc
+    import tracemalloc
+    gc.collect()
+    tracemalloc.start()
+    rows = load()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+
+    load_times, format_times = [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        rows = load()
+        loaded = time.perf_counter()
+        format_history(rows, fields)
+        load_times.append(loaded - started)
+        format_times.append(time.perf_counter() - loaded)
+    return held, statistics.median(load_times), statistics.median(format_times)
+
+
+def bench_rows(args):
+    """Memory and speed of listing orders as dicts, SELECT * tuples and projected records"""
+    with tempfile.TemporaryDirectory() as cwd:
+        conn = seed_orders_sync(os.path.join(cwd, "bench.db"), args.orders)
+        results = {name: measure_rows(load, fields, args.runs) for name, (load, fields) in row_shapes(conn).items()}
+        conn.close()
+
+    print(f"📦 Listing and formatting {args.orders} orders, median of {args.runs} runs")
+    print(f"{'':18} {'bytes/row':>10} {'load ms':>9} {'format ms':>10} {'rows/s':>10}")
+    for name, (held, load_time, format_time) in results.items():
+        print(f"{name:18} {held / args.orders:10.0f} {load_time * 1000:9.1f} {format_time * 1000:10.1f} "
+              f"{args.orders / (load_time + format_time):10.0f}")
+    return 0
+
+
+# ===================== BACKUPS =====================
+async def time_order_writes(store, seconds):
+    """Place and accept orders back to back for a while; returns per-order latencies"""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        order = await store.create_order(f"BKP{time.perf_counter_ns()}", 1, "Bench Grill", "Burger", 1, 5.0,
+                                         "Bench", "+100", "D1", "B1", "101")
+        await store.set_order_status(order.id, 'accepted')
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run_backup_impact(directory, orders, seconds):
+    from backups import BackupManager
+    from storage import SQLiteStore
+
+    path = os.path.join(directory, "bench.db")
+    seed_orders_sync(path, orders).close()
+    store = SQLiteStore(path)
+    await store.connect()
+    manager = BackupManager(store, directory=os.path.join(directory, "backups"), keep=3)
+
+    results = {"idle": (await time_order_writes(store, seconds), [])}
+
+    backups = []
+    async def keep_backing_up():
+        while True:
+            backups.append((await manager.run())[2])
+
+    task = asyncio.ensure_future(keep_backing_up())
+    latencies = await time_order_writes(store, seconds)
+    task.cancel()
+    results["during backup"] = (latencies, backups)
+    await store.close()
+    return results
+
+
+def bench_backup(args):
+    """Order write latency with and without a backup running"""
+    with tempfile.TemporaryDirectory() as cwd:
+        results = asyncio.run(run_backup_impact(cwd, args.orders, args.seconds))
+        size = os.path.getsize(os.path.join(cwd, "bench.db"))
+
+    print(f"💾 Place+accept latency over {args.seconds:g}s each, database with {args.orders} orders "
+          f"({size / 1024 / 1024:.1f} MB)")
+    print(f"{'':14} {'writes':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'backups':>8} {'backup s':>9}")
+    for kind, (latencies, backups) in results.items():
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        backup_time = f"{statistics.median(backups):9.2f}" if backups else f"{'-':>9}"
+        print(f"{kind:14} {len(latencies):7} {statistics.median(latencies) * 1000:8.2f} {p99 * 1000:8.2f} "
+              f"{latencies[-1] * 1000:8.2f} {len(backups):8} {backup_time}")
+    return 0
+
+
+# ===================== SESSIONS =====================
+ABANDONED_FLOW = {
+    'order_item_id': 7, 'order_quantity': 2, 'item_id': 7, 'item_name': 'Pepperoni Pizza', 'price': 14.99,
+    'total': 29.98, 'restaurant_id': 1, 'restaurant_name': '🍕 Pizza Palace',
+    'wait_text': '\n⏱️ Ready in about 15 min', 'awaiting_confirmation': True,
+}
+
+
+def simulate_sessions(users, hours, idle_minutes, strategy):
+    """Users arrive evenly over hours, 30% of visits from returning users, each leaving a flow behind.
+
+    Returns (application, live sessions, tick seconds in total, slowest tick seconds, IdleSessions).
+    """
+    import random
+    from telegram.ext import Application, CallbackContext
+    from sessions import IdleSessions
+
+    application = Application.builder().token(bench_env()["BOT_TOKEN"]).updater(None).build()
+    wheel = IdleSessions(idle_seconds=idle_minutes * 60)
+    wheel.application = application
+    ticks = int(hours * 3600 / wheel.tick_seconds)
+    visits = int(users / 0.7)
+    rng = random.Random(1)
+    last_seen = {}  # for the scanning strategy: user_id -> tick
+    tick_total = tick_max = 0.0
+    new_users = 0
+    for tick in range(ticks):
+        arrivals = visits * (tick + 1) // ticks - visits * tick // ticks
+        for _ in range(arrivals):
+            if new_users < users and (new_users == 0 or rng.random() >= 0.3):
+                new_users += 1
+                user_id = new_users
+            else:
+                user_id = rng.randint(1, new_users)
+            flow = dict(ABANDONED_FLOW, order_quantity=1 + user_id % 3, total=14.99 * (1 + user_id % 3),
+                        wait_text=f"\n⏱️ Ready in about {15 + tick % 30} min")
+            CallbackContext(application, user_id=user_id).user_data.update(flow)
+            if strategy == "timing wheel":
+                wheel.touch(user_id)
+            elif strategy == "full scan":
+                last_seen[user_id] = tick
+
+        started = time.perf_counter()
+        if strategy == "timing wheel":
+            idle = wheel.advance()
+        elif strategy == "full scan":
+            idle = [user_id for user_id, seen in last_seen.items() if tick + 1 - seen >= len(wheel.slots)]
+            for user_id in idle:
+                del last_seen[user_id]
+        else:
+            idle = []
+        for user_id in idle:
+            application.drop_user_data(user_id)
+        elapsed = time.perf_counter() - started
+        tick_total += elapsed
+        tick_max = max(tick_max, elapsed)
+    return application, len(application.user_data), tick_total, tick_max, wheel
+
+
+def bench_sessions(args):
+    """user_data memory and eviction cost for a day of simulated users"""
+    import gc
+    import tracemalloc
+    sys.path.insert(0, ROOT)
+    print(f"🧠 {args.users} users over {args.hours:g}h, sessions idle after {args.idle_minutes:g} min")
+    print(f"{'':14} {'live':>8} {'MB':>8} {'estimate MB':>12} {'ticks s':>8} {'max tick ms':>12}")
+    for strategy in ("no eviction", "full scan", "timing wheel"):
+        # Timing without tracemalloc, then the same run again for memory
+        _, live, tick_total, tick_max, _ = simulate_sessions(args.users, args.hours, args.idle_minutes, strategy)
+        gc.collect()
+        tracemalloc.start()
+        application, _, _, _, wheel = simulate_sessions(args.users, args.hours, args.idle_minutes, strategy)
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        estimate = f"{wheel.memory_estimate()[1] / 1e6:12.2f}" if strategy == "timing wheel" else f"{'-':>12}"
+        del application, wheel
+        print(f"{strategy:14} {live:8} {held / 1e6:8.2f} {estimate} {tick_total:8.3f} {tick_max * 1000:12.3f}")
+    return 0
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "imports": bench_imports,
+    "bulk": bench_bulk,
+    "rows": bench_rows,
+    "backup": bench_backup,
+    "sessions": bench_sessions,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    startup = sub.add_parser("startup", help=bench_startup.__doc__)
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget-ms", type=float, default=0, help="fail if warm startup is slower")
+
+    imports = sub.add_parser("imports", help=bench_imports.__doc__)
+    imports.add_argument("--runs", type=int, default=3)
+    imports.add_argument("--top", type=int, default=8, help="heaviest dependencies to list")
+
+    bulk = sub.add_parser("bulk", help=bench_bulk.__doc__)
+    bulk.add_argument("--orders", type=int, default=50)
+    bulk.add_argument("--api-latency-ms", type=float, default=30)
+
+    rows = sub.add_parser("rows", help=bench_rows.__doc__)
+    rows.add_argument("--orders", type=int, default=20000)
+    rows.add_argument("--runs", type=int, default=5)
+
+    backup = sub.add_parser("backup", help=bench_backup.__doc__)
+    backup.add_argument("--orders", type=int, default=200000)
+    backup.add_argument("--seconds", type=float, default=5)
+
+    sessions = sub.add_parser("sessions", help=bench_sessions.__doc__)
+    sessions.add_argument("--users", type=int, default=100000)
+    sessions.add_argument("--hours", type=float, default=24)
+    sessions.add_argument("--idle-minutes", type=float, default=30)
+
+    args = parser.parse_args()
+    return BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
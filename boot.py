@@ -1,55 +1,32 @@
-import os
+import asyncio
 import logging
-import sqlite3
+import signal
 import random
 import string
-from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import (
     Application, CommandHandler, CallbackQueryHandler,
-    MessageHandler, filters, ContextTypes
+    MessageHandler, TypeHandler, ApplicationHandlerStop, filters, ContextTypes
 )
-from flask import Flask, Response
-from threading import Thread
 import time
-
-# ===================== CONFIGURATION =====================
-# Get environment variables
-def get_bot_token():
-    """Get and clean bot token from environment"""
-    token = os.environ.get("BOT_TOKEN", "").strip()
-    
-    # Clean the token - remove any quotes, spaces, or equals signs
-    token = token.strip()
-    token = token.strip('"\'')  # Remove quotes
-    token = token.strip('=')    # Remove equals signs
-    token = token.strip()       # Strip again
-    
-    # Debug log (show first and last 5 chars only for security)
-    if token:
-        masked_token = f"{token[:10]}...{token[-5:]}"
-        print(f"🔑 Bot token loaded: {masked_token}")
-    
-    return token
-
-def get_admin_id():
-    """Get admin ID from environment"""
-    admin_id = os.environ.get("ADMIN_ID", "").strip()
-    if admin_id:
-        try:
-            return int(admin_id)
-        except ValueError:
-            print(f"⚠️ Invalid ADMIN_ID: {admin_id}, using default")
-    return 6237524660  # Default admin ID
-
-BOT_TOKEN = get_bot_token()
-ADMIN_ID = get_admin_id()
-DATABASE_FILE = "tap_eat.db"
-PORT = int(os.environ.get("PORT", 8080))
-
-print(f"🚀 Starting TAP&EAT Bot...")
-print(f"👑 Admin ID: {ADMIN_ID}")
-print(f"🌐 Port: {PORT}")
+import runtime
+from config import (
+    BOT_TOKEN, ADMIN_ID, ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL_HOURS,
+    ORDERS_PAGE_SIZE, REPLICA_MODE
+)
+from runtime import store, ready, shutdown_hooks
+from admission import DEFER, QUEUE, AdmissionControl
+from backups import BACKUP_INTERVAL_MINUTES, BackupManager
+from catalog import CatalogCache
+from profiles import ProfileCache
+from profiling import LoopMonitor
+from recording import RECORD_FLUSH_SECONDS, RECORD_UPDATES_FILE, UpdateRecorder
+from sessions import IdleSessions
+from scaling import ReplicaCoordinator, StorePersistence
+from rendering import RenderCache
+from ratelimit import RATE_LIMIT_SWEEP_SECONDS, RateLimiter
+from sla import OrderDeadlines
+from workers import WORKER_PROCESSES, WorkerPool
 
 # Setup logging
 logging.basicConfig(
@@ -59,168 +36,105 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ===================== DATABASE SETUP =====================
-def init_database():
-    """Initialize database with tables"""
+SAMPLE_CATALOG = {
+    '🍕 Pizza Palace': [
+        ('Margherita Pizza', 12.99),
+        ('Pepperoni Pizza', 14.99),
+        ('Veggie Pizza', 13.99)
+    ],
+    '🍔 Burger Joint': [
+        ('Cheeseburger', 8.99),
+        ('Chicken Burger', 9.99),
+        ('Double Burger', 11.99)
+    ],
+    '☕ Coffee Corner': [
+        ('Cappuccino', 3.99),
+        ('Latte', 4.49),
+        ('Mocha', 4.99)
+    ],
+    '🌯 Wrap Station': [
+        ('Chicken Wrap', 7.99),
+        ('Veggie Wrap', 6.99)
+    ]
+}
+
+schema_ready = False
+FAVORITES_SHOWN = 5  # "Order again" screen
+FAVORITES_IN_HISTORY = 3  # shortcuts above the first page of My Orders
+FAVORITES_SPARE = 3  # extra rows read in case some items left the menu
+
+catalog = CatalogCache(store)  # Active restaurants/menus, refreshed when the catalog version changes
+profiles = ProfileCache(store)  # users rows, so one order reads the users table at most once
+runtime.metrics['profiles'] = profiles.metrics
+renders = RenderCache()  # What each bot message shows, so unchanged screens aren't re-sent
+runtime.metrics['renders'] = renders.metrics
+# In-flight orders per restaurant, kept in memory (and checked by the store when several processes take orders)
+admission = AdmissionControl(store, shared=REPLICA_MODE or WORKER_PROCESSES > 1)
+runtime.metrics['admission'] = admission.metrics
+
+async def init_database():
+    """Initialize database with tables (raises if the store is unusable)"""
+    global schema_ready
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            full_name TEXT,
-            phone TEXT,
-            dorm TEXT,
-            block TEXT,
-            room TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Restaurants table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS restaurants (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE,
-            is_active BOOLEAN DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Menu items table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS menu_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            restaurant_id INTEGER,
-            name TEXT,
-            price REAL,
-            is_available BOOLEAN DEFAULT 1,
-            FOREIGN KEY (restaurant_id) REFERENCES restaurants(id)
-        )
-        ''')
-        
-        # Orders table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            order_code TEXT UNIQUE,
-            user_id INTEGER,
-            restaurant_name TEXT,
-            food_name TEXT,
-            quantity INTEGER,
-            total_price REAL,
-            customer_name TEXT,
-            phone TEXT,
-            dorm TEXT,
-            block TEXT,
-            room TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+        if not schema_ready:
+            # Fresh container without tap_eat.db: start from the newest backup
+            await backups.restore()
+        await store.connect()
+        if schema_ready:
+            # Restart after a crash - tables and sample data are already there
+            return
+        await store.init_schema()
         
         # Check if we need sample data
-        cursor.execute("SELECT COUNT(*) FROM restaurants")
-        if cursor.fetchone()[0] == 0:
+        if await store.count_restaurants() == 0:
             print("📝 Adding sample restaurants and menu items...")
-            
-            # Add sample restaurants
-            sample_restaurants = [
-                '🍕 Pizza Palace',
-                '🍔 Burger Joint', 
-                '☕ Coffee Corner',
-                '🌯 Wrap Station'
-            ]
-            
-            for rest in sample_restaurants:
-                cursor.execute("INSERT OR IGNORE INTO restaurants (name) VALUES (?)", (rest,))
-            
-            # Get restaurant IDs and add sample items
-            for rest_name in sample_restaurants:
-                cursor.execute("SELECT id FROM restaurants WHERE name = ?", (rest_name,))
-                rest_id = cursor.fetchone()[0]
-                
-                if rest_name == '🍕 Pizza Palace':
-                    items = [
-                        ('Margherita Pizza', 12.99),
-                        ('Pepperoni Pizza', 14.99),
-                        ('Veggie Pizza', 13.99)
-                    ]
-                elif rest_name == '🍔 Burger Joint':
-                    items = [
-                        ('Cheeseburger', 8.99),
-                        ('Chicken Burger', 9.99),
-                        ('Double Burger', 11.99)
-                    ]
-                elif rest_name == '☕ Coffee Corner':
-                    items = [
-                        ('Cappuccino', 3.99),
-                        ('Latte', 4.49),
-                        ('Mocha', 4.99)
-                    ]
-                else:
-                    items = [
-                        ('Chicken Wrap', 7.99),
-                        ('Veggie Wrap', 6.99)
-                    ]
-                
-                for item_name, price in items:
-                    cursor.execute(
-                        "INSERT OR IGNORE INTO menu_items (restaurant_id, name, price) VALUES (?, ?, ?)",
-                        (rest_id, item_name, price)
-                    )
-        
-        conn.commit()
-        conn.close()
-        print("✅ Database initialized successfully")
+            await store.apply_catalog_changes(
+                add_restaurants=list(SAMPLE_CATALOG),
+                add_items=[
+                    (rest_name, item_name, price)
+                    for rest_name, items in SAMPLE_CATALOG.items() for item_name, price in items
+                ]
+            )
+        
+        # One-off backfill for databases created before order_rollups existed
+        if not await store.get_state('rollups_built'):
+            await store.rebuild_rollups()
+            await store.set_state('rollups_built', '1')
+        
+        # Same for user_favorites, behind "Order again"
+        if not await store.get_state('favorites_built'):
+            await store.rebuild_favorites()
+            await store.set_state('favorites_built', '1')
+        
+        schema_ready = True
+        print(f"✅ Database initialized successfully ({type(store).__name__})")
     except Exception as e:
         print(f"❌ Database initialization failed: {e}")
+        # Never report ready without a database: main() restarts us with backoff instead
+        raise
 
 # ===================== HELPER FUNCTIONS =====================
-def get_db_connection():
-    return sqlite3.connect(DATABASE_FILE)
-
 def generate_order_code():
     """Generate unique order code"""
     return f"TAP{random.randint(1000, 9999)}{random.choice(string.ascii_uppercase)}"
 
-def save_user(user_id, username, full_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR IGNORE INTO users (user_id, username, full_name) 
-        VALUES (?, ?, ?)
-    ''', (user_id, username or "", full_name))
-    conn.commit()
-    conn.close()
-
-def get_user_info(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
-
 def format_order_for_admin(order):
     """Format order details for admin notification"""
     return f"""
-🚨 <b>NEW ORDER #{order[0]}</b>
-📦 Code: {order[1]}
+🚨 <b>NEW ORDER #{order.id}</b>
+📦 Code: {order.order_code}
 
-🍽️ <b>{order[4]}</b>
-🏪 From: {order[3]}
-🔢 Quantity: {order[5]}
-💰 Total: ${order[6]:.2f}
+🍽️ <b>{order.food_name}</b>
+🏪 From: {order.restaurant_name}
+🔢 Quantity: {order.quantity}
+💰 Total: ${order.total_price:.2f}
 
-👤 <b>{order[7]}</b>
-📞 {order[8]}
-📍 Dorm {order[9]}, Block {order[10]}{f', Room {order[11]}' if order[11] else ''}
+👤 <b>{order.customer_name}</b>
+📞 {order.phone}
+📍 Dorm {order.dorm}, Block {order.block}{f', Room {order.room}' if order.room else ''}
 
-⏰ {order[13]}
-📊 Status: <b>{order[12].upper()}</b>
+⏰ {order.created_at}
+📊 Status: <b>{order.status.upper()}</b>
 """
 
 # ===================== KEYBOARDS =====================
@@ -228,6 +142,7 @@ def main_menu_keyboard(is_admin=False):
     """Create main menu keyboard"""
     keyboard = [
         [InlineKeyboardButton("🍽️ Order Food", callback_data='order_food')],
+        [InlineKeyboardButton("🔁 Order Again", callback_data='order_again')],
         [InlineKeyboardButton("📋 My Orders", callback_data='my_orders')],
         [InlineKeyboardButton("⚙️ My Info", callback_data='my_info')],
         [InlineKeyboardButton("ℹ️ Help", callback_data='help')]
@@ -236,40 +151,19 @@ def main_menu_keyboard(is_admin=False):
         keyboard.append([InlineKeyboardButton("👑 Admin Panel", callback_data='admin_panel')])
     return InlineKeyboardMarkup(keyboard)
 
-def admin_keyboard():
-    """Create admin panel keyboard"""
-    keyboard = [
-        [InlineKeyboardButton("📊 View Orders", callback_data='view_orders')],
-        [InlineKeyboardButton("📈 Stats", callback_data='stats')],
-        [InlineKeyboardButton("🏠 Main Menu", callback_data='back_to_main')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def restaurants_keyboard():
+def restaurants_keyboard(restaurants):
     """Create restaurants selection keyboard"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name FROM restaurants WHERE is_active = 1")
-    restaurants = cursor.fetchall()
-    conn.close()
-    
     keyboard = []
     for rest_id, name in restaurants:
         keyboard.append([InlineKeyboardButton(name, callback_data=f'rest_{rest_id}')])
     keyboard.append([InlineKeyboardButton("🔙 Back", callback_data='back_to_main')])
     return InlineKeyboardMarkup(keyboard)
 
-def menu_keyboard(restaurant_id):
+def menu_keyboard(restaurant_id, items):
     """Create menu items keyboard for a restaurant"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, price FROM menu_items WHERE restaurant_id = ? AND is_available = 1", (restaurant_id,))
-    items = cursor.fetchall()
-    conn.close()
-    
     keyboard = []
-    for item_id, name, price in items:
-        keyboard.append([InlineKeyboardButton(f"{name} - ${price:.2f}", callback_data=f'item_{item_id}')])
+    for item in items:
+        keyboard.append([InlineKeyboardButton(f"{item.name} - ${item.price:.2f}", callback_data=f'item_{item.id}')])
     keyboard.append([InlineKeyboardButton("🔙 Back to Restaurants", callback_data='order_food')])
     return InlineKeyboardMarkup(keyboard)
 
@@ -287,6 +181,26 @@ def quantity_keyboard(item_id, restaurant_id):
     keyboard.append([InlineKeyboardButton("🔙 Back", callback_data=f'rest_{restaurant_id}')])
     return InlineKeyboardMarkup(keyboard)
 
+def favorites_keyboard(favorites):
+    """One button per (MenuItem, quantity) that jumps straight to the order summary"""
+    return [
+        [InlineKeyboardButton(f"🔁 {item.name} x{quantity} - ${item.price * quantity:.2f}",
+                              callback_data=f'again_{item.id}_{quantity}')]
+        for item, quantity in favorites
+    ]
+
+def order_history_keyboard(page, has_more, is_admin=False, favorites=()):
+    """Create order history paging buttons (and "Order again" shortcuts) on top of the main menu"""
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ Newer", callback_data=f'my_orders_{page - 1}'))
+    if has_more:
+        nav.append(InlineKeyboardButton("Older ➡️", callback_data=f'my_orders_{page + 1}'))
+    keyboard = [list(row) for row in main_menu_keyboard(is_admin).inline_keyboard]
+    if nav:
+        keyboard.insert(0, nav)
+    return InlineKeyboardMarkup(favorites_keyboard(favorites) + keyboard)
+
 def order_actions_keyboard(order_id):
     """Create order action buttons for admin"""
     keyboard = [
@@ -298,6 +212,49 @@ def order_actions_keyboard(order_id):
     ]
     return InlineKeyboardMarkup(keyboard)
 
+# ===================== MESSAGE TEMPLATES =====================
+# Rendered once per catalog version through catalog.memo()
+def restaurants_text(restaurants):
+    return "🏪 Choose a restaurant:\n\n" + "".join(f"• {name}\n" for _, name in restaurants)
+
+def menu_text(restaurant_name, items):
+    return f"🏪 {restaurant_name}\n\n📋 Menu:\n\n" + "".join(f"• {item.name} - ${item.price:.2f}\n" for item in items)
+
+def item_text(item_name, price):
+    return f"🍽️ {item_name}\n💰 Price: ${price:.2f}\n\nSelect quantity:"
+
+async def show_screen(query, text, reply_markup=None, photo=None):
+    """Replace the tapped message with a text or photo screen and return the shown message.
+    
+    Telegram can only edit text into text and photo into photo, so switching
+    between the two sends a new message and deletes the old one.
+    """
+    if bool(photo) == bool(getattr(query.message, 'photo', None)):
+        if photo:
+            return await renders.edit_media(query, InputMediaPhoto(photo, caption=text), reply_markup=reply_markup)
+        return await renders.edit_text(query, text, reply_markup=reply_markup)
+    
+    if photo:
+        message = await query.message.reply_photo(photo, caption=text, reply_markup=reply_markup)
+    else:
+        message = await query.message.reply_text(text, reply_markup=reply_markup)
+    renders.forget(query)
+    try:
+        await query.message.delete()
+    except Exception as e:
+        print(f"⚠️ Could not delete previous message: {e}")
+    return message
+
+def busy_text(restaurant_name, wait):
+    return (f"🔴 {restaurant_name} is at capacity right now ({wait.ahead} orders in the kitchen).\n\n"
+            f"Please try again in about {wait.eta_minutes} min, or order from another restaurant.")
+
+def wait_text(wait):
+    """Order summary line with the expected wait"""
+    if wait.decision == QUEUE:
+        return f"\n⏳ Busy right now: {wait.ahead} orders ahead, ready in about {wait.eta_minutes} min"
+    return f"\n⏱️ Ready in about {wait.eta_minutes} min"
+
 # ===================== COMMAND HANDLERS =====================
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
@@ -310,7 +267,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"👤 User {user_id} ({full_name}) started the bot")
         
         # Save user to database
-        save_user(user_id, username, full_name)
+        await profiles.save_user(user_id, username, full_name)
         
         # Check if admin
         is_admin = (user_id == ADMIN_ID)
@@ -363,12 +320,61 @@ For Students:
 For Admin:
 • Use '👑 Admin Panel' for management
 • View and manage orders
+• Manage restaurants and menus with /catalog
+• Download orders and daily summaries with /export
+• Back up the database now with /backup
+• Profile a slow bot with /profile [seconds]
 
 Need help?
 Contact the administrator."""
     await update.message.reply_text(help_text)
 
+async def catalog_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin catalog commands: /catalog, /addrestaurant, /additem, /edititem, /enable, /disable, /itemphoto"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ Admin access required!")
+        return
+    await admin_features().handle_catalog_command(update, context)
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin /export of orders or daily summaries as a file"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ Admin access required!")
+        return
+    await admin_features().export_orders(update, context)
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin /profile [seconds]: sample where the bot spends its time"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ Admin access required!")
+        return
+    await admin_features().profile_bot(update, context)
+
+async def backup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin /backup: snapshot the database now"""
+    if update.effective_user.id != ADMIN_ID:
+        await update.message.reply_text("❌ Admin access required!")
+        return
+    await admin_features().backup_now(update, context)
+
+async def catalog_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin sends a CSV/JSON menu file to import it"""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    await admin_features().import_catalog(update, context)
+
+async def item_photo_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin sends a menu item photo captioned /itemphoto <item_id>"""
+    if update.effective_user.id != ADMIN_ID:
+        return
+    await admin_features().set_item_photo(update, context)
+
 # ===================== CALLBACK HANDLERS =====================
+def admin_features():
+    """Admin-only handlers, imported on first use to keep them off the startup path"""
+    import admin
+    return admin
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all button callbacks"""
     query = update.callback_query
@@ -386,45 +392,86 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await show_restaurants(query, context)
         
         elif data == 'back_to_main':
-            await query.edit_message_text(
+            await renders.edit_text(
+                query,
                 "🏠 Main Menu",
                 reply_markup=main_menu_keyboard(is_admin)
             )
         
+        elif data == 'order_again':
+            await show_order_again(query, context)
+        
         elif data == 'my_orders':
             await show_my_orders(query, context)
         
+        elif data.startswith('my_orders_'):
+            page = int(data.split('_')[2])
+            await show_my_orders(query, context, page)
+        
         elif data == 'my_info':
             await show_my_info(query, context)
         
         elif data == 'help':
-            await query.edit_message_text(
+            await renders.edit_text(
+                query,
                 "🤖 TAP&EAT Help\n\nNeed assistance? Contact admin.",
                 reply_markup=main_menu_keyboard(is_admin)
             )
         
         elif data == 'admin_panel':
             if is_admin:
-                await query.edit_message_text(
-                    "👑 Admin Panel\n\nManage orders and view stats:",
-                    reply_markup=admin_keyboard(),
-                    parse_mode='HTML'
-                )
+                await admin_features().show_admin_panel(query, context)
             else:
                 await query.answer("❌ Admin access required!", show_alert=True)
         
         elif data == 'view_orders':
             if is_admin:
-                await show_admin_orders(query, context)
+                await admin_features().show_admin_orders(query, context)
             else:
                 await query.answer("❌ Admin access required!", show_alert=True)
         
         elif data == 'stats':
             if is_admin:
-                await show_stats(query, context)
+                await admin_features().show_stats(query, context)
+            else:
+                await query.answer("❌ Admin access required!", show_alert=True)
+        
+        elif data in ('stats_today', 'stats_week', 'stats_peak'):
+            if is_admin:
+                await admin_features().show_period_stats(query, context, data.split('_')[1])
+        
+        elif data in ('chart_hourly', 'chart_revenue'):
+            if is_admin:
+                await admin_features().send_chart(query, context, data.split('_')[1])
+        
+        elif data == 'bulk_orders':
+            if is_admin:
+                await admin_features().show_bulk_orders(query, context)
             else:
                 await query.answer("❌ Admin access required!", show_alert=True)
         
+        elif data.startswith(('sel_', 'selr_')):
+            if is_admin:
+                await admin_features().toggle_bulk_selection(query, context, data)
+        
+        elif data.startswith('bulk_'):
+            if is_admin:
+                await admin_features().apply_bulk_action(query, context, data.split('_')[1])
+        
+        elif data == 'delivery_runs':
+            if is_admin:
+                await admin_features().show_delivery_runs(query, context)
+            else:
+                await query.answer("❌ Admin access required!", show_alert=True)
+        
+        elif data.startswith('run_'):
+            if is_admin:
+                await admin_features().show_delivery_run(query, context, int(data.split('_')[1]))
+        
+        elif data.startswith('rundone_'):
+            if is_admin:
+                await admin_features().deliver_run(query, context, int(data.split('_')[1]))
+        
         elif data.startswith('rest_'):
             restaurant_id = int(data.split('_')[1])
             await show_menu(query, context, restaurant_id)
@@ -445,25 +492,33 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 
                 await process_order(query, context)
         
+        elif data.startswith('again_'):
+            # "Order again": item and quantity are in the button, straight to the summary
+            _, item_id, quantity = data.split('_')
+            context.user_data.pop('awaiting_info', None)
+            context.user_data['order_item_id'] = int(item_id)
+            context.user_data['order_quantity'] = int(quantity)
+            await process_order(query, context)
+        
         elif data.startswith('accept_'):
             if is_admin:
                 order_id = int(data.split('_')[1])
-                await update_order_status(query, context, order_id, 'accepted')
+                await admin_features().update_order_status(query, context, order_id, 'accepted')
         
         elif data.startswith('reject_'):
             if is_admin:
                 order_id = int(data.split('_')[1])
-                await update_order_status(query, context, order_id, 'rejected')
+                await admin_features().update_order_status(query, context, order_id, 'rejected')
         
         elif data.startswith('deliver_'):
             if is_admin:
                 order_id = int(data.split('_')[1])
-                await update_order_status(query, context, order_id, 'delivered')
+                await admin_features().update_order_status(query, context, order_id, 'delivered')
         
         elif data.startswith('call_'):
             if is_admin:
                 order_id = int(data.split('_')[1])
-                await show_customer_phone(query, context, order_id)
+                await admin_features().show_customer_phone(query, context, order_id)
     
     except Exception as e:
         print(f"❌ Error in button handler: {e}")
@@ -472,65 +527,59 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_restaurants(query, context):
     """Show list of restaurants"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name FROM restaurants WHERE is_active = 1")
-        restaurants = cursor.fetchall()
-        conn.close()
+        restaurants = await catalog.list_restaurants()
         
         if not restaurants:
-            await query.edit_message_text(
+            await renders.edit_text(
+                query,
                 "😔 No restaurants available yet.\n\nCheck back soon!"
             )
             return
         
-        restaurants_text = "🏪 Choose a restaurant:\n\n"
-        for rest_id, name in restaurants:
-            restaurants_text += f"• {name}\n"
-        
-        await query.edit_message_text(
-            restaurants_text,
-            reply_markup=restaurants_keyboard()
+        await show_screen(
+            query,
+            catalog.memo('restaurants_text', lambda: restaurants_text(restaurants)),
+            reply_markup=catalog.memo('restaurants', lambda: restaurants_keyboard(restaurants))
         )
     except Exception as e:
         print(f"❌ Error in show_restaurants: {e}")
-        await query.edit_message_text("❌ Error loading restaurants. Please try again.")
+        await renders.edit_text(query, "❌ Error loading restaurants. Please try again.")
 
 async def show_menu(query, context, restaurant_id):
     """Show menu for a restaurant"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Get restaurant name
-        cursor.execute("SELECT name FROM restaurants WHERE id = ?", (restaurant_id,))
-        restaurant = cursor.fetchone()
+        restaurant_name = await catalog.get_restaurant_name(restaurant_id)
         
-        if not restaurant:
+        if not restaurant_name:
             await query.answer("Restaurant not found!", show_alert=True)
             return
         
-        restaurant_name = restaurant[0]
+        # A full kitchen turns customers away before they pick anything
+        wait = await admission.admit(restaurant_name)
+        if wait.decision == DEFER:
+            await show_screen(
+                query,
+                busy_text(restaurant_name, wait),
+                reply_markup=restaurants_keyboard(await catalog.list_restaurants())
+            )
+            return
         
         # Get menu items
-        cursor.execute("SELECT id, name, price FROM menu_items WHERE restaurant_id = ? AND is_available = 1", (restaurant_id,))
-        items = cursor.fetchall()
-        conn.close()
+        items = await catalog.list_menu_items(restaurant_id)
         
         if not items:
-            await query.edit_message_text(
+            await show_screen(
+                query,
                 f"🏪 {restaurant_name}\n\nNo menu items available yet.",
-                reply_markup=restaurants_keyboard()
+                reply_markup=restaurants_keyboard(await catalog.list_restaurants())
             )
             return
         
-        menu_text = f"🏪 {restaurant_name}\n\n📋 Menu:\n\n"
-        for item_id, name, price in items:
-            menu_text += f"• {name} - ${price:.2f}\n"
-        
-        await query.edit_message_text(
-            menu_text,
-            reply_markup=menu_keyboard(restaurant_id)
+        await show_screen(
+            query,
+            catalog.memo(('menu_text', restaurant_id), lambda: menu_text(restaurant_name, items)),
+            reply_markup=catalog.memo(('menu', restaurant_id), lambda: menu_keyboard(restaurant_id, items))
         )
     except Exception as e:
         print(f"❌ Error in show_menu: {e}")
@@ -539,26 +588,28 @@ async def show_menu(query, context, restaurant_id):
 async def show_quantity(query, context, item_id):
     """Show quantity selection for an item"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, price, restaurant_id FROM menu_items WHERE id = ?", (item_id,))
-        item = cursor.fetchone()
-        conn.close()
+        item = await catalog.get_menu_item(item_id)
         
         if not item:
             await query.answer("Item not found!", show_alert=True)
             return
         
-        item_name, price, restaurant_id = item
+        item_name, price, restaurant_id = item.name, item.price, item.restaurant_id
         context.user_data['item_name'] = item_name
         context.user_data['price'] = price
         context.user_data['item_id'] = item_id
         context.user_data['restaurant_id'] = restaurant_id
         
-        await query.edit_message_text(
-            f"🍽️ {item_name}\n💰 Price: ${price:.2f}\n\nSelect quantity:",
-            reply_markup=quantity_keyboard(item_id, restaurant_id)
+        photo = catalog.item_photo(item_id)
+        message = await show_screen(
+            query,
+            catalog.memo(('item_text', item_id), lambda: item_text(item_name, price)),
+            reply_markup=catalog.memo(('quantity', item_id), lambda: quantity_keyboard(item_id, restaurant_id)),
+            photo=photo
         )
+        if photo and photo.startswith(('http://', 'https://')) and getattr(message, 'photo', None):
+            # First view of a photo given by URL: keep Telegram's file_id so it's never uploaded again
+            await catalog.remember_file_id(item_id, message.photo[-1].file_id)
     except Exception as e:
         print(f"❌ Error in show_quantity: {e}")
         await query.answer("Error loading item!", show_alert=True)
@@ -576,17 +627,13 @@ async def process_order(query, context):
             await query.answer("Item not selected!", show_alert=True)
             return
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, price, restaurant_id FROM menu_items WHERE id = ?", (item_id,))
-        item = cursor.fetchone()
-        conn.close()
+        item = await catalog.get_menu_item(item_id)
         
         if not item:
             await query.answer("Item not found!", show_alert=True)
             return
         
-        item_name, price, restaurant_id = item
+        item_name, price, restaurant_id = item.name, item.price, item.restaurant_id
         total = price * quantity
         
         # Store order details
@@ -596,19 +643,23 @@ async def process_order(query, context):
         context.user_data['restaurant_id'] = restaurant_id
         
         # Get restaurant name
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM restaurants WHERE id = ?", (restaurant_id,))
-        restaurant = cursor.fetchone()
-        conn.close()
+        restaurant_name = await catalog.get_restaurant_name(restaurant_id)
         
-        if restaurant:
-            context.user_data['restaurant_name'] = restaurant[0]
+        if restaurant_name:
+            context.user_data['restaurant_name'] = restaurant_name
+        
+        wait = await admission.admit(restaurant_name)
+        if wait.decision == DEFER:
+            keyboard = [[InlineKeyboardButton("🔁 Try again", callback_data=f'again_{item_id}_{quantity}')],
+                        [InlineKeyboardButton("🏪 Other restaurants", callback_data='order_food')]]
+            await show_screen(query, busy_text(restaurant_name, wait), reply_markup=InlineKeyboardMarkup(keyboard))
+            return
+        context.user_data['wait_text'] = wait_text(wait)  # user_data is saved as JSON
         
         # Check if user has saved info
-        user_info = get_user_info(user_id)
+        user_info = await profiles.get_user(user_id)
         
-        if not user_info or not user_info[3]:  # Check if phone exists
+        if not user_info or not user_info.phone:
             # Ask for info via conversation
             await ask_user_info_start(query, context)
         else:
@@ -621,7 +672,8 @@ async def process_order(query, context):
 async def ask_user_info_start(query, context):
     """Start asking user for information"""
     try:
-        await query.edit_message_text(
+        await show_screen(
+            query,
             "📝 We need your information for delivery:\n\nPlease send your phone number:"
         )
         context.user_data['awaiting_info'] = True
@@ -644,11 +696,11 @@ async def show_order_summary(query, context, user_info):
 🍽️ Item: {item_name}
 💰 Price: ${price:.2f} each
 🔢 Quantity: {quantity}
-💵 Total: ${total:.2f}
+💵 Total: ${total:.2f}{context.user_data.get('wait_text', '')}
 
-👤 Customer: {user_info[2]}
-📞 Phone: {user_info[3]}
-📍 Dorm: {user_info[4]}, Block: {user_info[5]}{f', Room: {user_info[6]}' if user_info[6] else ''}
+👤 Customer: {user_info.full_name}
+📞 Phone: {user_info.phone}
+📍 Dorm: {user_info.dorm}, Block: {user_info.block}{f', Room: {user_info.room}' if user_info.room else ''}
 
 📝 To confirm your order, type:
 1 - ✅ Confirm Order
@@ -656,7 +708,7 @@ async def show_order_summary(query, context, user_info):
 
 Please type 1 or 2:"""
         
-        await query.edit_message_text(summary)
+        await show_screen(query, summary)
         
         # Set state for confirmation
         context.user_data['awaiting_confirmation'] = True
@@ -713,48 +765,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     context.user_data['room'] = ''
                 
                 # Save user info to database
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                
-                # Check if user exists
-                cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-                user = cursor.fetchone()
-                
-                if user:
-                    # Update existing user
-                    cursor.execute('''
-                        UPDATE users SET 
-                        phone = ?, full_name = ?, dorm = ?, block = ?, room = ?
-                        WHERE user_id = ?
-                    ''', (
-                        context.user_data['phone'],
-                        context.user_data['name'],
-                        context.user_data['dorm'],
-                        context.user_data['block'],
-                        context.user_data.get('room', ''),
-                        user_id
-                    ))
-                else:
-                    # Insert new user
-                    user_obj = update.effective_user
-                    cursor.execute('''
-                        INSERT INTO users (user_id, username, full_name, phone, dorm, block, room)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        user_id,
-                        user_obj.username or "",
-                        context.user_data['name'],
-                        context.user_data['phone'],
-                        context.user_data['dorm'],
-                        context.user_data['block'],
-                        context.user_data.get('room', '')
-                    ))
-                
-                conn.commit()
-                conn.close()
-                
-                # Get updated user info
-                user_info = get_user_info(user_id)
+                user_info = await profiles.save_user_info(
+                    user_id,
+                    update.effective_user.username,
+                    context.user_data['name'],
+                    context.user_data['phone'],
+                    context.user_data['dorm'],
+                    context.user_data['block'],
+                    context.user_data.get('room', '')
+                )
                 
                 # Show order summary
                 await show_order_summary_message(update, context, user_info)
@@ -807,11 +826,11 @@ async def show_order_summary_message(update, context, user_info):
 🍽️ Item: {item_name}
 💰 Price: ${price:.2f} each
 🔢 Quantity: {quantity}
-💵 Total: ${total:.2f}
+💵 Total: ${total:.2f}{context.user_data.get('wait_text', '')}
 
-👤 Customer: {user_info[2]}
-📞 Phone: {user_info[3]}
-📍 Dorm: {user_info[4]}, Block: {user_info[5]}{f', Room: {user_info[6]}' if user_info[6] else ''}
+👤 Customer: {user_info.full_name}
+📞 Phone: {user_info.phone}
+📍 Dorm: {user_info.dorm}, Block: {user_info.block}{f', Room: {user_info.room}' if user_info.room else ''}
 
 📝 To confirm your order, type:
 1 - ✅ Confirm Order
@@ -847,43 +866,45 @@ async def confirm_order(update, context):
             return
         
         # Get user info
-        user_info = get_user_info(user_id)
-        if not user_info or not user_info[3]:
+        user_info = await profiles.get_user(user_id)
+        if not user_info or not user_info.phone:
             await update.message.reply_text("❌ Please complete your info first! Start a new order.")
             context.user_data.clear()
             return
         
-        # Save order to database
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # The kitchen may have filled up while the customer was typing
+        wait = await admission.admit(restaurant_name, checkout=True)
+        if wait.decision == DEFER:
+            await update.message.reply_text(f"❌ Order not placed. {busy_text(restaurant_name, wait)}")
+            context.user_data.clear()
+            await update.message.reply_text("🏠 Main Menu", reply_markup=main_menu_keyboard(is_admin))
+            return
         
+        # Save order to database
         order_code = generate_order_code()
-        
-        cursor.execute('''
-            INSERT INTO orders (
-                order_code, user_id, restaurant_name, food_name,
-                quantity, total_price, customer_name, phone,
-                dorm, block, room, status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        order = await store.create_order(
             order_code, user_id,
             restaurant_name,
             item_name, quantity, total,
-            user_info[2],  # customer_name
-            user_info[3],  # phone
-            user_info[4],  # dorm
-            user_info[5],  # block
-            user_info[6] if len(user_info) > 6 else '',  # room
-            'pending'
-        ))
-        
-        order_id = cursor.lastrowid
-        conn.commit()
-        
-        # Get the complete order for admin notification
-        cursor.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
-        order = cursor.fetchone()
-        conn.close()
+            user_info.full_name,
+            user_info.phone,
+            user_info.dorm,
+            user_info.block,
+            user_info.room or '',
+            item_id=item_id,
+            max_open=admission.max_open(restaurant_name)
+        )
+        if order is None:
+            # Other workers or replicas took the last slots since our counts were synced
+            wait = await admission.refused(restaurant_name)
+            await update.message.reply_text(f"❌ Order not placed. {busy_text(restaurant_name, wait)}")
+            context.user_data.clear()
+            await update.message.reply_text("🏠 Main Menu", reply_markup=main_menu_keyboard(is_admin))
+            return
+        order_id = order.id
+        order_deadlines.track(order_id, user_id, order_code, restaurant_name, order.created_at)
+        runtime.kitchen.order_placed(order)
+        admission.order_placed(order)
         
         # Notify admin
         if order:
@@ -897,7 +918,7 @@ async def confirm_order(update, context):
 🏪 Restaurant: {restaurant_name}
 🍽️ Item: {item_name} (x{quantity})
 💰 Total: ${total:.2f}
-⏰ Status: Pending approval
+⏰ Status: Pending approval{wait_text(wait)}
 
 Admin has been notified. You'll receive updates soon!"""
         )
@@ -916,188 +937,107 @@ Admin has been notified. You'll receive updates soon!"""
         print(f"❌ Error in confirm_order: {e}")
         await update.message.reply_text("❌ Error placing order. Please try again.")
 
-# ===================== ADMIN FUNCTIONS =====================
-async def show_admin_orders(query, context):
-    """Show pending orders to admin"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM orders 
-            WHERE status = 'pending' 
-            ORDER BY created_at DESC
-            LIMIT 10
-        ''')
-        orders = cursor.fetchall()
-        conn.close()
-        
-        if not orders:
-            await query.edit_message_text(
-                "📭 No pending orders!\n\nAll orders are processed.",
-                reply_markup=admin_keyboard(),
-                parse_mode='HTML'
-            )
-            return
-        
-        # Show first order with actions
-        order = orders[0]
-        await query.edit_message_text(
-            format_order_for_admin(order),
-            reply_markup=order_actions_keyboard(order[0]),
-            parse_mode='HTML'
-        )
-        
-        # Store remaining orders
-        if len(orders) > 1:
-            context.user_data['pending_orders'] = orders[1:]
-    except Exception as e:
-        print(f"❌ Error in show_admin_orders: {e}")
-        await query.edit_message_text("❌ Error loading orders.")
-
-async def update_order_status(query, context, order_id, status):
-    """Update order status"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Update status
-        cursor.execute("UPDATE orders SET status = ? WHERE id = ?", (status, order_id))
-        
-        # Get order details for notification
-        cursor.execute("SELECT user_id, order_code, customer_name FROM orders WHERE id = ?", (order_id,))
-        order = cursor.fetchone()
-        
-        conn.commit()
-        conn.close()
-        
-        if order:
-            user_id, order_code, customer_name = order
-            
-            # Prepare status message for user
-            status_messages = {
-                'accepted': 'accepted ✅\n\nYour order is being prepared!',
-                'rejected': 'rejected ❌\n\nPlease contact admin for details.',
-                'delivered': 'delivered 🚚\n\nEnjoy your meal!'
-            }
-            
-            status_msg = status_messages.get(status, f'{status}')
-            
-            # Notify user
-            try:
-                await context.bot.send_message(
-                    user_id,
-                    f"📢 Order Update!\n\nOrder #{order_id} ({order_code}) has been {status_msg}\n\nThank you for using TAP&EAT!"
-                )
-            except Exception as e:
-                print(f"⚠️ Could not notify user {user_id}: {e}")
-        
-        await query.answer(f"✅ Order {status}!")
-        
-        # Show next order or go back
-        if context.user_data.get('pending_orders'):
-            next_order = context.user_data['pending_orders'].pop(0)
-            await query.edit_message_text(
-                format_order_for_admin(next_order),
-                reply_markup=order_actions_keyboard(next_order[0]),
-                parse_mode='HTML'
-            )
-        else:
-            await query.edit_message_text(
-                f"✅ Order #{order_id} has been {status}!\n\nView more orders:",
-                reply_markup=admin_keyboard(),
-                parse_mode='HTML'
-            )
-    except Exception as e:
-        print(f"❌ Error in update_order_status: {e}")
-        await query.answer("❌ Error updating order!", show_alert=True)
-
+# ===================== ORDER NOTIFICATIONS =====================
 async def notify_admin(context, order):
     """Notify admin about new order"""
     try:
         await context.bot.send_message(
             ADMIN_ID,
             format_order_for_admin(order),
-            reply_markup=order_actions_keyboard(order[0]),
+            reply_markup=order_actions_keyboard(order.id),
             parse_mode='HTML'
         )
-        print(f"📢 Admin notified about order #{order[0]}")
+        print(f"📢 Admin notified about order #{order.id}")
     except Exception as e:
         print(f"❌ Failed to notify admin: {e}")
 
-async def show_customer_phone(query, context, order_id):
-    """Show customer phone to admin"""
+# ===================== USER FUNCTIONS =====================
+async def get_favorites(user_id, limit=FAVORITES_SHOWN):
+    """[(MenuItem, quantity)] of a user's most ordered items that are still on the menu"""
+    favorites = []
+    for favorite in await store.get_favorites(user_id, limit + FAVORITES_SPARE):
+        item = await catalog.get_menu_item(favorite.item_id)
+        if item:
+            favorites.append((item, favorite.quantity))
+    return favorites[:limit]
+
+async def show_order_again(query, context):
+    """Show the user's usual orders, one tap from the order summary"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT phone, customer_name FROM orders WHERE id = ?", (order_id,))
-        order = cursor.fetchone()
-        conn.close()
+        user_id = query.from_user.id
+        favorites = await get_favorites(user_id)
         
-        if order:
-            phone, name = order
-            await query.answer(f"📞 Customer: {name}\nPhone: {phone}", show_alert=True)
-        else:
-            await query.answer("Order not found!", show_alert=True)
+        if not favorites:
+            await show_screen(
+                query,
+                "📭 Nothing to order again yet!\n\nYour usual orders will show up here after your first order.",
+                reply_markup=main_menu_keyboard(user_id == ADMIN_ID)
+            )
+            return
+        
+        keyboard = favorites_keyboard(favorites)
+        keyboard.append([InlineKeyboardButton("🍽️ Something else", callback_data='order_food')])
+        keyboard.append([InlineKeyboardButton("🔙 Back", callback_data='back_to_main')])
+        await show_screen(query, "🔁 Order again:\n\nTap an order to go straight to checkout.",
+                          reply_markup=InlineKeyboardMarkup(keyboard))
     except Exception as e:
-        print(f"❌ Error in show_customer_phone: {e}")
-        await query.answer("Error loading order!", show_alert=True)
+        print(f"❌ Error in show_order_again: {e}")
+        # The tap is already answered: say so on the screen instead
+        await show_screen(query, "❌ Error loading your usual orders. Please try again.",
+                          reply_markup=main_menu_keyboard(query.from_user.id == ADMIN_ID))
 
-async def show_my_orders(query, context):
+async def show_my_orders(query, context, page=0):
     """Show user's orders"""
     try:
         user_id = query.from_user.id
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, order_code, food_name, quantity, total_price, status, created_at
-            FROM orders 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC 
-            LIMIT 10
-        ''', (user_id,))
-        orders = cursor.fetchall()
-        conn.close()
+        orders, has_more = await store.get_user_orders_page(user_id, page, ORDERS_PAGE_SIZE)
         
         if not orders:
-            await query.edit_message_text(
+            await renders.edit_text(
+                query,
                 "📭 No orders yet!\n\nPlace your first order!",
                 reply_markup=main_menu_keyboard(user_id == ADMIN_ID)
             )
             return
         
-        orders_text = "📋 Your Recent Orders:\n\n"
+        orders_text = "📋 Your Recent Orders:\n\n" if page == 0 else f"📋 Your Older Orders (page {page + 1}):\n\n"
         for order in orders:
-            order_id, code, food, qty, total, status, time = order
+            status = order.status
             status_emoji = {
                 'pending': '⏳ Pending',
                 'accepted': '✅ Accepted',
                 'delivered': '🚚 Delivered',
-                'rejected': '❌ Rejected'
+                'rejected': '❌ Rejected',
+                'expired': '⌛ Expired'
             }.get(status, '📦 ' + status)
             
-            orders_text += f"""Order #{order_id} ({code})
-{food} (x{qty})
-Total: ${total:.2f}
+            orders_text += f"""Order #{order.id} ({order.order_code})
+{order.food_name} (x{order.quantity})
+Total: ${order.total_price:.2f}
 Status: {status_emoji}
-Time: {time[:16]}
+Time: {order.created_at[:16]}
 ────────────
 """
         
-        await query.edit_message_text(
+        await renders.edit_text(
+            query,
             orders_text,
-            reply_markup=main_menu_keyboard(user_id == ADMIN_ID)
+            reply_markup=order_history_keyboard(
+                page, has_more, user_id == ADMIN_ID,
+                await get_favorites(user_id, FAVORITES_IN_HISTORY) if page == 0 else ()
+            )
         )
     except Exception as e:
         print(f"❌ Error in show_my_orders: {e}")
-        await query.edit_message_text("❌ Error loading your orders.")
+        await renders.edit_text(query, "❌ Error loading your orders.")
 
 async def show_my_info(query, context):
     """Show user's info"""
     try:
         user_id = query.from_user.id
-        user_info = get_user_info(user_id)
+        user_info = await profiles.get_user(user_id)
         
-        if not user_info or not user_info[3]:  # No phone means incomplete info
+        if not user_info or not user_info.phone:  # No phone means incomplete info
             info_text = """❌ No complete information saved yet.
 
 To place an order, you'll need to provide:
@@ -1111,163 +1051,291 @@ Start a new order to update your info!"""
         else:
             info_text = f"""👤 Your Information:
 
-📛 Name: {user_info[2] or 'Not set'}
-📞 Phone: {user_info[3] or 'Not set'}
-🏢 Dorm: {user_info[4] or 'Not set'}
-🏠 Block: {user_info[5] or 'Not set'}
-🚪 Room: {user_info[6] or 'Not set'}
+📛 Name: {user_info.full_name or 'Not set'}
+📞 Phone: {user_info.phone or 'Not set'}
+🏢 Dorm: {user_info.dorm or 'Not set'}
+🏠 Block: {user_info.block or 'Not set'}
+🚪 Room: {user_info.room or 'Not set'}
 
 To update, start a new order."""
         
-        await query.edit_message_text(
+        await renders.edit_text(
+            query,
             info_text,
             reply_markup=main_menu_keyboard(user_id == ADMIN_ID)
         )
     except Exception as e:
         print(f"❌ Error in show_my_info: {e}")
-        await query.edit_message_text("❌ Error loading your info.")
+        await renders.edit_text(query, "❌ Error loading your info.")
+
+# ===================== SCHEDULED JOBS =====================
+def is_leader():
+    """Whether this process runs polling and scheduled jobs (always, unless in replica mode)"""
+    return coordinator is None or coordinator.is_leader
 
-async def show_stats(query, context):
-    """Show statistics to admin"""
+async def archive_job(context: ContextTypes.DEFAULT_TYPE):
+    """Periodically move old closed orders out of the hot orders table"""
+    if not is_leader():
+        return
     try:
-        if query.from_user.id != ADMIN_ID:
-            await query.answer("❌ Admin access required!", show_alert=True)
-            return
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get counts
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM restaurants")
-        rest_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        order_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM orders WHERE status = 'pending'")
-        pending_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM orders WHERE status = 'delivered'")
-        delivered_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT SUM(total_price) FROM orders WHERE status = 'delivered'")
-        revenue = cursor.fetchone()[0] or 0
-        
-        conn.close()
-        
-        stats_text = f"""📈 TAP&EAT Statistics
+        moved = await store.archive_closed_orders(ARCHIVE_AFTER_DAYS)
+        if moved:
+            print(f"🗄️ Archived {moved} closed orders")
+    except Exception as e:
+        print(f"❌ Error archiving orders: {e}")
 
-👥 Total Users: {user_count}
-🏪 Restaurants: {rest_count}
-📦 Total Orders: {order_count}
-⏳ Pending Orders: {pending_count}
-✅ Delivered Orders: {delivered_count}
-💰 Total Revenue: ${revenue:.2f}
+backups = BackupManager(store, should_run=is_leader)
+runtime.metrics['backups'] = backups.metrics
 
-Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M')}"""
-        
-        await query.edit_message_text(
-            stats_text,
-            reply_markup=admin_keyboard()
-        )
-    except Exception as e:
-        print(f"❌ Error in show_stats: {e}")
-        await query.edit_message_text("❌ Error loading statistics.")
+order_deadlines = OrderDeadlines(store, ADMIN_ID, should_run=is_leader, kitchen=runtime.kitchen,
+                                 admission=admission)
+runtime.metrics['order_deadlines'] = order_deadlines.metrics
 
-# ===================== WEB SERVER FOR RAILWAY =====================
-app = Flask(__name__)
+rate_limiter = RateLimiter(exempt=[ADMIN_ID])
+runtime.metrics['rate_limit'] = rate_limiter.metrics
 
-@app.route('/')
-def home():
-    """Health check endpoint - root"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        order_count = cursor.fetchone()[0]
-        conn.close()
-        return Response(
-            f"🤖 TAP&EAT Bot is running!\n\n👥 Users: {user_count}\n📦 Orders: {order_count}\n✅ Status: Online",
-            status=200,
-            mimetype='text/plain'
-        )
-    except Exception as e:
-        print(f"Health check error: {e}")
-        return Response(
-            "🤖 TAP&EAT Bot is running!\n⚠️ Database connection issue",
-            status=200,
-            mimetype='text/plain'
-        )
+loop_monitor = LoopMonitor()
+runtime.metrics['event_loop'] = loop_monitor.metrics
 
-@app.route('/health')
-def health():
-    """Health check endpoint for Railway"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        conn.close()
-        return {"status": "healthy", "service": "tap-eat-bot", "timestamp": datetime.now().isoformat()}, 200
-    except Exception as e:
-        print(f"Health check error: {e}")
-        return {"status": "unhealthy", "error": str(e)}, 500
+idle_sessions = IdleSessions()  # user_data of users active in the last SESSION_IDLE_MINUTES only
+runtime.metrics['sessions'] = idle_sessions.metrics
 
-def run_flask():
-    """Run Flask server in a separate thread"""
-    print(f"🌐 Starting Flask server on port {PORT}...")
-    app.run(host='0.0.0.0', port=PORT, debug=False, use_reloader=False)
+# Optional anonymized recording of incoming updates for replay.py. Replicas
+# would each record a different slice of traffic, so it is single-process
+# (or worker front) only.
+update_recorder = None
+if RECORD_UPDATES_FILE and not REPLICA_MODE:
+    update_recorder = UpdateRecorder(RECORD_UPDATES_FILE, ADMIN_ID)
+    runtime.metrics['recording'] = update_recorder.metrics
+    shutdown_hooks.append(update_recorder.flush)
 
-# ===================== MAIN FUNCTION =====================
-def main():
-    """Main function to start the bot"""
-    # Initialize database
+# ===================== LIFECYCLE =====================
+coordinator = None
+
+OFFSET_FLUSH_SECONDS = 2
+
+class UpdateOffsetTracker:
+    """Remembers the last handled update_id so updates redelivered after a crash are skipped.
+    
+    Pending updates are no longer dropped on restart; anything Telegram sends
+    again that we already handled (up to OFFSET_FLUSH_SECONDS worth) is ignored.
+    """
+    
+    def __init__(self):
+        self.persisted = 0
+        self.last_handled = 0
+    
+    async def load(self):
+        self.persisted = self.last_handled = int(await store.get_state('last_update_id') or 0)
+    
+    async def skip_handled(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """First handler group: drop updates handled before the restart"""
+        if update.update_id <= self.persisted:
+            print(f"⏭️ Skipping already handled update {update.update_id}")
+            raise ApplicationHandlerStop
+    
+    async def mark_handled(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Last handler group: remember the update once the handlers are done with it"""
+        self.last_handled = max(self.last_handled, update.update_id)
+    
+    async def flush(self, context=None):
+        if self.last_handled > self.persisted:
+            await store.set_state('last_update_id', str(self.last_handled))
+            self.persisted = self.last_handled
+
+offset_tracker = None
+
+async def flush_update_offset():
+    if offset_tracker:
+        await offset_tracker.flush()
+
+shutdown_hooks.append(flush_update_offset)
+
+async def post_init(application: Application):
+    """Connect storage once the bot's event loop is running"""
     print("📊 Initializing database...")
-    init_database()
+    await init_database()
+    if offset_tracker:
+        await offset_tracker.load()
+    ready.set()
+
+async def post_stop(application: Application):
+    """Handlers have drained - flush whatever is still buffered"""
+    ready.clear()
+    for hook in shutdown_hooks:
+        try:
+            await hook()
+        except Exception as e:
+            print(f"❌ Shutdown hook {getattr(hook, '__qualname__', hook)} failed: {e}")
+
+async def post_shutdown(application: Application):
+    """Release storage connections"""
+    await store.close()
+
+async def run_replica(application: Application):
+    """Run as one replica: poll only while holding the leader lease, handle our shards"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    # The store must be up before the application reads its persistence
+    await post_init(application)
+    try:
+        async with application:
+            await application.start()
+            ready.set()
+            print(f"🧩 Replica {coordinator.replica_id} running")
+            # Never drop pending updates here - a new leader picks up where the last one stopped
+            await coordinator.run(stop_event, {"allowed_updates": Update.ALL_TYPES})
+            await application.stop()
+            await post_stop(application)
+    finally:
+        await post_shutdown(application)
+
+async def run_worker_front():
+    """Poll Telegram in this process and hand updates to WORKER_PROCESSES workers"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    # Create the schema once here, before the workers connect
+    await init_database()
+    pool = runtime.worker_pool = WorkerPool(WORKER_PROCESSES, recorder=update_recorder)
+    pool.start()
+    ready.set()
+    try:
+        await pool.run_front(BOT_TOKEN, stop_event)
+    finally:
+        ready.clear()
+        await asyncio.to_thread(pool.stop)
+        if update_recorder:
+            await update_recorder.flush()
+        await store.close()
+
+def build_application(schedule_jobs=True, with_updater=True, track_offsets=False, request=None):
+    """Create the Application with all handlers registered (request: stand-in Bot API for replay.py)"""
+    global coordinator, offset_tracker
     
-    # Create application
-    print("🤖 Creating bot application...")
-    application = Application.builder().token(BOT_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if not with_updater:
+        builder = builder.updater(None)
+    if request is not None:
+        builder = builder.request(request)
+    if REPLICA_MODE:
+        builder = builder.persistence(StorePersistence(store))
+    application = builder.build()
+    
+    if update_recorder and with_updater:
+        # Worker processes don't record - the front already did
+        application.add_handler(TypeHandler(Update, update_recorder.check), group=-5)
+        application.job_queue.run_repeating(update_recorder.flush_job, interval=RECORD_FLUSH_SECONDS)
+    
+    # Name the update each task is handling, for the event-loop lag log
+    application.add_handler(TypeHandler(Update, loop_monitor.label_update), group=-4)
+    application.job_queue.run_once(loop_monitor.start_job, 0)
+    
+    # Throttle users hammering buttons/messages before they cost any queries
+    application.add_handler(TypeHandler(Update, rate_limiter.check), group=-3)
+    application.job_queue.run_repeating(rate_limiter.sweep_job, interval=RATE_LIMIT_SWEEP_SECONDS)
+    
+    # Forget the user_data of users idle past SESSION_IDLE_MINUTES (after routing: only our own users count)
+    application.add_handler(TypeHandler(Update, idle_sessions.check), group=99)
+    application.job_queue.run_repeating(idle_sessions.tick_job, interval=idle_sessions.tick_seconds)
+    
+    if REPLICA_MODE:
+        # Route updates to the replica owning the user's shard before any handler runs
+        coordinator = ReplicaCoordinator(store, application)
+        application.add_handler(TypeHandler(Update, coordinator.route_update), group=-1)
+        # Evicting a user of a shard we no longer own would delete the new owner's session
+        idle_sessions.owns = coordinator.owns_user
+        coordinator.shard_listeners.append(idle_sessions.forget_users)
+        # Private chats: chat_id is the user's id, so the shard's chats were edited elsewhere meanwhile
+        coordinator.shard_listeners.append(renders.forget_chats)
+
+    if track_offsets:
+        # Single process only - replicas and workers each see a subset of updates
+        offset_tracker = UpdateOffsetTracker()
+        application.add_handler(TypeHandler(Update, offset_tracker.skip_handled), group=-2)
+        application.add_handler(TypeHandler(Update, offset_tracker.mark_handled), group=100)
+        application.job_queue.run_repeating(offset_tracker.flush, interval=OFFSET_FLUSH_SECONDS)
     
     # Add command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("backup", backup_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler(
+        ["catalog", "addrestaurant", "additem", "edititem", "enable", "disable", "itemphoto"], catalog_command
+    ))
     
     # Add callback query handler
     application.add_handler(CallbackQueryHandler(button_handler))
     
     # Add message handler
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(MessageHandler(filters.Document.ALL, catalog_upload))
+    application.add_handler(MessageHandler(filters.PHOTO & filters.CaptionRegex(r'^/itemphoto'), item_photo_upload))
     
-    # Start Flask server in background thread
-    print("🚀 Starting Flask server...")
-    from threading import Thread
-    flask_thread = Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    
-    # Give Flask time to start
-    time.sleep(2)
+    # Schedule order archiving and deadlines
+    if schedule_jobs:
+        application.job_queue.run_repeating(archive_job, interval=ARCHIVE_INTERVAL_HOURS * 3600, first=60)
+        application.job_queue.run_repeating(backups.job, interval=BACKUP_INTERVAL_MINUTES * 60, first=120)
+        # Reminders and auto-expiry for orders nobody accepts
+        order_deadlines.start(application.job_queue)
     
-    # Start bot
-    print("✅ Starting bot polling...")
-    print("🎉 Bot is now running! Press Ctrl+C to stop.")
-    
-    # Run bot with error handling
-    try:
+    return application
+
+def run_bot():
+    """Run the bot once in the configured mode; returns when stopped by a signal"""
+    if REPLICA_MODE:
+        asyncio.run(run_replica(build_application()))
+    elif WORKER_PROCESSES > 0:
+        asyncio.run(run_worker_front())
+    else:
+        print("🤖 Creating bot application...")
+        application = build_application(track_offsets=True)
+        print("✅ Starting bot polling...")
+        # Pending updates are kept: orders sent during a restart still get processed
         application.run_polling(
-            drop_pending_updates=True,
+            drop_pending_updates=False,
             allowed_updates=Update.ALL_TYPES,
             close_loop=False
         )
-    except Exception as e:
-        print(f"❌ Bot error: {e}")
-        print("🔄 Restarting in 10 seconds...")
-        time.sleep(10)
-        main()
+
+def main():
+    """Main function to start the bot"""
+    # Web server first (already running when started via main.py) - /health reports "starting" until ready
+    runtime.start_web_server()
+    
+    print("🎉 Bot is now running! Press Ctrl+C to stop.")
+    
+    # Restart with backoff on crashes instead of recursing
+    failures = 0
+    while True:
+        started = time.monotonic()
+        try:
+            run_bot()
+            break
+        except Exception as e:
+            # A run that stayed up for a while starts the backoff over
+            failures = 1 if time.monotonic() - started > 300 else failures + 1
+            delay = min(60, 2 ** (failures - 1))
+            print(f"❌ Bot error: {e}")
+            print(f"🔄 Restarting in {delay} seconds...")
+            ready.clear()
+            time.sleep(delay)
+    print("👋 Bot stopped")
 
 if __name__ == "__main__":
-    main()
+    # Deploys used to run boot.py directly; main.py is the entry point now
+    import main as entry_point
+    entry_point.main()
@@ -0,0 +1,223 @@
+"""Restaurant/menu catalog for TAP&EAT: import parsing, diffing and a versioned cache.
+
+Every catalog edit goes through Store.apply_catalog_changes(), which applies
+it in one transaction and bumps the catalog_version in bot_state. CatalogCache
+keeps the active catalog (and any keyboards built from it) for one version;
+when the version changes the whole snapshot is replaced at once, so users never
+see a half-imported menu. Other processes notice a new version within
+CATALOG_CHECK_SECONDS.
+
+Import files list whole menus, one row per item:
+
+    CSV:   restaurant,item,price[,available]
+    JSON:  {"🍕 Pizza Palace": [{"name": "Margherita Pizza", "price": 12.99}, ...]}
+           or [{"restaurant": ..., "item": ..., "price": ..., "available": ...}, ...]
+
+A restaurant in the file gets exactly the listed items: new ones are added,
+changed ones updated and the ones missing from the file disabled. Restaurants
+not in the file are left alone.
+"""
+import csv
+import io
+import json
+import time
+
+from models import MenuItem
+
+CATALOG_CHECK_SECONDS = 5
+MAX_IMPORT_BYTES = 1024 * 1024
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y', '')
+FALSE_VALUES = ('0', 'false', 'no', 'n')
+
+
+def parse_available(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value if value is not None else '').strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"bad 'available' value {value!r}")
+
+
+def parse_price(value):
+    price = round(float(value), 2)
+    if price < 0:
+        raise ValueError(f"negative price {value!r}")
+    return price
+
+
+def parse_catalog_file(filename, data):
+    """Parse an uploaded CSV/JSON menu into {restaurant: {item: (price, available)}}"""
+    if len(data) > MAX_IMPORT_BYTES:
+        raise ValueError(f"file is larger than {MAX_IMPORT_BYTES // 1024} KB")
+    text = bytes(data).decode('utf-8-sig')
+    if filename.lower().endswith('.json'):
+        rows, label, first = json_rows(json.loads(text)), "entry", 1
+    elif filename.lower().endswith('.csv'):
+        rows, label, first = csv.DictReader(io.StringIO(text)), "row", 2  # row 1 is the header
+    else:
+        raise ValueError("send a .csv or .json file")
+
+    catalog = {}
+    for line, row in enumerate(rows, start=first):
+        try:
+            restaurant = (row.get('restaurant') or '').strip()
+            item = (row.get('item') or '').strip()
+            if not restaurant or not item:
+                raise ValueError("restaurant and item are required")
+            catalog.setdefault(restaurant, {})[item] = (
+                parse_price(row.get('price')),
+                parse_available(row.get('available'))
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{label} {line}: {e}")
+    if not catalog:
+        raise ValueError("no menu items found")
+    return catalog
+
+
+def json_rows(document):
+    """Flatten both JSON layouts into CSV-like row dicts"""
+    if isinstance(document, dict):
+        return [
+            {'restaurant': restaurant, 'item': item.get('name'), 'price': item.get('price'),
+             'available': item.get('available')}
+            for restaurant, items in document.items() for item in items
+        ]
+    if isinstance(document, list):
+        return document
+    raise ValueError("expected an object or a list")
+
+
+def diff_catalog(current, incoming):
+    """Compare get_catalog() rows with a parsed import.
+
+    Returns (changes, summary): changes are keyword arguments for
+    Store.apply_catalog_changes, summary counts what will change.
+    """
+    restaurants = {}  # name -> (id, is_active)
+    items = {}  # (restaurant name, item name) -> (id, price, is_available)
+    for restaurant_id, restaurant_name, is_active, item_id, item_name, price, is_available in current:
+        restaurants[restaurant_name] = (restaurant_id, bool(is_active))
+        if item_id is not None:
+            items[(restaurant_name, item_name)] = (item_id, price, bool(is_available))
+
+    changes = {'add_restaurants': [], 'restaurant_active': [], 'add_items': [], 'update_items': []}
+    summary = {'restaurants_added': 0, 'restaurants_enabled': 0, 'items_added': 0,
+               'items_updated': 0, 'items_disabled': 0, 'unchanged': 0}
+
+    for restaurant_name, menu in incoming.items():
+        if restaurant_name not in restaurants:
+            changes['add_restaurants'].append(restaurant_name)
+            summary['restaurants_added'] += 1
+        elif not restaurants[restaurant_name][1]:
+            changes['restaurant_active'].append((True, restaurants[restaurant_name][0]))
+            summary['restaurants_enabled'] += 1
+
+        for item_name, (price, available) in menu.items():
+            existing = items.get((restaurant_name, item_name))
+            if existing is None:
+                changes['add_items'].append((restaurant_name, item_name, price))
+                summary['items_added'] += 1
+            elif (existing[1], existing[2]) != (price, available):
+                changes['update_items'].append((item_name, price, available, existing[0]))
+                summary['items_updated'] += 1
+            else:
+                summary['unchanged'] += 1
+
+    # Items of imported restaurants that are no longer listed get disabled
+    for (restaurant_name, item_name), (item_id, price, is_available) in items.items():
+        if restaurant_name in incoming and item_name not in incoming[restaurant_name] and is_available:
+            changes['update_items'].append((item_name, price, False, item_id))
+            summary['items_disabled'] += 1
+
+    return changes, summary
+
+
+class CatalogCache:
+    """Active restaurants and menus for one catalog version, plus keyboards and texts built from them"""
+
+    def __init__(self, store, check_interval=CATALOG_CHECK_SECONDS):
+        self.store = store
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = float('-inf')
+        self.restaurants = []  # [(id, name)]
+        self.menus = {}  # restaurant_id -> [MenuItem]
+        self.items = {}  # item_id -> MenuItem
+        self.names = {}  # restaurant_id -> name
+        self.images = {}  # item_id -> (image, image_file_id)
+        self.rendered = {}  # memo() results: keyboards and message bodies
+
+    async def refresh(self):
+        """Reload the snapshot if the catalog version moved (checked at most every check_interval)"""
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < self.check_interval:
+            return
+        version = await self.store.get_catalog_version()
+        self.checked_at = now
+        if version == self.version:
+            return
+
+        rows = await self.store.get_catalog(active_only=True)
+        images = {item_id: (image, file_id) for item_id, image, file_id in await self.store.list_item_images()}
+        restaurants, menus, items = [], {}, {}
+        for restaurant_id, restaurant_name, _, item_id, item_name, price, _ in rows:
+            if restaurant_id not in menus:
+                restaurants.append((restaurant_id, restaurant_name))
+                menus[restaurant_id] = []
+            if item_id is None:
+                # Active restaurant without available items: listed, with an empty menu
+                continue
+            item = MenuItem(item_id, item_name, price, restaurant_id)
+            menus[restaurant_id].append(item)
+            items[item_id] = item
+
+        # Swap everything together so readers never mix two versions
+        self.restaurants, self.menus, self.items, self.images = restaurants, menus, items, images
+        self.names = dict(restaurants)
+        self.rendered = {}
+        self.version = version
+
+    def invalidate(self):
+        """Force a version check on the next refresh (after a local edit)"""
+        self.checked_at = float('-inf')
+
+    def memo(self, key, build):
+        """Build a keyboard or message body once per catalog version"""
+        if key not in self.rendered:
+            self.rendered[key] = build()
+        return self.rendered[key]
+
+    async def list_restaurants(self):
+        await self.refresh()
+        return self.restaurants
+
+    async def list_menu_items(self, restaurant_id):
+        await self.refresh()
+        return self.menus.get(restaurant_id, [])
+
+    async def get_restaurant_name(self, restaurant_id):
+        await self.refresh()
+        return self.names.get(restaurant_id)
+
+    async def get_menu_item(self, item_id):
+        """MenuItem for an available item, else None"""
+        await self.refresh()
+        return self.items.get(item_id)
+
+    def item_photo(self, item_id):
+        """file_id (or, before its first upload, URL) of an item's photo, else None"""
+        image, file_id = self.images.get(item_id, (None, None))
+        return file_id or image
+
+    async def remember_file_id(self, item_id, file_id):
+        """Keep the file_id of a photo we just uploaded from its URL, so it is never uploaded again"""
+        image, known = self.images.get(item_id, (None, None))
+        if known or not file_id:
+            return
+        self.images[item_id] = (image, file_id)
+        await self.store.save_item_file_id(item_id, file_id)
@@ -0,0 +1,116 @@
+"""PNG charts for the admin Stats screen.
+
+Charts are drawn with matplotlib in a separate process (CHART_PROCESSES), so
+rendering never blocks the bot's event loop; matplotlib is only imported in
+that process. Worker processes (workers.py) can't start children and render
+in a thread instead. Each chart is cached per CHART_BUCKET_MINUTES time
+bucket: the first view in a bucket renders and uploads the PNG, later views
+resend Telegram's file_id and cost no upload.
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+CHART_PROCESSES = int(os.environ.get("CHART_PROCESSES", 1))
+CHART_BUCKET_MINUTES = int(os.environ.get("CHART_BUCKET_MINUTES", 10))
+
+
+def plain_label(text):
+    """Drop emoji - the default matplotlib font has no glyphs for them"""
+    return "".join(ch for ch in text if ord(ch) < 0x2000).strip() or text
+
+
+def render_chart(kind, title, labels, values):
+    """Draw a bar chart and return PNG bytes (runs in the chart process)"""
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(8, 4.5), dpi=100)
+    axes = figure.subplots()
+    if kind == 'hourly':
+        axes.bar(labels, values, color="#ff7043")
+        axes.set_xlabel("Hour of day (UTC)")
+        axes.set_ylabel("Orders")
+        axes.tick_params(axis='x', labelsize=8)
+    else:
+        axes.barh([plain_label(label) for label in labels], values, color="#42a5f5")
+        axes.invert_yaxis()
+        axes.set_xlabel("Revenue ($)")
+    axes.set_title(title)
+    axes.grid(axis='y' if kind == 'hourly' else 'x', alpha=0.3)
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def time_bucket(now=None, minutes=CHART_BUCKET_MINUTES):
+    now = now or datetime.utcnow()
+    return now.strftime('%Y-%m-%d %H:') + f"{now.minute // minutes * minutes:02d}"
+
+
+class ChartCache:
+    """Renders charts in a process pool and remembers their Telegram file_id per time bucket"""
+
+    def __init__(self, processes=CHART_PROCESSES):
+        self.processes = processes
+        self.pool = None
+        self.file_ids = {}  # (chart, bucket) -> file_id
+        self.rendering = {}  # (chart, bucket) -> Future of PNG bytes, so concurrent views render once
+        self.stats = {'renders': 0, 'cache_hits': 0, 'render_ms_total': 0.0, 'last_render_ms': 0.0}
+
+    def executor(self):
+        if self.pool is None:
+            if multiprocessing.current_process().daemon:
+                self.pool = ThreadPoolExecutor(1, thread_name_prefix="charts")
+            else:
+                self.pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    def cached(self, key):
+        """file_id for a chart in this bucket, dropping entries from older buckets"""
+        for old in [k for k in self.file_ids if k[1] != key[1]]:
+            del self.file_ids[old]
+        return self.file_ids.get(key)
+
+    async def render(self, key, kind, title, labels, values):
+        """PNG bytes for key, rendered once even if several admins ask at the same time"""
+        if key not in self.rendering:
+            async def run():
+                started = time.perf_counter()
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self.executor(), render_chart, kind, title, labels, values)
+                finally:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    self.stats['renders'] += 1
+                    self.stats['render_ms_total'] += elapsed
+                    self.stats['last_render_ms'] = elapsed
+                    self.rendering.pop(key, None)
+            self.rendering[key] = asyncio.ensure_future(run())
+        return await asyncio.shield(self.rendering[key])
+
+    async def send(self, bot, chat_id, chart, load, caption):
+        """Send a chart photo; load() is awaited for (kind, title, labels, values) on a cache miss"""
+        key = (chart, time_bucket())
+        file_id = self.cached(key)
+        if file_id:
+            self.stats['cache_hits'] += 1
+            return await bot.send_photo(chat_id, photo=file_id, caption=caption)
+
+        png = await self.render(key, *await load())
+        message = await bot.send_photo(chat_id, photo=png, caption=caption)
+        self.file_ids[key] = message.photo[-1].file_id
+        return message
+
+    async def close(self):
+        if self.pool is not None:
+            await asyncio.to_thread(self.pool.shutdown)
+            self.pool = None
+
+    def metrics(self):
+        return {**self.stats, 'cached_charts': len(self.file_ids), 'pool_started': self.pool is not None}
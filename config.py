@@ -0,0 +1,51 @@
+"""Configuration for TAP&EAT, read from the environment.
+
+Kept free of heavy imports - the entry point loads this before anything else.
+"""
+import os
+
+# ===================== CONFIGURATION =====================
+# Get environment variables
+def get_bot_token():
+    """Get and clean bot token from environment"""
+    token = os.environ.get("BOT_TOKEN", "").strip()
+
+    # Clean the token - remove any quotes, spaces, or equals signs
+    token = token.strip()
+    token = token.strip('"\'')  # Remove quotes
+    token = token.strip('=')    # Remove equals signs
+    token = token.strip()       # Strip again
+
+    return token
+
+def get_admin_id():
+    """Get admin ID from environment"""
+    admin_id = os.environ.get("ADMIN_ID", "").strip()
+    if admin_id:
+        try:
+            return int(admin_id)
+        except ValueError:
+            print(f"⚠️ Invalid ADMIN_ID: {admin_id}, using default")
+    return 6237524660  # Default admin ID
+
+BOT_TOKEN = get_bot_token()
+ADMIN_ID = get_admin_id()
+DATABASE_FILE = "tap_eat.db"
+PORT = int(os.environ.get("PORT", 8080))
+
+# Closed orders older than this move from orders to orders_archive
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 21))
+ARCHIVE_INTERVAL_HOURS = float(os.environ.get("ARCHIVE_INTERVAL_HOURS", 6))
+ORDERS_PAGE_SIZE = 10
+
+# Run as one of several replicas sharing the database (see scaling.py)
+REPLICA_MODE = os.environ.get("REPLICA_MODE", "").strip().lower() in ("1", "true", "yes")
+
+def print_banner():
+    """Print the startup banner"""
+    print("🚀 Starting TAP&EAT Bot...")
+    # Debug log (show first and last 5 chars only for security)
+    if BOT_TOKEN:
+        print(f"🔑 Bot token loaded: {BOT_TOKEN[:10]}...{BOT_TOKEN[-5:]}")
+    print(f"👑 Admin ID: {ADMIN_ID}")
+    print(f"🌐 Port: {PORT}")
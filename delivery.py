@@ -0,0 +1,47 @@
+"""Delivery-run planning for TAP&EAT couriers.
+
+Accepted orders are grouped by dorm and block, then by restaurant, so one
+courier trip picks up from one restaurant and drops off in one building.
+Stops inside a run are ordered by room number (floor first), and runs are
+capped at DELIVERY_BATCH_SIZE orders so a courier can carry them.
+"""
+import os
+import re
+from collections import namedtuple
+
+DELIVERY_BATCH_SIZE = int(os.environ.get("DELIVERY_BATCH_SIZE", 8))
+
+DeliveryRun = namedtuple("DeliveryRun", "dorm block restaurant_name orders")
+
+
+def room_sort_key(room):
+    """Sort rooms naturally: '2B' < '10A', numbers before free text"""
+    parts = re.split(r'(\d+)', (room or '').strip().lower())
+    return [(0, int(part)) if part.isdigit() else (1, part) for part in parts if part]
+
+
+def building_key(dorm, block):
+    return ((dorm or '').strip().lower(), (block or '').strip().lower())
+
+
+def plan_delivery_runs(orders, batch_size=DELIVERY_BATCH_SIZE):
+    """Group accepted orders into delivery runs.
+
+    orders are DeliveryStop rows (Store.list_accepted_orders). Runs come back sorted by building, so runs for
+    the same dorm are next to each other.
+    """
+    groups = {}
+    labels = {}
+    for order in orders:
+        dorm, block = order.dorm, order.block
+        key = building_key(dorm, block) + (order.restaurant_name,)
+        groups.setdefault(key, []).append(order)
+        labels.setdefault(key, (dorm, block))
+
+    runs = []
+    for key in sorted(groups):
+        stops = sorted(groups[key], key=lambda order: (room_sort_key(order.room), order.id))
+        dorm, block = labels[key]
+        for start in range(0, len(stops), batch_size):
+            runs.append(DeliveryRun(dorm, block, key[2], stops[start:start + batch_size]))
+    return runs
@@ -0,0 +1,130 @@
+"""Order exports for TAP&EAT admins (/export).
+
+/export [orders|summary] [csv|jsonl] [from=YYYY-MM-DD] [to=YYYY-MM-DD]
+        [restaurant=<name>] [status=<status>]
+
+Orders are streamed from a database cursor in EXPORT_CHUNK_ROWS chunks and
+written to a temp file as they arrive, so memory stays flat however many
+orders match. Files too big for a Telegram upload are gzipped first.
+"summary" exports per-day, per-restaurant totals instead of single orders.
+"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import shlex
+import shutil
+from datetime import date, timedelta
+
+from storage import ORDER_COLUMNS
+
+EXPORT_CHUNK_ROWS = 1000
+MAX_UPLOAD_BYTES = 49 * 1024 * 1024  # Bot API document limit is 50 MB
+
+ORDER_FIELDS = [name.strip() for name in ORDER_COLUMNS.split(',')]
+SUMMARY_FIELDS = ['day', 'restaurant_name', 'status', 'order_count', 'revenue']
+EXPORT_KINDS = ('orders', 'summary')
+EXPORT_FORMATS = ('csv', 'jsonl')
+STATUSES = ('pending', 'accepted', 'delivered', 'rejected', 'expired')
+
+EXPORT_HELP = """📤 Export usage:
+
+/export [orders|summary] [csv|jsonl] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [restaurant=name] [status=status]
+
+Examples:
+/export
+/export jsonl from=2024-05-01 to=2024-05-31
+/export summary restaurant="Pizza Palace"
+/export status=delivered"""
+
+
+def parse_export_args(text):
+    """Parse the /export arguments into (kind, fmt, filters); raises ValueError"""
+    kind, fmt, filters = 'orders', 'csv', {}
+    for arg in shlex.split(text):
+        key, _, value = arg.partition('=')
+        key = key.lower()
+        if not value and key in EXPORT_KINDS:
+            kind = key
+        elif not value and key in EXPORT_FORMATS:
+            fmt = key
+        elif key == 'from':
+            filters['since'] = date.fromisoformat(value).isoformat()
+        elif key == 'to':
+            # Inclusive end date
+            filters['until'] = (date.fromisoformat(value) + timedelta(days=1)).isoformat()
+        elif key == 'restaurant' and value:
+            filters['restaurant'] = value
+        elif key == 'status' and value.lower() in STATUSES:
+            filters['status'] = value.lower()
+        else:
+            raise ValueError(f"unknown option {arg!r}")
+    return kind, fmt, filters
+
+
+def format_rows(rows, fields, fmt):
+    """Render a chunk of rows as CSV or JSON lines"""
+    if fmt == 'jsonl':
+        return ''.join(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n' for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def csv_header(fields):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(fields)
+    return buffer.getvalue()
+
+
+async def write_chunks(path, chunks, fields, fmt):
+    """Write an async iterator of row chunks to path; returns the row count"""
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            f.write(csv_header(fields))
+        async for rows in chunks:
+            # File writes go to a thread so a slow disk doesn't stall the bot
+            await asyncio.to_thread(f.write, format_rows(rows, fields, fmt))
+            count += len(rows)
+    return count
+
+
+def gzip_file(path):
+    with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return path + '.gz'
+
+
+async def summary_chunks(store, filters):
+    yield await store.get_daily_summaries(**filters)
+
+
+async def export_to_file(store, directory, kind, fmt, filters):
+    """Export orders or daily summaries into directory; returns (path, row count)"""
+    path = os.path.join(directory, f"tap_eat_{kind}_{date.today().isoformat()}.{fmt}")
+    if kind == 'summary':
+        count = await write_chunks(path, summary_chunks(store, filters), SUMMARY_FIELDS, fmt)
+    else:
+        chunks = store.stream_orders(chunk_size=EXPORT_CHUNK_ROWS, **filters)
+        count = await write_chunks(path, chunks, ORDER_FIELDS, fmt)
+
+    if os.path.getsize(path) > MAX_UPLOAD_BYTES:
+        path = await asyncio.to_thread(gzip_file, path)
+    return path, count
+
+
+def describe_filters(filters):
+    parts = []
+    if 'since' in filters:
+        parts.append(f"from {filters['since']}")
+    if 'until' in filters:
+        parts.append(f"to {(date.fromisoformat(filters['until']) - timedelta(days=1)).isoformat()}")
+    if 'restaurant' in filters:
+        parts.append(f"restaurant ~ {filters['restaurant']}")
+    if 'status' in filters:
+        parts.append(f"status {filters['status']}")
+    return ", ".join(parts) or "all orders"
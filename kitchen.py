@@ -0,0 +1,189 @@
+"""Live kitchen display for TAP&EAT.
+
+/kitchen?key=KITCHEN_KEY is a web page for screens in the kitchen; it opens
+/kitchen/events, a Server-Sent Events stream. A screen gets one snapshot of
+the open (pending/accepted) orders when it connects, then only deltas:
+new orders and status changes, published by the handlers into KitchenFeed.
+
+KitchenFeed is an in-process pub/sub: events go into one bounded backlog
+with increasing sequence numbers and every screen reads from it at its own
+pace, so publishing costs the same however many screens are connected and
+nothing polls the orders table. A screen that falls more than KITCHEN_BACKLOG
+events behind just gets a fresh snapshot. With WORKER_PROCESSES the workers
+forward their events to the front process, which serves the page.
+"""
+import json
+import os
+import queue
+import threading
+
+KITCHEN_KEY = os.environ.get("KITCHEN_KEY", "")  # the display is off until this is set
+KITCHEN_BACKLOG = 1000
+KITCHEN_HEARTBEAT_SECONDS = 15
+KITCHEN_SNAPSHOT_LIMIT = 200
+
+
+class KitchenFeed:
+    """Sequence-numbered order events shared by every connected screen"""
+
+    def __init__(self, backlog=KITCHEN_BACKLOG):
+        self.events = []  # [(seq, json text)], trimmed to backlog
+        self.backlog = backlog
+        self.seq = 0
+        self.condition = threading.Condition()
+        self.forward = None  # multiprocessing queue to the front, in worker processes
+        self.stats = {'published': 0, 'screens': 0, 'connects': 0, 'resyncs': 0, 'forward_dropped': 0}
+
+    def publish(self, kind, **payload):
+        """Send an event to every screen (called from the bot's event loop; never blocks)"""
+        data = json.dumps({'type': kind, **payload}, default=str, ensure_ascii=False)
+        if self.forward is not None:
+            try:
+                self.forward.put_nowait(data)
+            except queue.Full:
+                self.stats['forward_dropped'] += 1
+            return
+        self.append(data)
+
+    def append(self, data):
+        with self.condition:
+            self.seq += 1
+            self.events.append((self.seq, data))
+            if len(self.events) > self.backlog * 2:
+                del self.events[:-self.backlog]
+            self.stats['published'] += 1
+            self.condition.notify_all()
+
+    def order_placed(self, order):
+        self.publish('order', order=order._asdict())
+
+    def status_changed(self, order_ids, status):
+        if order_ids:
+            self.publish('status', ids=list(order_ids), status=status)
+
+    def after(self, seq, timeout):
+        """Events newer than seq, waiting up to timeout for one; None if seq fell out of the backlog"""
+        with self.condition:
+            if self.seq == seq:
+                self.condition.wait(timeout)
+            missed = self.seq - seq
+            if missed > len(self.events):
+                return None
+            return self.events[len(self.events) - missed:]
+
+    def stream(self, load_snapshot, heartbeat=KITCHEN_HEARTBEAT_SECONDS):
+        """SSE text for one screen: a snapshot, then deltas (runs in a web server thread)"""
+        with self.condition:
+            self.stats['connects'] += 1
+            self.stats['screens'] += 1
+        try:
+            seq = None
+            while True:
+                if seq is None:
+                    # Take the position first: events racing the query arrive twice, never zero times
+                    seq = self.seq
+                    orders = [order._asdict() for order in load_snapshot()]
+                    yield f"event: snapshot\ndata: {json.dumps(orders, default=str, ensure_ascii=False)}\n\n"
+                events = self.after(seq, heartbeat)
+                if events is None:
+                    self.stats['resyncs'] += 1
+                    seq = None
+                elif not events:
+                    yield ": keepalive\n\n"
+                else:
+                    yield "".join(f"id: {event_seq}\ndata: {data}\n\n" for event_seq, data in events)
+                    seq = events[-1][0]
+        finally:
+            with self.condition:
+                self.stats['screens'] -= 1
+
+    def forward_from(self, events):
+        """Front process: copy events forwarded by workers into this feed until a None arrives"""
+        while True:
+            data = events.get()
+            if data is None:
+                return
+            self.append(data)
+
+    def metrics(self):
+        return {**self.stats, 'seq': self.seq}
+
+
+KITCHEN_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>TAP&amp;EAT Kitchen</title>
+<style>
+body { font-family: sans-serif; background: #111; color: #eee; margin: 0; padding: 16px; }
+h1 { margin: 0 0 12px; font-size: 22px; }
+#state { font-size: 14px; color: #999; margin-left: 8px; }
+#orders { display: grid; grid-template-columns: repeat(auto-fill, minmax(240px, 1fr)); gap: 12px; }
+.order { background: #222; border-left: 6px solid #ffa726; border-radius: 6px; padding: 10px 12px; }
+.order.accepted { border-color: #66bb6a; }
+.order .code { font-weight: bold; font-size: 18px; }
+.order .food { font-size: 20px; margin: 6px 0; }
+.order .meta { font-size: 13px; color: #aaa; }
+</style>
+</head>
+<body>
+<h1>🍳 TAP&amp;EAT Kitchen <span id="state">connecting...</span></h1>
+<div id="orders"></div>
+<script>
+const OPEN = ['pending', 'accepted'];
+const orders = new Map();
+const list = document.getElementById('orders');
+const state = document.getElementById('state');
+
+function card(order) {
+  const div = document.createElement('div');
+  div.className = 'order ' + order.status;
+  const rows = [
+    ['code', '#' + order.id + ' · ' + order.order_code + ' · ' + order.status.toUpperCase()],
+    ['food', order.food_name + ' ×' + order.quantity],
+    ['meta', order.restaurant_name],
+    ['meta', order.dorm + ' / Block ' + order.block + (order.room ? ', Room ' + order.room : '')],
+    ['meta', order.created_at + ' UTC'],
+  ];
+  for (const [cls, text] of rows) {
+    const line = document.createElement('div');
+    line.className = cls;
+    line.textContent = text;
+    div.appendChild(line);
+  }
+  return div;
+}
+
+function render() {
+  list.replaceChildren(...[...orders.values()]
+    .sort((a, b) => a.id - b.id)
+    .map(card));
+}
+
+const events = new EventSource('/kitchen/events' + location.search);
+events.addEventListener('snapshot', (e) => {
+  orders.clear();
+  for (const order of JSON.parse(e.data)) orders.set(order.id, order);
+  render();
+});
+events.onmessage = (e) => {
+  const event = JSON.parse(e.data);
+  if (event.type === 'order') {
+    orders.set(event.order.id, event.order);
+  } else if (event.type === 'status') {
+    for (const id of event.ids) {
+      const order = orders.get(id);
+      if (!order) continue;
+      if (OPEN.includes(event.status)) order.status = event.status;
+      else orders.delete(id);
+    }
+  }
+  render();
+};
+events.onopen = () => { state.textContent = 'live'; };
+events.onerror = () => { state.textContent = 'reconnecting...'; };
+</script>
+</body>
+</html>
+"""
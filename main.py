@@ -0,0 +1,18 @@
+"""Entry point for TAP&EAT: python main.py
+
+Brings the health endpoint up first (it answers "starting" until the bot is
+ready), then imports python-telegram-bot and the handlers and starts polling.
+Admin-only features are imported on first use (see admin.py).
+"""
+import config
+import runtime
+
+def main():
+    config.print_banner()
+    runtime.start_web_server()
+
+    import boot
+    boot.main()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Row types for TAP&EAT.
+
+Each query projects exactly the columns of one of these records, and the
+store returns the records instead of bare driver rows, so handlers read
+order.created_at rather than order[13]. They are namedtuples: no per-row
+__dict__, the same footprint as the plain tuples they replace, and they
+still unpack, slice and pickle like tuples.
+"""
+from collections import namedtuple
+
+ORDER_COLUMNS = (
+    "id, order_code, user_id, restaurant_name, food_name, quantity, total_price, "
+    "customer_name, phone, dorm, block, room, status, created_at"
+)
+USER_COLUMNS = "user_id, username, full_name, phone, dorm, block, room, created_at"
+ORDER_HISTORY_COLUMNS = "id, order_code, food_name, quantity, total_price, status, created_at"
+OPEN_ORDER_COLUMNS = "id, restaurant_name, food_name, quantity, status"
+DELIVERY_COLUMNS = "id, user_id, order_code, restaurant_name, food_name, quantity, dorm, block, room"
+FAVORITE_COLUMNS = "item_id, quantity, times_ordered"
+
+User = namedtuple('User', USER_COLUMNS)
+Order = namedtuple('Order', ORDER_COLUMNS)
+OrderHistoryEntry = namedtuple('OrderHistoryEntry', ORDER_HISTORY_COLUMNS)
+OpenOrder = namedtuple('OpenOrder', OPEN_ORDER_COLUMNS)  # bulk action lists
+DeliveryStop = namedtuple('DeliveryStop', DELIVERY_COLUMNS)  # delivery run planning
+OrderChange = namedtuple('OrderChange', 'id, user_id, order_code')  # result of a bulk status change
+Favorite = namedtuple('Favorite', FAVORITE_COLUMNS)  # "Order again" suggestions
+MenuItem = namedtuple('MenuItem', 'id, name, price, restaurant_id')
+
+
+def one(model, row):
+    """Wrap a driver row (or None) in a record type"""
+    return model._make(row) if row is not None else None
+
+
+def many(model, rows):
+    return list(map(model._make, rows))
@@ -0,0 +1,32 @@
+"""Batched customer notifications for TAP&EAT.
+
+Bulk admin actions (delivery runs, bulk accept/reject) notify many customers
+at once. send_many() sends them concurrently in chunks that stay under
+Telegram's broadcast limit (~30 messages/second), instead of one awaited
+send_message per order.
+"""
+import asyncio
+import time
+
+NOTIFY_CHUNK_SIZE = 25  # messages per second
+
+
+async def send_many(bot, messages, chunk_size=NOTIFY_CHUNK_SIZE):
+    """Send (chat_id, text) pairs; returns (sent, failed)"""
+    sent = failed = 0
+    for start in range(0, len(messages), chunk_size):
+        started = time.monotonic()
+        chunk = messages[start:start + chunk_size]
+        results = await asyncio.gather(
+            *(bot.send_message(chat_id, text) for chat_id, text in chunk),
+            return_exceptions=True
+        )
+        for (chat_id, _), result in zip(chunk, results):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"⚠️ Could not notify user {chat_id}: {result}")
+            else:
+                sent += 1
+        if start + chunk_size < len(messages):
+            await asyncio.sleep(max(0, 1 - (time.monotonic() - started)))
+    return sent, failed
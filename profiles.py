@@ -0,0 +1,94 @@
+"""User profile cache for TAP&EAT.
+
+One order reads the user's profile several times (process_order, the info
+collection's last step, confirm_order, My Info). ProfileCache keeps the
+users row per user_id in a bounded LRU (PROFILE_CACHE_SIZE entries) for
+PROFILE_CACHE_SECONDS, so an order touches the users table at most once.
+
+Writes go through the cache: save_user_info() stores the row the upsert
+returns, and save_user() on /start only INSERTs users the cache or a
+single read don't find - once the TTL expires, a returning user costs that
+one SELECT, no write. Updates are sharded by user across workers/replicas, so the
+only writer of a profile is normally the process caching it; the TTL bounds
+how stale an entry can get after a shard moves.
+"""
+import os
+import time
+from collections import OrderedDict
+
+PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", 10000))
+PROFILE_CACHE_SECONDS = float(os.environ.get("PROFILE_CACHE_SECONDS", 300))
+
+
+class ProfileCache:
+    """LRU + TTL cache of users rows (USER_COLUMNS) with write-through"""
+
+    def __init__(self, store, size=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_SECONDS):
+        self.store = store
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # user_id -> (row or None, expires_at)
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'skipped_writes': 0, 'evictions': 0}
+
+    def lookup(self, user_id):
+        """(found, row) from the cache, dropping the entry if it expired"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return False, None
+        if entry[1] <= time.monotonic():
+            del self.entries[user_id]
+            return False, None
+        self.entries.move_to_end(user_id)
+        return True, entry[0]
+
+    def put(self, user_id, row):
+        self.entries[user_id] = (row, time.monotonic() + self.ttl)
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def forget(self, user_id):
+        self.entries.pop(user_id, None)
+
+    async def get_user(self, user_id):
+        found, row = self.lookup(user_id)
+        if found:
+            self.stats['hits'] += 1
+            return row
+        self.stats['misses'] += 1
+        row = await self.store.get_user(user_id)
+        self.put(user_id, row)
+        return row
+
+    async def save_user(self, user_id, username, full_name):
+        """/start: insert the user unless they exist (cached, or found by one read)"""
+        row = await self.get_user(user_id)
+        if row is not None:
+            # Returning users are the common case: a read, never a write transaction
+            self.stats['skipped_writes'] += 1
+            return
+        self.stats['writes'] += 1
+        row = await self.store.save_user(user_id, username, full_name)
+        if row is None:
+            # Inserted meanwhile by another process
+            row = await self.store.get_user(user_id)
+        self.put(user_id, row)
+
+    async def save_user_info(self, user_id, username, full_name, phone, dorm, block, room):
+        self.stats['writes'] += 1
+        try:
+            row = await self.store.save_user_info(user_id, username, full_name, phone, dorm, block, room)
+        except Exception:
+            self.forget(user_id)
+            raise
+        self.put(user_id, row)
+        return row
+
+    def metrics(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'cached_users': len(self.entries),
+            'hit_ratio': round(self.stats['hits'] / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,196 @@
+"""Sampling profiler and event-loop lag monitor for TAP&EAT.
+
+sample_stacks() runs in its own thread for a few seconds and, every
+PROFILE_INTERVAL_MS, records the stack of every thread (CPU in handlers,
+SQLite work in to_thread workers, Flask) and the await chain of every
+asyncio task (so a handler waiting on Telegram or on the database shows up
+as handler;send_message;... even though it isn't running). The result is
+in folded "frame;frame;frame count" form, ready for flamegraph.pl or
+speedscope. Admins get it with /profile [seconds] or, with PROFILE_KEY set,
+from GET /profile?key=...&seconds=...
+
+LoopMonitor runs all the time: a coroutine ticks every LOOP_TICK_SECONDS and
+a watchdog thread notices when the ticks stop for more than
+LOOP_LAG_THRESHOLD_MS. It then logs how long the loop was blocked, the
+update (callback_data or message text) the running task was handling and
+where in our code it was stuck.
+"""
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import weakref
+
+PROFILE_KEY = os.environ.get("PROFILE_KEY", "")  # the HTTP endpoint is off until this is set
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 10))
+PROFILE_MAX_SECONDS = 60
+LOOP_LAG_THRESHOLD_MS = float(os.environ.get("LOOP_LAG_THRESHOLD_MS", 100))
+LOOP_TICK_SECONDS = 0.05
+MONITOR_THREAD = "loop-monitor"  # always asleep, left out of profiles
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def thread_stack(frame):
+    """Frame labels from the outermost call to frame"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def await_stack(coro):
+    """Frame labels along a coroutine's await chain, outermost first"""
+    labels = []
+    while coro is not None:
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        labels.append(frame_label(frame))
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return labels
+
+
+def sample_stacks(seconds, interval_ms=PROFILE_INTERVAL_MS, loop=None):
+    """Sample every thread (and loop's tasks) for seconds; returns {folded stack: samples}"""
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    me = threading.get_ident()
+    names = {}
+    counts = collections.Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if ident not in names:
+                names[ident] = next((t.name for t in threading.enumerate() if t.ident == ident), str(ident))
+            if names[ident] == MONITOR_THREAD:
+                continue
+            counts[';'.join([f"thread:{names[ident]}"] + thread_stack(frame))] += 1
+        if loop is not None and not loop.is_closed():
+            try:
+                tasks = asyncio.all_tasks(loop)
+            except RuntimeError:
+                tasks = ()
+            for task in tasks:
+                stack = await_stack(task.get_coro())
+                if stack:
+                    counts[';'.join([f"task:{task.get_name()}"] + stack)] += 1
+        time.sleep(interval_ms / 1000)
+    return counts
+
+
+def folded(counts):
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def hottest_frames(counts, limit=10):
+    """Innermost frames by samples, skipping idle ones (the loop waiting in select)"""
+    leaves = collections.Counter()
+    for stack, count in counts.items():
+        if stack.startswith('thread:'):
+            leaf = stack.rsplit(';', 1)[-1]
+            if not leaf.startswith(('select ', 'poll ', 'wait ', '_worker ')):
+                leaves[leaf] += count
+    return leaves.most_common(limit)
+
+
+def describe_update(update):
+    """Short description of an update for the lag log"""
+    user = update.effective_user
+    who = f" from {user.id}" if user else ""
+    if update.callback_query:
+        return f"callback {update.callback_query.data!r}{who}"
+    if update.message:
+        text = update.message.text or update.message.caption or "<no text>"
+        return f"message {text[:40]!r}{who}"
+    return f"update {update.update_id}{who}"
+
+
+class LoopMonitor:
+    """Logs every stretch where a callback blocks the event loop beyond a threshold"""
+
+    def __init__(self, threshold_ms=LOOP_LAG_THRESHOLD_MS, tick=LOOP_TICK_SECONDS):
+        self.threshold = threshold_ms / 1000
+        self.tick = tick
+        self.loop = None
+        self.thread_id = None
+        self.beat = time.monotonic()
+        self.labels = weakref.WeakKeyDictionary()  # task -> update it is handling
+        self.stalls = collections.deque(maxlen=20)
+        self.stats = {'stalls': 0, 'max_lag_ms': 0.0, 'total_blocked_ms': 0.0}
+
+    async def label_update(self, update, context):
+        """First handler group: remember which update the current task is handling"""
+        task = asyncio.current_task()
+        if task is not None:
+            self.labels[task] = describe_update(update)
+
+    async def start_job(self, context):
+        self.start()
+
+    def start(self):
+        """Start ticking on the running loop and watching from a thread (again after a restart's new loop)"""
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+        self.loop = loop
+        self.thread_id = threading.get_ident()
+        self.beat = time.monotonic()
+        loop.create_task(self._ticker())
+        threading.Thread(target=self._watch, args=(loop,), name=MONITOR_THREAD, daemon=True).start()
+
+    async def _ticker(self):
+        while True:
+            self.beat = time.monotonic()
+            await asyncio.sleep(self.tick)
+
+    def culprit(self):
+        """(what the running task handles, where in our code the loop thread is) right now"""
+        task = asyncio.current_task(self.loop)
+        label = self.labels.get(task) if task is not None else None
+        if label is None:
+            label = f"task {task.get_name()}" if task is not None else "loop callback"
+        frame = sys._current_frames().get(self.thread_id)
+        where = None
+        while frame is not None:
+            if frame.f_code.co_filename.startswith(ROOT) and frame.f_code.co_filename != __file__:
+                where = frame_label(frame)
+                break
+            frame = frame.f_back
+        return label, where
+
+    def _watch(self, loop):
+        stalled_since, culprit = None, None
+        # Ends with its loop, or when start() moved on to a newer one
+        while self.loop is loop and not loop.is_closed():
+            time.sleep(self.tick)
+            beat = self.beat
+            late = time.monotonic() - beat - self.tick
+            if stalled_since is None and late > self.threshold:
+                # Still blocked: look now, while the offender is on the stack
+                stalled_since, culprit = beat, self.culprit()
+            elif stalled_since is not None and beat != stalled_since:
+                self._report(beat - stalled_since - self.tick, *culprit)
+                stalled_since = None
+
+    def _report(self, blocked, label, where):
+        blocked_ms = blocked * 1000
+        self.stats['stalls'] += 1
+        self.stats['total_blocked_ms'] += blocked_ms
+        self.stats['max_lag_ms'] = max(self.stats['max_lag_ms'], blocked_ms)
+        self.stalls.append({'blocked_ms': round(blocked_ms, 1), 'update': label, 'where': where,
+                            'at': time.strftime('%H:%M:%S')})
+        print(f"🐢 Event loop blocked {blocked_ms:.0f} ms by {label}" + (f" in {where}" if where else ""))
+
+    def metrics(self):
+        return {**self.stats, 'running': self.loop is not None and not self.loop.is_closed(), 'recent_stalls': list(self.stalls)}
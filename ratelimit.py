@@ -0,0 +1,103 @@
+"""Per-user rate limiting for TAP&EAT.
+
+A token bucket per user sits in front of every handler (handler group -3).
+Each update costs one token; tokens refill at RATE_LIMIT_PER_SECOND up to
+RATE_LIMIT_BURST. Updates over the limit stop there, before any database
+query or API call: button taps still get a cheap empty answer (so the
+button stops spinning) with a "slow down" text at most once per
+RATE_LIMIT_NOTICE_SECONDS, and messages are dropped with the same
+occasional notice.
+
+Buckets are (tokens, last_update) tuples in a dict. A bucket idle long
+enough to be full again is the same as no bucket, so sweep() drops those and
+memory only holds recently active users.
+"""
+import os
+import time
+
+from telegram.ext import ApplicationHandlerStop
+
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", 2))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", 8))
+RATE_LIMIT_NOTICE_SECONDS = 5
+RATE_LIMIT_SWEEP_SECONDS = 60
+
+
+class RateLimiter:
+    """Token bucket per user with idle-bucket eviction"""
+
+    def __init__(self, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST, exempt=()):
+        self.rate = rate
+        self.burst = burst
+        self.exempt = set(exempt)
+        self.ttl = burst / rate  # an idle bucket is full again after this long
+        self.buckets = {}  # user_id -> (tokens, last_update)
+        self.noticed = {}  # user_id -> when we last told them to slow down
+        self.stats = {
+            'allowed': 0, 'throttled_callbacks': 0, 'throttled_messages': 0,
+            'throttled_other': 0, 'notices_sent': 0, 'evicted': 0,
+        }
+
+    def allow(self, user_id, now=None):
+        """Take a token for user_id; False if their bucket is empty"""
+        now = time.monotonic() if now is None else now
+        tokens, last = self.buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self.buckets[user_id] = (tokens, now)
+            return False
+        self.buckets[user_id] = (tokens - 1, now)
+        return True
+
+    def should_notice(self, user_id, now):
+        if now - self.noticed.get(user_id, float('-inf')) < RATE_LIMIT_NOTICE_SECONDS:
+            return False
+        self.noticed[user_id] = now
+        return True
+
+    def sweep(self, now=None):
+        """Forget buckets that have refilled and notices that have expired"""
+        now = time.monotonic() if now is None else now
+        idle = [user_id for user_id, (_, last) in self.buckets.items() if now - last >= self.ttl]
+        for user_id in idle:
+            del self.buckets[user_id]
+        for user_id in [user_id for user_id, at in self.noticed.items() if now - at >= RATE_LIMIT_NOTICE_SECONDS]:
+            del self.noticed[user_id]
+        self.stats['evicted'] += len(idle)
+        return len(idle)
+
+    async def sweep_job(self, context):
+        self.sweep()
+
+    async def check(self, update, context):
+        """First handler group: stop updates from users over their limit"""
+        user = update.effective_user
+        if user is None or user.id in self.exempt:
+            return
+        if self.allow(user.id):
+            self.stats['allowed'] += 1
+            return
+
+        now = time.monotonic()
+        try:
+            if update.callback_query:
+                self.stats['throttled_callbacks'] += 1
+                # Always answer, or the button keeps spinning; only the text is rate limited
+                if self.should_notice(user.id, now):
+                    self.stats['notices_sent'] += 1
+                    await update.callback_query.answer("⏳ Slow down a little!")
+                else:
+                    await update.callback_query.answer()
+            elif update.message:
+                self.stats['throttled_messages'] += 1
+                if self.should_notice(user.id, now):
+                    self.stats['notices_sent'] += 1
+                    await update.message.reply_text("⏳ You're sending messages too fast. Please wait a moment.")
+            else:
+                self.stats['throttled_other'] += 1
+        except Exception as e:
+            print(f"⚠️ Could not send rate limit notice to {user.id}: {e}")
+        raise ApplicationHandlerStop
+
+    def metrics(self):
+        return {**self.stats, 'tracked_users': len(self.buckets)}
@@ -0,0 +1,154 @@
+"""Anonymized recording of incoming updates, for replay.py.
+
+With RECORD_UPDATES_FILE set, every update the bot receives is appended to
+that file as one compact JSON line: {"t": seconds since recording started,
+"u": update}. Each process start adds a header line first. Ending the name
+in .gz writes gzip instead. Nothing personal is kept:
+
+* user and chat ids become stable pseudonyms (a keyed hash). The key stays
+  next to the log in <file>.key so ids match across restarts - share the
+  log, never the key. The admin always becomes ADMIN_PSEUDONYM
+* names and usernames are dropped; contacts and locations are removed
+* message texts keep their shape but not their content: letters become x,
+  digits 5 (a phone number stays a valid phone number). Commands and one-
+  or two-character answers (the "1"/"2" confirmation) are kept as typed.
+
+callback_data is kept as is - it only holds our own menu/order ids.
+Replay against a copy of the same database (e.g. a backup) to keep those
+ids meaningful.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+RECORD_UPDATES_FILE = os.environ.get("RECORD_UPDATES_FILE", "")
+RECORD_FLUSH_SECONDS = 2
+ADMIN_PSEUDONYM = 1
+
+IDENTITY_KEYS = ('from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat', 'via_bot')
+DROPPED_KEYS = ('contact', 'location', 'venue')
+TEXT_KEYS = ('text', 'caption')
+
+
+def open_log(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_log(path):
+    """Yield (segment, t, update dict) from a recording; segment counts process restarts"""
+    segment = -1
+    with open_log(path, 'r') as f:
+        for line in f:
+            entry = json.loads(line)
+            if 'recording' in entry:
+                segment += 1
+                continue
+            yield segment, entry['t'], entry['u']
+
+
+def scrub_text(text):
+    """Keep a message's shape (length, digits, punctuation, emoji) but not what it says"""
+    if text.startswith('/') or len(text) <= 2:
+        return text
+    return ''.join(
+        '5' if ch.isdigit() else ('X' if ch.isupper() else 'x') if ch.isalpha() else ch
+        for ch in text
+    )
+
+
+class UpdateRecorder:
+    """Appends anonymized updates to a log file, flushed every RECORD_FLUSH_SECONDS"""
+
+    def __init__(self, path, admin_id, flush_seconds=RECORD_FLUSH_SECONDS):
+        self.path = path
+        self.admin_id = admin_id
+        self.flush_seconds = flush_seconds
+        self.salt = self.load_key()
+        self.started = time.monotonic()
+        self.flushed_at = self.started
+        self.header_written = False
+        self.buffer = []
+        self.stats = {'recorded': 0, 'bytes_written': 0, 'write_errors': 0}
+
+    def load_key(self):
+        """The pseudonym key of this recording, created (owner-only) on first use"""
+        key_path = self.path + '.key'
+        try:
+            with open(key_path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            key = os.urandom(16).hex()
+            with os.fdopen(os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w') as f:
+                f.write(key)
+            return key
+
+    def pseudonym(self, user_id):
+        if user_id == self.admin_id:
+            return ADMIN_PSEUDONYM
+        digest = hashlib.blake2b(str(user_id).encode(), key=bytes.fromhex(self.salt), digest_size=5).digest()
+        return 1000 + int.from_bytes(digest, 'big')
+
+    def anonymize(self, data):
+        if isinstance(data, list):
+            return [self.anonymize(value) for value in data]
+        if not isinstance(data, dict):
+            return data
+        clean = {}
+        for key, value in data.items():
+            if key in DROPPED_KEYS:
+                continue
+            if key in IDENTITY_KEYS and isinstance(value, dict):
+                clean[key] = {
+                    'id': self.pseudonym(value.get('id')),
+                    **{k: v for k, v in value.items() if k in ('is_bot', 'type', 'language_code')},
+                    **({'first_name': 'User'} if 'first_name' in value else {}),
+                }
+            elif key in TEXT_KEYS and isinstance(value, str):
+                clean[key] = scrub_text(value)
+            else:
+                clean[key] = self.anonymize(value)
+        return clean
+
+    async def record(self, update):
+        entry = {'t': round(time.monotonic() - self.started, 3), 'u': self.anonymize(update.to_dict())}
+        self.buffer.append(json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n')
+        self.stats['recorded'] += 1
+        if time.monotonic() - self.flushed_at >= self.flush_seconds:
+            await self.flush()
+
+    async def check(self, update, context):
+        """First handler group: record the update, then let it through"""
+        await self.record(update)
+
+    async def flush_job(self, context):
+        await self.flush()
+
+    async def flush(self):
+        lines, self.buffer = self.buffer, []
+        self.flushed_at = time.monotonic()
+        if not lines:
+            return
+        try:
+            await asyncio.to_thread(self.write, lines)
+        except OSError as e:
+            self.stats['write_errors'] += 1
+            print(f"⚠️ Could not write update recording: {e}")
+
+    def write(self, lines):
+        if not self.header_written:
+            header = {'recording': 1, 'started': datetime.utcnow().isoformat(timespec='seconds')}
+            lines = [json.dumps(header) + '\n'] + lines
+            self.header_written = True
+        text = ''.join(lines)
+        with open_log(self.path, 'a') as f:
+            f.write(text)
+        self.stats['bytes_written'] += len(text.encode())
+
+    def metrics(self):
+        return {**self.stats, 'path': self.path, 'buffered': len(self.buffer)}
@@ -0,0 +1,105 @@
+"""Render cache for the bot's own messages.
+
+Most screens are edits of the message whose button was tapped, and taps are
+often repeats: "Back" on the main menu, My Info or Stats again, a double
+tap while Telegram is slow. Editing a message into what it already shows
+costs an API call and fails with "Message is not modified", which the
+handlers' broad excepts then turn into an error alert.
+
+RenderCache remembers a digest of the text, keyboard and parse mode (or
+photo and caption) each message was last rendered with, per (chat_id,
+message_id), in a bounded LRU of RENDER_CACHE_SIZE messages. An edit that
+would change nothing is skipped: button_handler has already answered the
+tap, so it costs no API call at all. A message the cache doesn't know
+(evicted, or from before a restart) is simply edited, and Telegram's "not
+modified" error is treated as success. With REPLICA_MODE a user's shard
+can move, and the replica that gets it edits messages another one cached:
+ReplicaCoordinator has every replica forget the messages in the chats of
+shards it gained or lost (forget_chats), so a cached digest is never older
+than this replica's ownership of the chat.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+RENDER_CACHE_SIZE = int(os.environ.get("RENDER_CACHE_SIZE", 20000))
+
+
+def digest(*parts):
+    return hashlib.blake2b("\0".join(map(str, parts)).encode(), digest_size=16).digest()
+
+
+def markup_key(reply_markup):
+    return reply_markup.to_json() if reply_markup is not None else ""
+
+
+def message_key(query):
+    """(chat_id, message_id) of the message a callback query came from"""
+    message = query.message
+    if message is None:
+        return ('inline', query.inline_message_id)
+    return (message.chat_id, message.message_id)
+
+
+class RenderCache:
+    """Digest of what each bot message shows, to skip edits that change nothing"""
+
+    def __init__(self, size=RENDER_CACHE_SIZE):
+        self.size = size
+        self.shown = OrderedDict()  # (chat_id, message_id) -> digest
+        self.stats = {'edits': 0, 'skipped': 0, 'not_modified': 0, 'evictions': 0}
+
+    def remember(self, key, rendered):
+        self.shown[key] = rendered
+        self.shown.move_to_end(key)
+        if len(self.shown) > self.size:
+            self.shown.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def forget(self, query):
+        """The message was deleted or replaced"""
+        self.shown.pop(message_key(query), None)
+
+    def forget_chats(self, moved):
+        """Forget the messages of chats whose shard moved (moved: chat_id -> bool)"""
+        for key in [key for key in self.shown if key[0] != 'inline' and moved(key[0])]:
+            del self.shown[key]
+
+    async def _edit(self, query, rendered, send):
+        key = message_key(query)
+        if self.shown.get(key) == rendered:
+            self.shown.move_to_end(key)
+            self.stats['skipped'] += 1
+            return query.message
+        try:
+            message = await send()
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                raise
+            self.stats['not_modified'] += 1
+            message = query.message
+        else:
+            self.stats['edits'] += 1
+        self.remember(key, rendered)
+        return message
+
+    async def edit_text(self, query, text, reply_markup=None, parse_mode=None):
+        """query.edit_message_text, unless the message already shows exactly this"""
+        return await self._edit(
+            query, digest('text', text, markup_key(reply_markup), parse_mode),
+            lambda: query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        )
+
+    async def edit_media(self, query, media, reply_markup=None):
+        """query.edit_message_media for an InputMedia*, unless the message already shows it"""
+        return await self._edit(
+            query, digest('media', media.media, media.caption, markup_key(reply_markup)),
+            lambda: query.edit_message_media(media, reply_markup=reply_markup)
+        )
+
+    def metrics(self):
+        calls = self.stats['edits'] + self.stats['skipped'] + self.stats['not_modified']
+        return {**self.stats, 'cached': len(self.shown),
+                'skip_ratio': round(self.stats['skipped'] / calls, 3) if calls else None}
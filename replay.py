@@ -0,0 +1,294 @@
+"""Replay a recorded update stream (recording.py) against a stand-in Bot API.
+
+    python replay.py updates.jsonl [--speed 1|10|max] [--db backups/tap_eat-....db.gz]
+                     [--api-latency-ms 30] [--out result.json] [--compare baseline.json]
+
+The updates go through the real Application - every handler, the store and
+its queries - in a throwaway directory. Bot API calls go to StandInBotAPI,
+which answers like Telegram after --api-latency-ms. Updates are handled one
+after another like the polling loop does, and an update's latency is counted
+from when it was due (its recorded time / speed) to when its handlers
+finished, so queueing behind a slow update counts too. At max speed every
+update is due as soon as the previous one is done.
+
+Save a run with --out on one build and pass it to --compare on the next to
+see latency and database load side by side. Use --db with a backup from the
+recorded deployment so menu and order ids in callback_data exist.
+"""
+import argparse
+import asyncio
+import collections
+import gzip
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_updates(path, max_gap):
+    """[(due offset in seconds, update dict)] across all recording segments"""
+    from recording import read_log
+    entries, clock, last_t, last_segment = [], 0.0, 0.0, None
+    for segment, t, update in read_log(path):
+        # A restart begins a new clock: carry on right after the previous segment
+        gap = max(0.0, t - last_t) if segment == last_segment else 0.0
+        clock += min(gap, max_gap) if max_gap else gap
+        entries.append((clock, update))
+        last_t, last_segment = t, segment
+    return entries
+
+
+def make_stand_in(latency):
+    from telegram.request import BaseRequest
+
+    class StandInBotAPI(BaseRequest):
+        """Answers Bot API calls like Telegram would, after a fixed latency.
+
+        Like Telegram, it refuses a second answerCallbackQuery for the same
+        callback query, so handlers answering twice show up as errors.
+        """
+
+        def __init__(self):
+            self.calls = collections.Counter()
+            self.next_message_id = 100000
+            self.answered = set()
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                             connect_timeout=None, pool_timeout=None):
+            name = url.rsplit('/', 1)[-1]
+            self.calls[name] += 1
+            await asyncio.sleep(latency)
+            params = request_data.parameters if request_data else {}
+            if name == 'answerCallbackQuery':
+                query_id = params.get('callback_query_id')
+                if query_id in self.answered:
+                    self.calls['rejected'] += 1
+                    return 400, json.dumps({
+                        'ok': False, 'error_code': 400,
+                        'description': "Bad Request: query is too old and response timeout expired or query id is invalid"
+                    }).encode()
+                self.answered.add(query_id)
+            return 200, json.dumps({'ok': True, 'result': self.result(name, params)}).encode()
+
+        def result(self, name, params):
+            if name == 'getMe':
+                return {'id': 999, 'is_bot': True, 'first_name': 'TAP&EAT', 'username': 'tap_eat_replay_bot',
+                        'can_join_groups': False, 'can_read_all_group_messages': False,
+                        'supports_inline_queries': False}
+            if name.startswith(('send', 'edit')):
+                self.next_message_id += 1
+                try:
+                    chat_id = int(params.get('chat_id', 1))
+                except (TypeError, ValueError):
+                    chat_id = 1
+                message = {'message_id': params.get('message_id', self.next_message_id), 'date': int(time.time()),
+                           'chat': {'id': chat_id, 'type': 'private'}}
+                if name in ('sendPhoto', 'editMessageMedia'):
+                    message['photo'] = [{'file_id': f'replay-photo-{self.next_message_id}',
+                                         'file_unique_id': f'p{self.next_message_id}', 'width': 1, 'height': 1}]
+                    message['caption'] = params.get('caption')
+                elif name == 'sendDocument':
+                    message['document'] = {'file_id': f'replay-doc-{self.next_message_id}',
+                                           'file_unique_id': f'd{self.next_message_id}'}
+                else:
+                    message['text'] = params.get('text') or ''
+                return message
+            return True
+
+    return StandInBotAPI()
+
+
+def count_queries(store):
+    """Wrap the store primitives to count statements, transactions and time spent in them"""
+    stats = {'statements': 0, 'transactions': 0, 'db_seconds': 0.0}
+    for name in ('execute', 'executemany', 'fetchone', 'fetchall'):
+        async def timed(*args, _original=getattr(store, name), **kwargs):
+            started = time.perf_counter()
+            try:
+                return await _original(*args, **kwargs)
+            finally:
+                stats['statements'] += 1
+                stats['db_seconds'] += time.perf_counter() - started
+        setattr(store, name, timed)
+
+    transaction = store.transaction
+    def counted_transaction():
+        stats['transactions'] += 1
+        return transaction()
+    store.transaction = counted_transaction
+    return stats
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def replay(entries, speed, latency):
+    from telegram import Update
+    import boot
+
+    api = make_stand_in(latency)
+    application = boot.build_application(schedule_jobs=False, with_updater=False, request=api)
+    errors = collections.Counter()
+
+    async def on_error(update, context):
+        errors[type(context.error).__name__] += 1
+    application.add_error_handler(on_error)
+
+    await boot.init_database()
+    db = count_queries(boot.store)
+    latencies = []
+    queue = asyncio.Queue()
+
+    async def handle():
+        # One at a time, like Application's own update fetcher
+        while True:
+            due, update = await queue.get()
+            if update is None:
+                return
+            due = due or time.perf_counter()  # at max speed there is no schedule to be late for
+            await application.process_update(update)
+            latencies.append(time.perf_counter() - due)
+
+    async with application:
+        await application.start()
+        worker = asyncio.ensure_future(handle())
+        started = time.perf_counter()
+        for offset, data in entries:
+            if speed:
+                await asyncio.sleep(max(0, started + offset / speed - time.perf_counter()))
+            queue.put_nowait((time.perf_counter() if speed else None, Update.de_json(data, application.bot)))
+        queue.put_nowait((0, None))
+        await worker
+        wall = time.perf_counter() - started
+        await application.stop()
+    await boot.store.close()
+    # Handlers swallow their own exceptions, so count what the stand-in refused as errors too
+    rejected = api.calls.pop('rejected', 0)
+    if rejected:
+        errors['repeated answerCallbackQuery'] += rejected
+
+    latencies.sort()
+    return {
+        'build': git_revision(),
+        'updates': len(entries),
+        'speed': speed or 'max',
+        'wall_seconds': round(wall, 3),
+        'updates_per_second': round(len(entries) / wall, 1) if wall else None,
+        'latency_ms': {
+            'p50': round(statistics.median(latencies) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2),
+        } if latencies else {},
+        'db': {**db, 'db_seconds': round(db['db_seconds'], 3),
+               'statements_per_update': round(db['statements'] / len(entries), 2) if entries else None},
+        'api_calls': dict(api.calls.most_common()),
+        'errors': dict(errors),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(result):
+    rows = {'wall_seconds': result['wall_seconds'], 'updates_per_second': result['updates_per_second']}
+    rows.update({f"latency {k} ms": v for k, v in result['latency_ms'].items()})
+    rows.update({f"db {k}": v for k, v in result['db'].items()})
+    rows['api calls'] = sum(result['api_calls'].values())
+    rows['errors'] = sum(result['errors'].values())
+    return rows
+
+
+def print_result(result, baseline=None):
+    speed = 'max speed' if result['speed'] == 'max' else f"{result['speed']:g}x"
+    print(f"🎬 Replayed {result['updates']} updates at {speed} on {result['build'] or 'this tree'}")
+    current = flatten(result)
+    if baseline is None:
+        for name, value in current.items():
+            print(f"  {name:26} {value}")
+        return
+    before = flatten(baseline)
+    print(f"  {'':26} {baseline['build'] or 'baseline':>12} {result['build'] or 'current':>12} {'change':>9}")
+    for name, value in current.items():
+        old = before.get(name)
+        change = f"{(value - old) / old * 100:+8.1f}%" if old and value is not None else f"{'':>9}"
+        print(f"  {name:26} {old if old is not None else '-':>12} {value:>12} {change}")
+
+
+def prepare_directory(directory, db):
+    """Point the bot at a throwaway directory (and a copy of --db) before it is imported"""
+    if db:
+        target = os.path.join(directory, "tap_eat.db")
+        opener = gzip.open if db.endswith('.gz') else open
+        with opener(db, 'rb') as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+    os.chdir(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="recording made with RECORD_UPDATES_FILE")
+    parser.add_argument("--speed", default="1", help="1, 10, ... or max")
+    parser.add_argument("--db", help="database (or .db.gz backup) to start from; default: a fresh one")
+    parser.add_argument("--api-latency-ms", type=float, default=30)
+    parser.add_argument("--max-gap", type=float, default=0, help="shorten idle gaps to this many seconds")
+    parser.add_argument("--out", help="save the result as JSON")
+    parser.add_argument("--compare", help="JSON result of an earlier run to compare with")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    log = os.path.abspath(args.log)
+    db = os.path.abspath(args.db) if args.db else None
+    out = os.path.abspath(args.out) if args.out else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    # Before any project import: modules read their settings from the environment once, when imported
+    os.environ.update(
+        BOT_TOKEN="123456:replay-token",
+        DATABASE_URL="",
+        RECORD_UPDATES_FILE="",
+        # Keep the recorded users' own pace: a 10x replay shouldn't trip the rate limiter
+        RATE_LIMIT_PER_SECOND=str(2 * speed if speed else 1e9),
+        RATE_LIMIT_BURST=str(8 * speed if speed else 1e9),
+    )
+    sys.path.insert(0, ROOT)
+    from recording import ADMIN_PSEUDONYM
+    os.environ["ADMIN_ID"] = str(ADMIN_PSEUDONYM)
+    entries = load_updates(log, args.max_gap)
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["BACKUP_DIR"] = os.path.join(directory, "backups")
+        prepare_directory(directory, db)
+        result = asyncio.run(replay(entries, speed, args.api_latency_ms / 1000))
+        os.chdir(ROOT)
+
+    print_result(result, baseline)
+    if out:
+        with open(out, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Saved to {out}")
+    return 1 if result['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
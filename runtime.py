@@ -0,0 +1,31 @@
+"""Process-wide state shared by the bot, the web server and the worker pool.
+
+Import-light on purpose (no telegram, no Flask) so /health can be served
+while the bot modules are still loading.
+"""
+from threading import Event, Thread
+
+from config import DATABASE_FILE, PORT
+from kitchen import KitchenFeed
+from storage import create_store
+
+store = create_store(DATABASE_FILE)
+ready = Event()  # Set once the bot can take updates; gates /health
+shutdown_hooks = []  # Async callables run after handlers drained (flush queues, offsets...)
+worker_pool = None  # workers.WorkerPool when running with WORKER_PROCESSES
+metrics = {}  # name -> callable returning a dict, served on /metrics
+kitchen = KitchenFeed()  # Live order events for the /kitchen display
+metrics['kitchen'] = kitchen.metrics
+
+_web_thread = None
+
+def start_web_server():
+    """Start the web server thread once; Flask is imported there, off the startup path"""
+    global _web_thread
+    if _web_thread is None:
+        _web_thread = Thread(target=_run_web, name="web", daemon=True)
+        _web_thread.start()
+
+def _run_web():
+    import web
+    web.run_flask(PORT)
@@ -0,0 +1,241 @@
+"""Multi-replica mode for TAP&EAT.
+
+Several bot processes share one Store (normally PostgreSQL via DATABASE_URL):
+
+* Leases in the leases table decide who does what. The replica holding the
+  "leader" lease is the only one calling getUpdates; every replica holds a
+  "replica:<id>" heartbeat lease and a fair share of "shard:<n>" leases.
+* Each update belongs to shard user_id % REPLICA_SHARDS. The leader handles
+  updates for its own shards directly and parks the rest in update_inbox,
+  where the owning replica claims them - so a user's updates are always
+  processed in order by exactly one replica.
+* StorePersistence keeps context.user_data in user_sessions, so a shard can
+  move to another replica without losing a half-finished order.
+
+Locally, two processes on the same SQLite file are enough to try it:
+REPLICA_MODE=1 python main.py (in two terminals with different PORTs).
+"""
+import asyncio
+import json
+import math
+import os
+import socket
+import time
+import uuid
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, BasePersistence, PersistenceInput
+
+REPLICA_SHARDS = int(os.environ.get("REPLICA_SHARDS", 16))
+LEASE_TTL = float(os.environ.get("REPLICA_LEASE_TTL", 15))
+INBOX_POLL_SECONDS = float(os.environ.get("REPLICA_INBOX_POLL", 0.25))
+LEADER_LEASE = "leader"
+
+
+def shard_for(user_id, shards=REPLICA_SHARDS):
+    """Map a user to the shard that owns their updates"""
+    return (user_id or 0) % shards
+
+
+def update_shard(update, shards=REPLICA_SHARDS):
+    user = update.effective_user
+    return shard_for(user.id if user else 0, shards)
+
+
+class StorePersistence(BasePersistence):
+    """Keeps context.user_data in the store so any replica can pick a user up.
+
+    Users are loaded lazily on their first update (refresh_user_data) rather
+    than all at startup; forget() marks users as stale when their shard moves.
+    """
+
+    def __init__(self, store, update_interval=2):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.store = store
+        self.loaded = set()
+
+    def forget(self, shards):
+        """Reload these shards' users from the store on their next update"""
+        self.loaded = {user_id for user_id in self.loaded if shard_for(user_id) not in shards}
+
+    async def get_user_data(self):
+        return {}
+
+    async def refresh_user_data(self, user_id, user_data):
+        if user_id in self.loaded:
+            return
+        data = await self.store.get_session(user_id)
+        user_data.clear()
+        if data:
+            user_data.update(json.loads(data))
+        self.loaded.add(user_id)
+
+    async def update_user_data(self, user_id, data):
+        await self.store.save_session(user_id, json.dumps(data, default=str))
+
+    async def drop_user_data(self, user_id):
+        self.loaded.discard(user_id)
+        await self.store.delete_session(user_id)
+
+    # Only user_data is shared between replicas
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def update_conversation(self, name, key, new_state):
+        pass
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        pass
+
+
+class ReplicaCoordinator:
+    """Holds this replica's leases and routes updates to the shard owners"""
+
+    def __init__(self, store, application, shards=REPLICA_SHARDS, lease_ttl=LEASE_TTL):
+        self.store = store
+        self.application = application
+        self.shards = shards
+        self.lease_ttl = lease_ttl
+        self.replica_id = os.environ.get("REPLICA_ID") or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+        self.owned = set()
+        self.routed = 0
+        self.claimed = 0
+        self.shard_listeners = []  # called with a user_id -> bool predicate when shards move
+
+    # ----- Leases -----
+    async def tick(self):
+        """Renew the heartbeat, contend for leadership and rebalance shards"""
+        now = time.time()
+        await self.store.acquire_lease(f"replica:{self.replica_id}", self.replica_id, self.lease_ttl, now)
+
+        was_leader = self.is_leader
+        self.is_leader = await self.store.acquire_lease(LEADER_LEASE, self.replica_id, self.lease_ttl, now)
+        if self.is_leader != was_leader:
+            print(f"👑 Replica {self.replica_id} {'is now' if self.is_leader else 'is no longer'} the leader")
+
+        leases = await self.store.list_live_leases(now)
+        replicas = sum(1 for name, _ in leases if name.startswith("replica:"))
+        fair_share = math.ceil(self.shards / max(1, replicas))
+        taken = {
+            int(name.split(":")[1]): holder
+            for name, holder in leases if name.startswith("shard:")
+        }
+
+        owned = {shard for shard, holder in taken.items() if holder == self.replica_id}
+        # Hand back shards beyond our fair share so new replicas get work
+        for shard in sorted(owned)[fair_share:]:
+            await self.release_shard(shard)
+            owned.discard(shard)
+
+        for shard in range(self.shards):
+            if shard in owned or (shard not in taken and len(owned) < fair_share):
+                if await self.store.acquire_lease(f"shard:{shard}", self.replica_id, self.lease_ttl, now):
+                    owned.add(shard)
+                else:
+                    owned.discard(shard)
+
+        # Shards can also be lost without release_shard, when our lease expired
+        moved = owned ^ self.owned
+        if moved:
+            self.forget_shards(moved)
+        self.owned = owned
+
+    def owns_user(self, user_id):
+        return shard_for(user_id, self.shards) in self.owned
+
+    def forget_shards(self, shards):
+        """Drop what this replica cached about the users of shards it gained or lost"""
+        self.application.persistence.forget(shards)
+        moved = lambda user_id: shard_for(user_id, self.shards) in shards
+        for listener in self.shard_listeners:
+            listener(moved)
+
+    async def release_shard(self, shard):
+        # Flush user_data first so the next owner sees the latest state
+        await self.application.update_persistence()
+        await self.store.release_lease(f"shard:{shard}", self.replica_id)
+        self.forget_shards({shard})
+
+    async def release_all(self):
+        for shard in sorted(self.owned):
+            await self.release_shard(shard)
+        self.owned = set()
+        await self.store.release_lease(LEADER_LEASE, self.replica_id)
+        await self.store.release_lease(f"replica:{self.replica_id}", self.replica_id)
+        self.is_leader = False
+
+    # ----- Update routing -----
+    async def route_update(self, update, context):
+        """First handler group: stop updates for shards owned by other replicas"""
+        shard = update_shard(update, self.shards)
+        if shard in self.owned:
+            return
+        await self.store.enqueue_update(shard, json.dumps(update.to_dict()))
+        self.routed += 1
+        raise ApplicationHandlerStop
+
+    async def drain_inbox(self):
+        """Feed updates other replicas parked for our shards into the local queue"""
+        rows = await self.store.claim_updates(sorted(self.owned))
+        for _, payload in rows:
+            update = Update.de_json(json.loads(payload), self.application.bot)
+            await self.application.update_queue.put(update)
+        self.claimed += len(rows)
+        return len(rows)
+
+    # ----- Main loop -----
+    async def run(self, stop_event, polling_kwargs):
+        """Keep leases fresh, poll Telegram while leader and drain the inbox"""
+        updater = self.application.updater
+        next_tick = 0
+        while not stop_event.is_set():
+            try:
+                if time.monotonic() >= next_tick:
+                    await self.tick()
+                    next_tick = time.monotonic() + self.lease_ttl / 3
+                    if self.is_leader and not updater.running:
+                        await updater.start_polling(**polling_kwargs)
+                    elif not self.is_leader and updater.running:
+                        await updater.stop()
+                await self.drain_inbox()
+            except Exception as e:
+                print(f"❌ Replica coordination error: {e}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=INBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+        if updater.running:
+            await updater.stop()
+        await self.release_all()
@@ -0,0 +1,134 @@
+"""Idle-session eviction for TAP&EAT.
+
+PTB keeps a context.user_data dict for every user who ever used a button,
+and abandoned flows leave their keys behind (item_name, price,
+awaiting_info, pending_orders...). Without eviction the process grows with
+the whole user base instead of the users active right now.
+
+IdleSessions drops the user_data of anyone idle for SESSION_IDLE_MINUTES.
+Users sit on a hashed timing wheel of SESSION_WHEEL_SLOTS slots, one slot
+per tick of SESSION_IDLE_MINUTES / SESSION_WHEEL_SLOTS:
+
+* every update through the bot records the current tick for its user
+  (one dict write; a new user is also added to the current slot)
+* each tick looks only at the users in the slot coming due - those seen
+  one full turn ago. Users touched since move to the slot of their last
+  update; the rest are evicted.
+
+So a tick costs as much as the users going idle in it, never a scan of
+everyone, and a session lives at most one tick longer than the TTL. All of
+user_data is flow state, so an idle session is dropped whole; with
+REPLICA_MODE that also deletes the stored session, like a finished order
+does. A replica only ever drops sessions of shards it owns: users of a
+shard that moved away leave the wheel (forget_users), and owns() is checked
+again before each eviction.
+"""
+import os
+import random
+import sys
+import time
+
+SESSION_IDLE_MINUTES = float(os.environ.get("SESSION_IDLE_MINUTES", 30))
+SESSION_WHEEL_SLOTS = 60
+SESSION_SAMPLE = 500  # sessions measured for the memory estimate
+
+
+def estimate_bytes(value, seen, depth=4):
+    """Approximate memory of a session dict and what it holds (sys.getsizeof, a few levels deep).
+
+    Objects in seen are not counted again: keys and catalog names are shared by every session.
+    """
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if depth <= 0:
+        return size
+    if isinstance(value, dict):
+        # list() copies in one step: the bot may change the dict meanwhile (metrics run in Flask's thread)
+        size += sum(estimate_bytes(k, seen, depth - 1) + estimate_bytes(v, seen, depth - 1)
+                    for k, v in list(value.items()))
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(estimate_bytes(item, seen, depth - 1) for item in list(value))
+    return size
+
+
+class IdleSessions:
+    """Timing wheel of users by last activity; evicts user_data of the idle ones"""
+
+    def __init__(self, idle_seconds=SESSION_IDLE_MINUTES * 60, slots=SESSION_WHEEL_SLOTS):
+        self.slots = [set() for _ in range(slots)]
+        self.tick_seconds = idle_seconds / slots
+        self.tick = 0
+        self.last_seen = {}  # user_id -> tick of their last update
+        self.application = None
+        self.owns = None  # user_id -> whether this replica owns their session (REPLICA_MODE)
+        self.stats = {'evicted': 0, 'moved': 0, 'ticks': 0, 'last_tick_ms': 0.0, 'max_tick_ms': 0.0}
+
+    def touch(self, user_id):
+        if user_id not in self.last_seen:
+            self.slots[self.tick % len(self.slots)].add(user_id)
+        self.last_seen[user_id] = self.tick
+
+    async def check(self, update, context):
+        """Late handler group: the user was just active"""
+        if update.effective_user is not None:
+            self.application = context.application
+            self.touch(update.effective_user.id)
+
+    def advance(self):
+        """Move the wheel one tick; returns the users idle for a full turn"""
+        self.tick += 1
+        size = len(self.slots)
+        index = self.tick % size
+        due, self.slots[index] = self.slots[index], set()
+        idle = []
+        for user_id in due:
+            seen = self.last_seen[user_id]
+            if self.tick - seen >= size:
+                del self.last_seen[user_id]
+                idle.append(user_id)
+            else:
+                self.slots[seen % size].add(user_id)
+                self.stats['moved'] += 1
+        return idle
+
+    def forget_users(self, moved):
+        """Take users whose shard moved to another replica off the wheel"""
+        for user_id in [user_id for user_id in self.last_seen if moved(user_id)]:
+            del self.last_seen[user_id]
+        for slot in self.slots:
+            slot.difference_update([user_id for user_id in slot if moved(user_id)])
+
+    async def tick_job(self, context):
+        started = time.perf_counter()
+        self.application = context.application
+        idle = self.advance()
+        if self.owns is not None:
+            idle = [user_id for user_id in idle if self.owns(user_id)]
+        for user_id in idle:
+            context.application.drop_user_data(user_id)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.stats['evicted'] += len(idle)
+        self.stats['ticks'] += 1
+        self.stats['last_tick_ms'] = round(elapsed, 3)
+        self.stats['max_tick_ms'] = max(self.stats['max_tick_ms'], self.stats['last_tick_ms'])
+
+    def memory_estimate(self, sample=SESSION_SAMPLE):
+        """(live sessions, estimated bytes) of the application's user_data, from a sample"""
+        if self.application is None:
+            return 0, 0
+        sessions = list(self.application.user_data.values())
+        if not sessions:
+            return 0, 0
+        measured = random.sample(sessions, min(sample, len(sessions)))
+        seen = set()
+        per_session = sum(estimate_bytes(session, seen) for session in measured) / len(measured)
+        # Plus the wheel's own entry per user (last_seen and a slot)
+        overhead = sys.getsizeof(self.last_seen) + sum(sys.getsizeof(slot) for slot in list(self.slots))
+        return len(sessions), round(per_session * len(sessions) + overhead)
+
+    def metrics(self):
+        live, estimate = self.memory_estimate()
+        return {**self.stats, 'live_sessions': live, 'tracked_users': len(self.last_seen),
+                'estimated_bytes': estimate, 'idle_minutes': self.tick_seconds * len(self.slots) / 60}
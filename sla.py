@@ -0,0 +1,201 @@
+"""Pending-order deadlines for TAP&EAT: staff reminders and auto-expiry.
+
+Every pending order gets two deadlines on an in-memory min-heap: a reminder
+after ORDER_REMIND_MINUTES and expiry after ORDER_EXPIRE_MINUTES. A single
+run_once job is always scheduled for the earliest deadline, so nothing wakes
+up (or touches the database) until something is actually due.
+
+The heap is filled from the orders placed in this process (track) plus an
+incremental sync over the (status, created_at) index for orders placed by
+other processes. Orders that get accepted/rejected are dropped lazily:
+resolve() forgets them and their heap entries are skipped when popped.
+Only the process running the scheduled jobs (the leader / worker 0) keeps
+deadlines; the others' track() and resolve() calls are no-ops.
+"""
+import calendar
+import heapq
+import os
+import time
+from datetime import datetime
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+ORDER_REMIND_MINUTES = float(os.environ.get("ORDER_REMIND_MINUTES", 10))
+ORDER_EXPIRE_MINUTES = float(os.environ.get("ORDER_EXPIRE_MINUTES", 45))
+DEADLINE_SYNC_SECONDS = 60
+DEADLINE_RETRY_SECONDS = 30  # after a failed expiry/reminder (database or Bot API error)
+# Extra staff chats that get the reminders besides the admin (comma-separated ids)
+STAFF_IDS = [int(x) for x in os.environ.get("STAFF_IDS", "").replace(" ", "").split(",") if x]
+
+REMIND = 'remind'
+EXPIRE = 'expire'
+
+
+def parse_created_at(created_at):
+    """Turn a CURRENT_TIMESTAMP string (UTC) into epoch seconds"""
+    return calendar.timegm(datetime.strptime(created_at[:19], '%Y-%m-%d %H:%M:%S').timetuple())
+
+
+class OrderDeadlines:
+    """Min-heap of pending-order deadlines driving one self-rescheduling job"""
+
+    def __init__(self, store, admin_id, should_run=lambda: True,
+                 remind_after=ORDER_REMIND_MINUTES * 60, expire_after=ORDER_EXPIRE_MINUTES * 60,
+                 kitchen=None, admission=None):
+        self.store = store
+        self.kitchen = kitchen  # kitchen.KitchenFeed told about expired orders
+        self.admission = admission  # admission.AdmissionControl, whose slots they free
+        self.staff_ids = [admin_id] + [i for i in STAFF_IDS if i != admin_id]
+        self.should_run = should_run
+        self.remind_after = remind_after
+        self.expire_after = expire_after
+        self.heap = []  # (deadline, order_id, stage)
+        self.pending = {}  # order_id -> (user_id, order_code, restaurant_name)
+        self.synced_from = ''  # created_at watermark for the incremental sync
+        self.job_queue = None
+        self.job = None
+        self.job_due = None
+        self.stats = {
+            'tracked': 0, 'reminded': 0, 'expired': 0, 'ticks': 0,
+            'last_tick_ms': 0.0, 'max_lag_seconds': 0.0,
+        }
+
+    # ----- Tracking -----
+    def track(self, order_id, user_id, order_code, restaurant_name, created_at):
+        """Start the clock on a pending order"""
+        if self.job_queue is None or order_id in self.pending:
+            # Only the process running the scheduled jobs keeps deadlines
+            return
+        created = parse_created_at(created_at)
+        self.pending[order_id] = (user_id, order_code, restaurant_name)
+        if self.remind_after and self.remind_after < self.expire_after:
+            heapq.heappush(self.heap, (created + self.remind_after, order_id, REMIND))
+        heapq.heappush(self.heap, (created + self.expire_after, order_id, EXPIRE))
+        self.stats['tracked'] += 1
+        self._schedule()
+
+    def resolve(self, order_id):
+        """The order left 'pending' - its heap entries are skipped when they come up"""
+        self.pending.pop(order_id, None)
+
+    async def sync(self, context=None):
+        """Pick up pending orders placed by other processes (index range scan from the watermark)"""
+        if not self.should_run():
+            # Only the leader acts on deadlines; it catches up from the watermark once it leads
+            return
+        rows = await self.store.list_pending_orders_since(self.synced_from)
+        for order_id, user_id, order_code, restaurant_name, created_at in rows:
+            self.track(order_id, user_id, order_code, restaurant_name, created_at)
+            self.synced_from = max(self.synced_from, created_at)
+
+    def start(self, job_queue):
+        self.job_queue = job_queue
+        self.job = None
+        job_queue.run_repeating(self.sync, interval=DEADLINE_SYNC_SECONDS, first=0, name='order_deadline_sync')
+
+    # ----- Scheduling -----
+    def _schedule(self):
+        """Make sure the job fires at the earliest live deadline"""
+        while self.heap and self.heap[0][1] not in self.pending:
+            heapq.heappop(self.heap)
+        if not self.heap or self.job_queue is None:
+            return
+        due = self.heap[0][0]
+        if self.job is not None:
+            if self.job_due <= due:
+                return
+            self.job.schedule_removal()
+        self.job_due = due
+        self.job = self.job_queue.run_once(self._on_due, when=max(0, due - time.time()), name='order_deadlines')
+
+    async def _on_due(self, context):
+        self.job = None
+        if not self.should_run():
+            # Another replica owns the schedule; check back later
+            self.job_due = time.time() + DEADLINE_SYNC_SECONDS
+            self.job = self.job_queue.run_once(self._on_due, when=DEADLINE_SYNC_SECONDS, name='order_deadlines')
+            return
+        started = time.perf_counter()
+        now = time.time()
+        reminders, expiries = [], []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, order_id, stage = heapq.heappop(self.heap)
+            if order_id not in self.pending:
+                continue
+            self.stats['max_lag_seconds'] = max(self.stats['max_lag_seconds'], now - deadline)
+            (expiries if stage == EXPIRE else reminders).append(order_id)
+
+        # The entries are off the heap now: on failure put them back, or the orders would never come due again
+        try:
+            if expiries:
+                await self._expire(context.bot, expiries)
+        except Exception as e:
+            print(f"❌ Error expiring orders: {e}")
+            self._retry(expiries, EXPIRE, now)
+        try:
+            if reminders:
+                # Orders may have been accepted in another process since we tracked them
+                still_pending = await self.store.filter_pending_orders(reminders)
+                for order_id in set(reminders) - still_pending:
+                    self.resolve(order_id)
+                reminders = [order_id for order_id in reminders if order_id in still_pending]
+            if reminders:
+                await self._remind(context.bot, reminders)
+        except Exception as e:
+            print(f"❌ Error sending order reminders: {e}")
+            self._retry(reminders, REMIND, now)
+
+        self.stats['ticks'] += 1
+        self.stats['last_tick_ms'] = (time.perf_counter() - started) * 1000
+        self._schedule()
+
+    def _retry(self, order_ids, stage, now):
+        """Put deadlines back on the heap after a failed attempt, DEADLINE_RETRY_SECONDS from now"""
+        for order_id in order_ids:
+            if order_id in self.pending:
+                heapq.heappush(self.heap, (now + DEADLINE_RETRY_SECONDS, order_id, stage))
+
+    # ----- Actions -----
+    async def _expire(self, bot, order_ids):
+        """Expire overdue orders in one UPDATE and tell each customer"""
+        expired = await self.store.expire_orders(order_ids)
+        for order_id in order_ids:
+            self.resolve(order_id)
+        if self.kitchen is not None:
+            self.kitchen.status_changed([order.id for order in expired], 'expired')
+        if self.admission is not None:
+            self.admission.status_changed([order.id for order in expired], 'expired')
+        for order_id, user_id, order_code in expired:
+            try:
+                await bot.send_message(
+                    user_id,
+                    f"⌛ Order #{order_id} ({order_code}) has expired - the restaurant couldn't confirm it in time.\n\n"
+                    f"Sorry about that! Please place a new order."
+                )
+            except Exception as e:
+                print(f"⚠️ Could not notify user {user_id}: {e}")
+        self.stats['expired'] += len(expired)
+        if expired:
+            print(f"⌛ Expired {len(expired)} overdue orders")
+
+    async def _remind(self, bot, order_ids):
+        """Send staff one message listing every order that just passed its reminder deadline"""
+        # Accepted/rejected while we awaited the pending check: resolve() already dropped them
+        waiting = [(order_id, self.pending.get(order_id)) for order_id in order_ids]
+        waiting = [(order_id, entry) for order_id, entry in waiting if entry is not None]
+        if not waiting:
+            return
+        lines = [f"⏰ {len(waiting)} order(s) waiting over {self.remind_after / 60:.0f} min:\n"]
+        for order_id, (_, order_code, restaurant_name) in waiting:
+            lines.append(f"• #{order_id} ({order_code}) - {restaurant_name}")
+        lines.append(f"\nUnconfirmed orders expire after {self.expire_after / 60:.0f} min.")
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("📊 View Orders", callback_data='view_orders')]])
+        for chat_id in self.staff_ids:
+            try:
+                await bot.send_message(chat_id, "\n".join(lines), reply_markup=keyboard)
+            except Exception as e:
+                print(f"⚠️ Could not send reminder to {chat_id}: {e}")
+        self.stats['reminded'] += len(waiting)
+
+    def metrics(self):
+        return {**self.stats, 'pending': len(self.pending), 'heap_size': len(self.heap)}
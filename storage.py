@@ -0,0 +1,1172 @@
+"""Storage backends for TAP&EAT.
+
+Store is the repository over users, restaurants, menu_items and orders.
+Every query is written once with ? placeholders; the backends only supply
+the driver primitives:
+
+* SQLiteStore   - the tap_eat.db file (default, single process)
+* PostgresStore - any PostgreSQL-compatible server through asyncpg, so several
+                  bot replicas can share state and write concurrently
+
+The backend is picked from DATABASE_URL (see create_store). To try the server
+path locally: DATABASE_URL=postgresql://localhost/tap_eat python main.py
+"""
+import asyncio
+import functools
+import os
+import re
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from models import (
+    DELIVERY_COLUMNS, FAVORITE_COLUMNS, OPEN_ORDER_COLUMNS, ORDER_COLUMNS, ORDER_HISTORY_COLUMNS, USER_COLUMNS,
+    DeliveryStop, Favorite, OpenOrder, Order, OrderChange, OrderHistoryEntry, User, many, one,
+)
+
+ARCHIVED_STATUSES = ('delivered', 'rejected', 'expired')
+
+
+def utc_timestamp(dt=None):
+    """Format a UTC datetime the way CURRENT_TIMESTAMP stores it"""
+    return (dt or datetime.utcnow()).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def parse_timestamp(value):
+    """Parse a CURRENT_TIMESTAMP string back into a UTC datetime"""
+    return datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S')
+
+
+# Hourly per-restaurant aggregates kept up to date by every order event
+ROLLUP_FIELDS = (
+    "orders", "items", "order_value", "accepted", "accept_seconds",
+    "delivered", "revenue", "delivered_timed", "delivery_seconds", "cancelled",
+)
+CANCELLED_STATUSES = ('rejected', 'expired')
+
+
+def rollup_delta(event, quantity, total_price, created_at, now):
+    """Counter increments (in ROLLUP_FIELDS order) for an order being placed or changing status"""
+    delta = dict.fromkeys(ROLLUP_FIELDS, 0)
+    age = max(0.0, (now - parse_timestamp(created_at)).total_seconds())
+    if event == 'placed':
+        delta.update(orders=1, items=quantity, order_value=total_price)
+    elif event == 'accepted':
+        delta.update(accepted=1, accept_seconds=age)
+    elif event == 'delivered':
+        delta.update(delivered=1, revenue=total_price, delivered_timed=1, delivery_seconds=age)
+    elif event in CANCELLED_STATUSES:
+        delta.update(cancelled=1)
+    return tuple(delta[field] for field in ROLLUP_FIELDS)
+
+
+# ===================== SCHEMAS =====================
+# Columns added after their table was first created: (table, column, type)
+ADDED_COLUMNS = [
+    ("menu_items", "image", "TEXT"),  # photo URL, or 'telegram' for a photo sent to the bot
+    ("menu_items", "image_file_id", "TEXT"),  # Telegram file_id once uploaded
+]
+
+SQLITE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        phone TEXT,
+        dorm TEXT,
+        block TEXT,
+        room TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS restaurants (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS menu_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        restaurant_id INTEGER,
+        name TEXT,
+        price REAL,
+        is_available BOOLEAN DEFAULT 1,
+        image TEXT,
+        image_file_id TEXT,
+        FOREIGN KEY (restaurant_id) REFERENCES restaurants(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_code TEXT UNIQUE,
+        user_id INTEGER,
+        restaurant_name TEXT,
+        food_name TEXT,
+        quantity INTEGER,
+        total_price REAL,
+        customer_name TEXT,
+        phone TEXT,
+        dorm TEXT,
+        block TEXT,
+        room TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Archived orders - same columns as orders, kept out of the hot table
+    '''
+    CREATE TABLE IF NOT EXISTS orders_archive (
+        id INTEGER PRIMARY KEY,
+        order_code TEXT,
+        user_id INTEGER,
+        restaurant_name TEXT,
+        food_name TEXT,
+        quantity INTEGER,
+        total_price REAL,
+        customer_name TEXT,
+        phone TEXT,
+        dorm TEXT,
+        block TEXT,
+        room TEXT,
+        status TEXT,
+        created_at TIMESTAMP,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # Daily totals of archived orders so stats don't need the archive
+    '''
+    CREATE TABLE IF NOT EXISTS order_summaries (
+        day TEXT,
+        restaurant_name TEXT,
+        status TEXT,
+        order_count INTEGER DEFAULT 0,
+        revenue REAL DEFAULT 0,
+        PRIMARY KEY (day, restaurant_name, status)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, created_at)",
+    # Hourly rollups per restaurant (bucket is 'YYYY-MM-DD HH' in UTC)
+    '''
+    CREATE TABLE IF NOT EXISTS order_rollups (
+        bucket TEXT,
+        restaurant_name TEXT,
+        orders INTEGER DEFAULT 0,
+        items INTEGER DEFAULT 0,
+        order_value REAL DEFAULT 0,
+        accepted INTEGER DEFAULT 0,
+        accept_seconds REAL DEFAULT 0,
+        delivered INTEGER DEFAULT 0,
+        revenue REAL DEFAULT 0,
+        delivered_timed INTEGER DEFAULT 0,
+        delivery_seconds REAL DEFAULT 0,
+        cancelled INTEGER DEFAULT 0,
+        PRIMARY KEY (bucket, restaurant_name)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_orders_archive_user ON orders_archive (user_id, created_at)",
+    # What each user orders, bumped with every order placed ("Order again")
+    '''
+    CREATE TABLE IF NOT EXISTS user_favorites (
+        user_id INTEGER,
+        item_id INTEGER,
+        quantity INTEGER,
+        times_ordered INTEGER DEFAULT 0,
+        last_ordered_at TIMESTAMP,
+        PRIMARY KEY (user_id, item_id)
+    )
+    ''',
+    # Multi-replica coordination (see scaling.py)
+    '''
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT,
+        expires_at REAL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS update_inbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        shard INTEGER,
+        payload TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_update_inbox_shard ON update_inbox (shard, id)",
+    '''
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        user_id INTEGER PRIMARY KEY,
+        data TEXT
+    )
+    ''',
+    # Small key/value settings (e.g. the last handled update_id)
+    '''
+    CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''',
+]
+
+# Timestamps stay TEXT in the same format as SQLite's CURRENT_TIMESTAMP so the
+# handlers (and string comparisons on created_at) behave identically
+PG_NOW = "to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+
+POSTGRES_SCHEMA = [
+    f'''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        phone TEXT,
+        dorm TEXT,
+        block TEXT,
+        room TEXT,
+        created_at TEXT DEFAULT {PG_NOW}
+    )
+    ''',
+    f'''
+    CREATE TABLE IF NOT EXISTS restaurants (
+        id SERIAL PRIMARY KEY,
+        name TEXT UNIQUE,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TEXT DEFAULT {PG_NOW}
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS menu_items (
+        id SERIAL PRIMARY KEY,
+        restaurant_id INTEGER REFERENCES restaurants(id),
+        name TEXT,
+        price DOUBLE PRECISION,
+        is_available BOOLEAN DEFAULT TRUE,
+        image TEXT,
+        image_file_id TEXT
+    )
+    ''',
+    f'''
+    CREATE TABLE IF NOT EXISTS orders (
+        id SERIAL PRIMARY KEY,
+        order_code TEXT UNIQUE,
+        user_id BIGINT,
+        restaurant_name TEXT,
+        food_name TEXT,
+        quantity INTEGER,
+        total_price DOUBLE PRECISION,
+        customer_name TEXT,
+        phone TEXT,
+        dorm TEXT,
+        block TEXT,
+        room TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TEXT DEFAULT {PG_NOW}
+    )
+    ''',
+    f'''
+    CREATE TABLE IF NOT EXISTS orders_archive (
+        id INTEGER PRIMARY KEY,
+        order_code TEXT,
+        user_id BIGINT,
+        restaurant_name TEXT,
+        food_name TEXT,
+        quantity INTEGER,
+        total_price DOUBLE PRECISION,
+        customer_name TEXT,
+        phone TEXT,
+        dorm TEXT,
+        block TEXT,
+        room TEXT,
+        status TEXT,
+        created_at TEXT,
+        archived_at TEXT DEFAULT {PG_NOW}
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS order_summaries (
+        day TEXT,
+        restaurant_name TEXT,
+        status TEXT,
+        order_count INTEGER DEFAULT 0,
+        revenue DOUBLE PRECISION DEFAULT 0,
+        PRIMARY KEY (day, restaurant_name, status)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, created_at)",
+    '''
+    CREATE TABLE IF NOT EXISTS order_rollups (
+        bucket TEXT,
+        restaurant_name TEXT,
+        orders INTEGER DEFAULT 0,
+        items INTEGER DEFAULT 0,
+        order_value DOUBLE PRECISION DEFAULT 0,
+        accepted INTEGER DEFAULT 0,
+        accept_seconds DOUBLE PRECISION DEFAULT 0,
+        delivered INTEGER DEFAULT 0,
+        revenue DOUBLE PRECISION DEFAULT 0,
+        delivered_timed INTEGER DEFAULT 0,
+        delivery_seconds DOUBLE PRECISION DEFAULT 0,
+        cancelled INTEGER DEFAULT 0,
+        PRIMARY KEY (bucket, restaurant_name)
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_orders_archive_user ON orders_archive (user_id, created_at)",
+    '''
+    CREATE TABLE IF NOT EXISTS user_favorites (
+        user_id BIGINT,
+        item_id INTEGER,
+        quantity INTEGER,
+        times_ordered INTEGER DEFAULT 0,
+        last_ordered_at TEXT,
+        PRIMARY KEY (user_id, item_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT,
+        expires_at DOUBLE PRECISION
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS update_inbox (
+        id BIGSERIAL PRIMARY KEY,
+        shard INTEGER,
+        payload TEXT
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_update_inbox_shard ON update_inbox (shard, id)",
+    '''
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        user_id BIGINT PRIMARY KEY,
+        data TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''',
+]
+
+
+# ===================== REPOSITORY =====================
+class Store:
+    """Repository over the bot's tables; subclasses provide the driver primitives"""
+
+    schema = []
+    loop = None  # Event loop the store was connected on (used by the Flask thread)
+
+    # ----- Driver primitives (overridden by backends) -----
+    async def connect(self):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    async def execute(self, sql, params=()):
+        """Run a statement and return the affected row count"""
+        raise NotImplementedError
+
+    async def executemany(self, sql, seq_of_params):
+        raise NotImplementedError
+
+    async def fetchone(self, sql, params=()):
+        raise NotImplementedError
+
+    async def fetchall(self, sql, params=()):
+        raise NotImplementedError
+
+    def transaction(self):
+        """Async context manager yielding a session with the same primitives"""
+        raise NotImplementedError
+
+    def stream(self, sql, params=(), chunk_size=1000):
+        """Async generator of row chunks from a cursor, for results too big for fetchall"""
+        raise NotImplementedError
+
+    def call_threadsafe(self, make_coro, timeout=5):
+        """Run a store coroutine from another thread (e.g. Flask) on the store's loop"""
+        if self.loop is None or not self.loop.is_running():
+            raise RuntimeError("Store is not connected yet")
+        return asyncio.run_coroutine_threadsafe(make_coro(), self.loop).result(timeout)
+
+    # ----- Schema -----
+    async def init_schema(self):
+        async with self.transaction() as tx:
+            for statement in self.schema:
+                await tx.execute(statement)
+        await self.add_missing_columns()
+
+    async def add_missing_columns(self):
+        """Bring tables created by older versions up to date"""
+        for table, column, column_type in ADDED_COLUMNS:
+            try:
+                await self.fetchone(f"SELECT {column} FROM {table} LIMIT 1")
+            except Exception:
+                await self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    async def ping(self):
+        return await self.fetchone("SELECT 1")
+
+    async def get_state(self, key):
+        row = await self.fetchone("SELECT value FROM bot_state WHERE key = ?", (key,))
+        return row[0] if row else None
+
+    async def set_state(self, key, value):
+        await self.execute('''
+            INSERT INTO bot_state (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value
+        ''', (key, value))
+
+    # ----- Users -----
+    async def save_user(self, user_id, username, full_name):
+        """Insert a new user; returns their row, or None if they already existed"""
+        return one(User, await self.fetchone(f'''
+            INSERT INTO users (user_id, username, full_name)
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO NOTHING
+            RETURNING {USER_COLUMNS}
+        ''', (user_id, username or "", full_name)))
+
+    async def get_user(self, user_id):
+        return one(User, await self.fetchone(f"SELECT {USER_COLUMNS} FROM users WHERE user_id = ?", (user_id,)))
+
+    async def save_user_info(self, user_id, username, full_name, phone, dorm, block, room):
+        """Insert or update a user's delivery details; returns the saved row"""
+        return one(User, await self.fetchone(f'''
+            INSERT INTO users (user_id, username, full_name, phone, dorm, block, room)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                full_name = excluded.full_name, phone = excluded.phone,
+                dorm = excluded.dorm, block = excluded.block, room = excluded.room
+            RETURNING {USER_COLUMNS}
+        ''', (user_id, username or "", full_name, phone, dorm, block, room)))
+
+    async def count_users(self):
+        return (await self.fetchone("SELECT COUNT(*) FROM users"))[0]
+
+    # ----- Restaurants -----
+    async def add_restaurant(self, name):
+        row = await self.fetchone(
+            "INSERT INTO restaurants (name) VALUES (?) ON CONFLICT (name) DO NOTHING RETURNING id",
+            (name,)
+        )
+        if row:
+            return row[0]
+        return (await self.fetchone("SELECT id FROM restaurants WHERE name = ?", (name,)))[0]
+
+    async def list_restaurants(self):
+        return await self.fetchall("SELECT id, name FROM restaurants WHERE is_active ORDER BY id")
+
+    async def get_restaurant_name(self, restaurant_id):
+        row = await self.fetchone("SELECT name FROM restaurants WHERE id = ?", (restaurant_id,))
+        return row[0] if row else None
+
+    async def count_restaurants(self):
+        return (await self.fetchone("SELECT COUNT(*) FROM restaurants"))[0]
+
+    # ----- Menu items -----
+    async def add_menu_item(self, restaurant_id, name, price):
+        await self.execute(
+            "INSERT INTO menu_items (restaurant_id, name, price) VALUES (?, ?, ?)",
+            (restaurant_id, name, price)
+        )
+
+    async def list_menu_items(self, restaurant_id):
+        return await self.fetchall(
+            "SELECT id, name, price FROM menu_items WHERE restaurant_id = ? AND is_available ORDER BY id",
+            (restaurant_id,)
+        )
+
+    async def get_menu_item(self, item_id):
+        """Get (name, price, restaurant_id) for a menu item"""
+        return await self.fetchone("SELECT name, price, restaurant_id FROM menu_items WHERE id = ?", (item_id,))
+
+    # ----- Catalog -----
+    async def get_catalog(self, active_only=False):
+        """Every restaurant with its items as (restaurant_id, restaurant_name, is_active,
+        item_id, item_name, price, is_available); item columns are NULL for empty restaurants.
+
+        active_only keeps active restaurants with their available items - still listing those with none"""
+        item_filter = " AND m.is_available" if active_only else ""
+        where = "WHERE r.is_active" if active_only else ""
+        return await self.fetchall(f'''
+            SELECT r.id, r.name, r.is_active, m.id, m.name, m.price, m.is_available
+            FROM restaurants r
+            LEFT JOIN menu_items m ON m.restaurant_id = r.id{item_filter}
+            {where}
+            ORDER BY r.id, m.id
+        ''')
+
+    async def list_item_images(self):
+        """Get (item_id, image, image_file_id) for items that have a photo"""
+        return await self.fetchall(
+            "SELECT id, image, image_file_id FROM menu_items WHERE image IS NOT NULL OR image_file_id IS NOT NULL"
+        )
+
+    async def save_item_file_id(self, item_id, file_id):
+        """Remember the file_id Telegram gave an item photo uploaded from its URL"""
+        await self.execute(
+            "UPDATE menu_items SET image_file_id = ? WHERE id = ? AND image_file_id IS NULL", (file_id, item_id)
+        )
+
+    async def get_catalog_version(self):
+        return int(await self.get_state('catalog_version') or 0)
+
+    async def apply_catalog_changes(self, add_restaurants=(), restaurant_active=(), add_items=(), update_items=(),
+                                    item_images=()):
+        """Apply a batch of catalog edits in one transaction and bump the catalog version.
+
+        add_restaurants: [name]; restaurant_active: [(is_active, restaurant_id)];
+        add_items: [(restaurant_name, item_name, price)];
+        update_items: [(item_name, price, is_available, item_id)];
+        item_images: [(image, image_file_id, item_id)].
+        Returns the new catalog version.
+        """
+        async with self.transaction() as tx:
+            if add_restaurants:
+                await tx.executemany(
+                    "INSERT INTO restaurants (name) VALUES (?) ON CONFLICT (name) DO NOTHING",
+                    [(name,) for name in add_restaurants]
+                )
+            if restaurant_active:
+                await tx.executemany("UPDATE restaurants SET is_active = ? WHERE id = ?", list(restaurant_active))
+            if add_items:
+                restaurant_ids = dict(await tx.fetchall("SELECT name, id FROM restaurants"))
+                await tx.executemany(
+                    "INSERT INTO menu_items (restaurant_id, name, price) VALUES (?, ?, ?)",
+                    [(restaurant_ids[restaurant], name, price) for restaurant, name, price in add_items]
+                )
+            if update_items:
+                await tx.executemany(
+                    "UPDATE menu_items SET name = ?, price = ?, is_available = ? WHERE id = ?",
+                    list(update_items)
+                )
+            if item_images:
+                await tx.executemany(
+                    "UPDATE menu_items SET image = ?, image_file_id = ? WHERE id = ?", list(item_images)
+                )
+            row = await tx.fetchone('''
+                INSERT INTO bot_state (key, value) VALUES ('catalog_version', '1')
+                ON CONFLICT (key) DO UPDATE SET value = CAST(CAST(bot_state.value AS INTEGER) + 1 AS TEXT)
+                RETURNING value
+            ''')
+        return int(row[0])
+
+    # ----- Orders -----
+    async def create_order(self, order_code, user_id, restaurant_name, food_name, quantity,
+                           total_price, customer_name, phone, dorm, block, room, item_id=None, max_open=None):
+        """Insert a pending order and return the full row (item_id also counts it in the user's favorites).
+
+        With max_open, returns None instead when the restaurant already has that many pending or
+        accepted orders - counted in the same transaction, so processes can't overbook it together.
+        Single-process callers leave it out: their in-memory counts already decided.
+        """
+        async with self.transaction() as tx:
+            if max_open is not None:
+                # Row lock on the restaurant: concurrent checkouts for it count one after another
+                await tx.execute("UPDATE restaurants SET name = name WHERE name = ?", (restaurant_name,))
+                row = await tx.fetchone(
+                    "SELECT COUNT(*) FROM orders WHERE restaurant_name = ? AND status IN ('pending', 'accepted')",
+                    (restaurant_name,)
+                )
+                if row[0] >= max_open:
+                    return None
+            order = one(Order, await tx.fetchone(f'''
+                INSERT INTO orders (
+                    order_code, user_id, restaurant_name, food_name,
+                    quantity, total_price, customer_name, phone,
+                    dorm, block, room, status
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending')
+                RETURNING {ORDER_COLUMNS}
+            ''', (order_code, user_id, restaurant_name, food_name, quantity,
+                  total_price, customer_name, phone, dorm, block, room)))
+            await self.record_rollups(tx, [('placed', order.restaurant_name, order.quantity,
+                                            order.total_price, order.created_at)])
+            if item_id is not None:
+                await self.record_favorite(tx, user_id, item_id, quantity, order.created_at)
+        return order
+
+    async def set_order_status(self, order_id, status):
+        """Update an order's status and return (user_id, order_code, customer_name)"""
+        async with self.transaction() as tx:
+            row = await tx.fetchone('''
+                UPDATE orders SET status = ? WHERE id = ? AND status <> ?
+                RETURNING user_id, order_code, customer_name, restaurant_name, quantity, total_price, created_at
+            ''', (status, order_id, status))
+            if row is None:
+                # Unknown order, or already in this status - nothing to count
+                return await tx.fetchone(
+                    "SELECT user_id, order_code, customer_name FROM orders WHERE id = ?", (order_id,)
+                )
+            await self.record_rollups(tx, [(status, *row[3:])])
+        return row[:3]
+
+    async def list_pending_orders(self, limit=10):
+        return many(Order, await self.fetchall(f'''
+            SELECT {ORDER_COLUMNS} FROM orders
+            WHERE status = 'pending'
+            ORDER BY created_at DESC
+            LIMIT ?
+        ''', (limit,)))
+
+    async def list_open_orders_full(self, limit=200):
+        """Get pending and accepted orders with every column, oldest first (kitchen display snapshot)"""
+        return many(Order, await self.fetchall(f'''
+            SELECT {ORDER_COLUMNS} FROM orders
+            WHERE status IN ('pending', 'accepted')
+            ORDER BY created_at
+            LIMIT ?
+        ''', (limit,)))
+
+    async def list_open_order_restaurants(self):
+        """Get (id, restaurant_name) of every pending or accepted order"""
+        return await self.fetchall(
+            "SELECT id, restaurant_name FROM orders WHERE status IN ('pending', 'accepted')"
+        )
+
+    async def list_accepted_orders(self, limit=500):
+        """Get accepted orders waiting for delivery, for planning delivery runs"""
+        return many(DeliveryStop, await self.fetchall(f'''
+            SELECT {DELIVERY_COLUMNS}
+            FROM orders
+            WHERE status = 'accepted'
+            ORDER BY created_at
+            LIMIT ?
+        ''', (limit,)))
+
+    async def set_orders_status(self, order_ids, status, from_statuses):
+        """Move many orders to a new status in a single UPDATE inside one transaction.
+
+        Only orders currently in one of from_statuses change; returns
+        (id, user_id, order_code) for those orders.
+        """
+        if not order_ids:
+            return []
+        marks = ', '.join('?' * len(order_ids))
+        from_marks = ', '.join('?' * len(from_statuses))
+        async with self.transaction() as tx:
+            rows = await tx.fetchall(f'''
+                UPDATE orders SET status = ?
+                WHERE status IN ({from_marks}) AND id IN ({marks})
+                RETURNING id, user_id, order_code, restaurant_name, quantity, total_price, created_at
+            ''', (status,) + tuple(from_statuses) + tuple(order_ids))
+            await self.record_rollups(tx, [(status, *row[3:]) for row in rows])
+        return [OrderChange._make(row[:3]) for row in rows]
+
+    async def list_open_orders(self, limit=30):
+        """Get pending and accepted orders for bulk actions, oldest first"""
+        return many(OpenOrder, await self.fetchall(f'''
+            SELECT {OPEN_ORDER_COLUMNS} FROM orders
+            WHERE status IN ('pending', 'accepted')
+            ORDER BY created_at
+            LIMIT ?
+        ''', (limit,)))
+
+    async def list_pending_orders_since(self, created_after):
+        """Get (id, user_id, order_code, restaurant_name, created_at) for pending orders, oldest first"""
+        return await self.fetchall('''
+            SELECT id, user_id, order_code, restaurant_name, created_at FROM orders
+            WHERE status = 'pending' AND created_at >= ?
+            ORDER BY created_at
+        ''', (created_after,))
+
+    async def filter_pending_orders(self, order_ids):
+        """Return the subset of order_ids still pending"""
+        if not order_ids:
+            return set()
+        marks = ', '.join('?' * len(order_ids))
+        rows = await self.fetchall(
+            f"SELECT id FROM orders WHERE status = 'pending' AND id IN ({marks})", tuple(order_ids)
+        )
+        return {row[0] for row in rows}
+
+    async def expire_orders(self, order_ids):
+        """Expire the given orders if still pending; returns (id, user_id, order_code) of those expired"""
+        return await self.set_orders_status(order_ids, 'expired', ('pending',))
+
+    async def get_order_contact(self, order_id):
+        """Get (phone, customer_name) for an order"""
+        return await self.fetchone("SELECT phone, customer_name FROM orders WHERE id = ?", (order_id,))
+
+    async def get_user_orders_page(self, user_id, page=0, page_size=10):
+        """Get one page of a user's orders, continuing into the archive past recent history"""
+        offset = page * page_size
+        limit = page_size + 1  # One extra row tells us whether there is an older page
+
+        orders = await self.fetchall(f'''
+            SELECT {ORDER_HISTORY_COLUMNS}
+            FROM orders
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+            LIMIT ? OFFSET ?
+        ''', (user_id, limit, offset))
+
+        if len(orders) < limit:
+            # Recent history is exhausted - only now look at the archive
+            hot_count = (await self.fetchone("SELECT COUNT(*) FROM orders WHERE user_id = ?", (user_id,)))[0]
+            orders += await self.fetchall(f'''
+                SELECT {ORDER_HISTORY_COLUMNS}
+                FROM orders_archive
+                WHERE user_id = ?
+                ORDER BY created_at DESC
+                LIMIT ? OFFSET ?
+            ''', (user_id, limit - len(orders), max(0, offset - hot_count)))
+
+        return many(OrderHistoryEntry, orders[:page_size]), len(orders) > page_size
+
+    async def count_orders(self):
+        """Count live plus archived orders"""
+        hot = (await self.fetchone("SELECT COUNT(*) FROM orders"))[0]
+        return hot + (await self.get_archived_totals())[0]
+
+    async def get_archived_totals(self):
+        """Get (orders, delivered, revenue) totals for archived orders from the summaries"""
+        return await self.fetchone('''
+            SELECT COALESCE(SUM(order_count), 0),
+                   COALESCE(SUM(CASE WHEN status = 'delivered' THEN order_count END), 0),
+                   COALESCE(SUM(CASE WHEN status = 'delivered' THEN revenue END), 0)
+            FROM order_summaries
+        ''')
+
+    async def get_stats(self):
+        """Get the admin dashboard numbers, including archived orders"""
+        row = await self.fetchone('''
+            SELECT COUNT(*),
+                   COALESCE(SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), 0),
+                   COALESCE(SUM(CASE WHEN status = 'delivered' THEN 1 ELSE 0 END), 0),
+                   COALESCE(SUM(CASE WHEN status = 'delivered' THEN total_price END), 0)
+            FROM orders
+        ''')
+        order_count, pending_count, delivered_count, revenue = row
+        archived_orders, archived_delivered, archived_revenue = await self.get_archived_totals()
+        return {
+            'users': await self.count_users(),
+            'restaurants': await self.count_restaurants(),
+            'orders': order_count + archived_orders,
+            'pending': pending_count,
+            'delivered': delivered_count + archived_delivered,
+            'revenue': revenue + archived_revenue,
+        }
+
+    async def archive_closed_orders(self, older_than_days):
+        """Move delivered/rejected orders older than the cutoff into orders_archive"""
+        cutoff = utc_timestamp(datetime.utcnow() - timedelta(days=older_than_days))
+        closed = f"status IN ({', '.join('?' * len(ARCHIVED_STATUSES))}) AND created_at < ?"
+        params = (*ARCHIVED_STATUSES, cutoff)
+
+        async with self.transaction() as tx:
+            # Fold the orders into the daily summaries before they leave the hot table
+            await tx.execute(f'''
+                INSERT INTO order_summaries (day, restaurant_name, status, order_count, revenue)
+                SELECT substr(created_at, 1, 10), restaurant_name, status, COUNT(*), COALESCE(SUM(total_price), 0)
+                FROM orders WHERE {closed}
+                GROUP BY substr(created_at, 1, 10), restaurant_name, status
+                ON CONFLICT (day, restaurant_name, status) DO UPDATE SET
+                    order_count = order_summaries.order_count + excluded.order_count,
+                    revenue = order_summaries.revenue + excluded.revenue
+            ''', params)
+            await tx.execute(
+                f"INSERT INTO orders_archive ({ORDER_COLUMNS}) SELECT {ORDER_COLUMNS} FROM orders WHERE {closed}",
+                params
+            )
+            return await tx.execute(f"DELETE FROM orders WHERE {closed}", params)
+
+    # ----- Rollups -----
+    async def record_rollups(self, tx, events):
+        """Fold (event, restaurant_name, quantity, total_price, created_at) events into order_rollups.
+
+        Runs inside the caller's transaction, so the rollups always match the orders table.
+        """
+        if not events:
+            return
+        now = datetime.utcnow()
+        buckets = {}
+        for event, restaurant_name, quantity, total_price, created_at in events:
+            key = (created_at[:13], restaurant_name)
+            delta = rollup_delta(event, quantity, total_price, created_at, now)
+            buckets[key] = tuple(map(sum, zip(buckets[key], delta))) if key in buckets else delta
+
+        columns = ", ".join(ROLLUP_FIELDS)
+        updates = ", ".join(f"{field} = order_rollups.{field} + excluded.{field}" for field in ROLLUP_FIELDS)
+        await tx.executemany(f'''
+            INSERT INTO order_rollups (bucket, restaurant_name, {columns})
+            VALUES (?, ?, {', '.join('?' * len(ROLLUP_FIELDS))})
+            ON CONFLICT (bucket, restaurant_name) DO UPDATE SET {updates}
+        ''', [key + delta for key, delta in buckets.items()])
+
+    async def rebuild_rollups(self):
+        """Recompute order_rollups from live and archived orders (acceptance/delivery times are unknown)"""
+        cancelled = ', '.join(f"'{status}'" for status in CANCELLED_STATUSES)
+        async with self.transaction() as tx:
+            await tx.execute("DELETE FROM order_rollups")
+            await tx.execute(f'''
+                INSERT INTO order_rollups (bucket, restaurant_name, orders, items, order_value, delivered, revenue, cancelled)
+                SELECT substr(created_at, 1, 13), restaurant_name, COUNT(*), SUM(quantity), SUM(total_price),
+                       SUM(CASE WHEN status = 'delivered' THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN status = 'delivered' THEN total_price ELSE 0 END),
+                       SUM(CASE WHEN status IN ({cancelled}) THEN 1 ELSE 0 END)
+                FROM (
+                    SELECT restaurant_name, quantity, total_price, status, created_at FROM orders
+                    UNION ALL
+                    SELECT restaurant_name, quantity, total_price, status, created_at FROM orders_archive
+                ) AS all_orders
+                GROUP BY substr(created_at, 1, 13), restaurant_name
+            ''')
+
+    async def get_rollup_totals(self, since_bucket):
+        """Per-restaurant sums of ROLLUP_FIELDS for buckets from since_bucket on"""
+        sums = ", ".join(f"SUM({field})" for field in ROLLUP_FIELDS)
+        return await self.fetchall(f'''
+            SELECT restaurant_name, {sums} FROM order_rollups
+            WHERE bucket >= ?
+            GROUP BY restaurant_name
+            ORDER BY SUM(orders) DESC
+        ''', (since_bucket,))
+
+    async def get_rollup_hours(self, since_bucket):
+        """Get (hour of day 'HH', orders, revenue) summed over buckets from since_bucket on"""
+        return await self.fetchall('''
+            SELECT substr(bucket, 12, 2), SUM(orders), SUM(revenue) FROM order_rollups
+            WHERE bucket >= ?
+            GROUP BY substr(bucket, 12, 2)
+            ORDER BY substr(bucket, 12, 2)
+        ''', (since_bucket,))
+
+    # ----- Favorites -----
+    async def record_favorite(self, tx, user_id, item_id, quantity, ordered_at):
+        """Count one more order of an item by a user, remembering the quantity they chose last"""
+        await tx.execute('''
+            INSERT INTO user_favorites (user_id, item_id, quantity, times_ordered, last_ordered_at)
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT (user_id, item_id) DO UPDATE SET
+                quantity = excluded.quantity,
+                times_ordered = user_favorites.times_ordered + 1,
+                last_ordered_at = excluded.last_ordered_at
+        ''', (user_id, item_id, quantity, ordered_at))
+
+    async def get_favorites(self, user_id, limit=5):
+        """A user's most ordered items, most recent first among ties"""
+        return many(Favorite, await self.fetchall(f'''
+            SELECT {FAVORITE_COLUMNS} FROM user_favorites
+            WHERE user_id = ?
+            ORDER BY times_ordered DESC, last_ordered_at DESC
+            LIMIT ?
+        ''', (user_id, limit)))
+
+    async def rebuild_favorites(self):
+        """Recompute user_favorites from live and archived orders, matching items by restaurant and name"""
+        async with self.transaction() as tx:
+            await tx.execute("DELETE FROM user_favorites")
+            await tx.execute('''
+                INSERT INTO user_favorites (user_id, item_id, quantity, times_ordered, last_ordered_at)
+                SELECT all_orders.user_id, menu_items.id, CAST(ROUND(AVG(all_orders.quantity)) AS INTEGER),
+                       COUNT(*), MAX(all_orders.created_at)
+                FROM (
+                    SELECT user_id, restaurant_name, food_name, quantity, created_at FROM orders
+                    UNION ALL
+                    SELECT user_id, restaurant_name, food_name, quantity, created_at FROM orders_archive
+                ) AS all_orders
+                JOIN restaurants ON restaurants.name = all_orders.restaurant_name
+                JOIN menu_items ON menu_items.restaurant_id = restaurants.id
+                                AND menu_items.name = all_orders.food_name
+                GROUP BY all_orders.user_id, menu_items.id
+            ''')
+
+    # ----- Exports -----
+    @staticmethod
+    def export_filters(since=None, until=None, restaurant=None, status=None):
+        """WHERE clause and params shared by the export queries"""
+        conditions, params = [], []
+        if since:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until:
+            conditions.append("created_at < ?")
+            params.append(until)
+        if restaurant:
+            conditions.append("LOWER(restaurant_name) LIKE ?")
+            params.append(f"%{restaurant.lower()}%")
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        return " AND ".join(conditions) or "1 = 1", params
+
+    def stream_orders(self, chunk_size=1000, **filters):
+        """Stream archived then live orders matching the filters, chunk by chunk"""
+        where, params = self.export_filters(**filters)
+        return self.stream(f'''
+            SELECT {ORDER_COLUMNS} FROM orders_archive WHERE {where}
+            UNION ALL
+            SELECT {ORDER_COLUMNS} FROM orders WHERE {where}
+        ''', tuple(params) * 2, chunk_size)
+
+    async def get_daily_summaries(self, **filters):
+        """Get (day, restaurant_name, status, order_count, revenue) per day and restaurant.
+
+        Archived orders come from the precomputed order_summaries; only the
+        live orders table is aggregated on the fly.
+        """
+        where, params = self.export_filters(**filters)
+        summary_where = where.replace("created_at", "day")
+        return await self.fetchall(f'''
+            SELECT day, restaurant_name, status, SUM(order_count), SUM(revenue) FROM (
+                SELECT day, restaurant_name, status, order_count, revenue
+                FROM order_summaries WHERE {summary_where}
+                UNION ALL
+                SELECT substr(created_at, 1, 10), restaurant_name, status, COUNT(*), COALESCE(SUM(total_price), 0)
+                FROM orders WHERE {where}
+                GROUP BY substr(created_at, 1, 10), restaurant_name, status
+            ) AS days
+            GROUP BY day, restaurant_name, status
+            ORDER BY day, restaurant_name, status
+        ''', tuple(params) * 2)
+
+    # ----- Leases (multi-replica coordination) -----
+    async def acquire_lease(self, name, holder, ttl, now):
+        """Take or renew a lease; returns True if holder owns it until now + ttl"""
+        row = await self.fetchone('''
+            INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                holder = excluded.holder, expires_at = excluded.expires_at
+            WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            RETURNING holder
+        ''', (name, holder, now + ttl, now))
+        return row is not None
+
+    async def release_lease(self, name, holder):
+        await self.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    async def list_live_leases(self, now):
+        """Get (name, holder) for every unexpired lease"""
+        return await self.fetchall("SELECT name, holder FROM leases WHERE expires_at >= ?", (now,))
+
+    # ----- Update inbox (updates routed to the replica owning their shard) -----
+    async def enqueue_update(self, shard, payload):
+        await self.execute("INSERT INTO update_inbox (shard, payload) VALUES (?, ?)", (shard, payload))
+
+    async def claim_updates(self, shards, limit=100):
+        """Remove and return (id, payload) for the oldest queued updates of the given shards"""
+        if not shards:
+            return []
+        marks = ', '.join('?' * len(shards))
+        rows = await self.fetchall(f'''
+            DELETE FROM update_inbox WHERE id IN (
+                SELECT id FROM update_inbox WHERE shard IN ({marks}) ORDER BY id LIMIT ?
+            )
+            RETURNING id, payload
+        ''', (*shards, limit))
+        return sorted(rows)
+
+    # ----- Conversation state (context.user_data shared between replicas) -----
+    async def get_session(self, user_id):
+        row = await self.fetchone("SELECT data FROM user_sessions WHERE user_id = ?", (user_id,))
+        return row[0] if row else None
+
+    async def save_session(self, user_id, data):
+        await self.execute('''
+            INSERT INTO user_sessions (user_id, data) VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET data = excluded.data
+        ''', (user_id, data))
+
+    async def delete_session(self, user_id):
+        await self.execute("DELETE FROM user_sessions WHERE user_id = ?", (user_id,))
+
+
+# ===================== SQLITE BACKEND =====================
+class _SQLiteSession:
+    """Primitives bound to one sqlite3 connection, run in a worker thread"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def execute(self, sql, params=()):
+        return await asyncio.to_thread(lambda: self.conn.execute(sql, params).rowcount)
+
+    async def executemany(self, sql, seq_of_params):
+        return await asyncio.to_thread(lambda: self.conn.executemany(sql, seq_of_params).rowcount)
+
+    async def fetchone(self, sql, params=()):
+        return await asyncio.to_thread(lambda: self.conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await asyncio.to_thread(lambda: self.conn.execute(sql, params).fetchall())
+
+
+class SQLiteStore(Store):
+    """Store backed by a local SQLite file"""
+
+    schema = SQLITE_SCHEMA
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect_sync(self):
+        """Open a connection to the database file (usable from any thread)"""
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        return conn
+
+    async def connect(self):
+        self.loop = asyncio.get_running_loop()
+        conn = self.connect_sync()
+        # WAL lets readers (handlers, Flask) run while a writer commits
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.close()
+
+    async def close(self):
+        pass
+
+    def _run(self, work):
+        conn = self.connect_sync()
+        try:
+            with conn:
+                return work(conn)
+        finally:
+            conn.close()
+
+    async def execute(self, sql, params=()):
+        return await asyncio.to_thread(self._run, lambda conn: conn.execute(sql, params).rowcount)
+
+    async def executemany(self, sql, seq_of_params):
+        return await asyncio.to_thread(self._run, lambda conn: conn.executemany(sql, seq_of_params).rowcount)
+
+    async def fetchone(self, sql, params=()):
+        return await asyncio.to_thread(self._run, lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await asyncio.to_thread(self._run, lambda conn: conn.execute(sql, params).fetchall())
+
+    @asynccontextmanager
+    async def transaction(self):
+        conn = await asyncio.to_thread(self.connect_sync)
+        try:
+            await asyncio.to_thread(conn.execute, "BEGIN IMMEDIATE")
+            yield _SQLiteSession(conn)
+            await asyncio.to_thread(conn.commit)
+        except BaseException:
+            await asyncio.to_thread(conn.rollback)
+            raise
+        finally:
+            await asyncio.to_thread(conn.close)
+
+    async def stream(self, sql, params=(), chunk_size=1000):
+        conn = await asyncio.to_thread(self.connect_sync)
+        try:
+            cursor = await asyncio.to_thread(conn.execute, sql, params)
+            while True:
+                rows = await asyncio.to_thread(cursor.fetchmany, chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            await asyncio.to_thread(conn.close)
+
+
+# ===================== POSTGRESQL BACKEND =====================
+_PLACEHOLDER = re.compile(r"\?")
+
+
+@functools.lru_cache(maxsize=1024)
+def to_pg_sql(sql):
+    """Rewrite ? placeholders as $1, $2, ... for asyncpg"""
+    counter = iter(range(1, sql.count('?') + 1))
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", sql)
+
+
+def _rowcount(status):
+    """Turn an asyncpg status string ('UPDATE 3') into a row count"""
+    last = status.split()[-1] if status else ''
+    return int(last) if last.isdigit() else 0
+
+
+class _PostgresSession:
+    """Primitives bound to one asyncpg connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def execute(self, sql, params=()):
+        return _rowcount(await self.conn.execute(to_pg_sql(sql), *params))
+
+    async def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        await self.conn.executemany(to_pg_sql(sql), seq_of_params)
+        return len(seq_of_params)
+
+    async def fetchone(self, sql, params=()):
+        row = await self.conn.fetchrow(to_pg_sql(sql), *params)
+        return tuple(row) if row is not None else None
+
+    async def fetchall(self, sql, params=()):
+        return [tuple(row) for row in await self.conn.fetch(to_pg_sql(sql), *params)]
+
+
+class PostgresStore(Store):
+    """Store backed by a PostgreSQL-compatible server through an asyncpg pool"""
+
+    schema = POSTGRES_SCHEMA
+
+    def __init__(self, dsn, min_size=1, max_size=10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = None
+
+    async def connect(self):
+        import asyncpg  # Only needed when a server database is configured
+
+        self.loop = asyncio.get_running_loop()
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def execute(self, sql, params=()):
+        async with self.pool.acquire() as conn:
+            return await _PostgresSession(conn).execute(sql, params)
+
+    async def executemany(self, sql, seq_of_params):
+        async with self.pool.acquire() as conn:
+            return await _PostgresSession(conn).executemany(sql, seq_of_params)
+
+    async def fetchone(self, sql, params=()):
+        async with self.pool.acquire() as conn:
+            return await _PostgresSession(conn).fetchone(sql, params)
+
+    async def fetchall(self, sql, params=()):
+        async with self.pool.acquire() as conn:
+            return await _PostgresSession(conn).fetchall(sql, params)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                yield _PostgresSession(conn)
+
+    async def stream(self, sql, params=(), chunk_size=1000):
+        # Server-side cursor: only chunk_size rows are in memory at a time
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor(to_pg_sql(sql), *params)
+                while True:
+                    rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        break
+                    yield [tuple(row) for row in rows]
+
+
+def create_store(database_file="tap_eat.db"):
+    """Pick the storage backend from DATABASE_URL (PostgreSQL) or fall back to SQLite"""
+    url = os.environ.get("DATABASE_URL", "").strip()
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresStore(url)
+    return SQLiteStore(database_file)
@@ -0,0 +1,23 @@
+import asyncio
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def run_with_store(directory, scenario):
+    """Run the coroutine function scenario(store) against a fresh SQLite store in directory"""
+    from storage import create_store
+
+    async def main():
+        store = create_store(str(directory / "tap_eat.db"))
+        await store.connect()
+        try:
+            await store.init_schema()
+            await store.apply_catalog_changes(add_restaurants=['Grill'], add_items=[('Grill', 'Burger', 5.0)])
+            return await scenario(store)
+        finally:
+            await store.close()
+
+    return asyncio.run(main())
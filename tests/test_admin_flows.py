@@ -0,0 +1,74 @@
+"""Admin bulk-action and delivery-run flows, replayed against replay.py's stand-in Bot API.
+
+The stand-in refuses a second answerCallbackQuery for the same tap like
+Telegram does, so a handler answering twice fails the replay.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+ADMIN = 1  # recording.ADMIN_PSEUDONYM
+
+
+def user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': 'Jane'}
+
+
+def flow_updates():
+    updates = []
+
+    def message(user_id, text):
+        update_id = len(updates) + 1
+        data = {'message_id': update_id, 'date': 0, 'from': user(user_id),
+                'chat': {'id': user_id, 'type': 'private'}, 'text': text}
+        if text.startswith('/'):
+            data['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        updates.append({'update_id': update_id, 'message': data})
+
+    def tap(user_id, callback_data):
+        update_id = len(updates) + 1
+        updates.append({'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'from': user(user_id), 'chat_instance': 'c', 'data': callback_data,
+            'message': {'message_id': 5, 'date': 0, 'chat': {'id': user_id, 'type': 'private'}, 'text': 'menu',
+                        'from': {'id': 999, 'is_bot': True, 'first_name': 'bot'}},
+        }})
+
+    for customer in (5000, 5001, 5002):
+        message(customer, '/start')
+        for callback_data in ('order_food', 'rest_1', 'item_1', 'qty_1_2'):
+            tap(customer, callback_data)
+        for text in ('+1234567890', 'Jane Doe', 'Dorm A', 'B2', '101', '1'):
+            message(customer, text)
+
+    message(ADMIN, '/start')
+    for callback_data in ('admin_panel', 'bulk_orders', 'bulk_accept', 'sel_1', 'sel_2', 'bulk_accept',
+                          'delivery_runs', 'rundone_0', 'rundone_5'):
+        tap(ADMIN, callback_data)
+    return updates
+
+
+def test_bulk_and_delivery_run_taps_are_answered_once(tmp_path):
+    log = tmp_path / 'updates.jsonl'
+    with open(log, 'w') as f:
+        f.write(json.dumps({'recording': 1, 'started': '2026-01-01T00:00:00'}) + '\n')
+        for i, update in enumerate(flow_updates()):
+            f.write(json.dumps({'t': i * 0.01, 'u': update}) + '\n')
+    out = tmp_path / 'result.json'
+
+    env = dict(os.environ, RECORD_UPDATES_FILE=str(tmp_path / 'must-not-record.jsonl'))
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'replay.py'), str(log), '--speed', 'max', '--out', str(out)],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+
+    assert completed.returncode == 0, completed.stdout[-3000:] + completed.stderr[-3000:]
+    with open(out) as f:
+        result = json.load(f)
+    updates = flow_updates()
+    assert result['updates'] == len(updates)
+    assert result['errors'] == {}
+    assert result['api_calls']['answerCallbackQuery'] == sum('callback_query' in update for update in updates)
+    assert not os.path.exists(tmp_path / 'must-not-record.jsonl.key')
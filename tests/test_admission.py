@@ -0,0 +1,75 @@
+import asyncio
+from collections import namedtuple
+
+from admission import ACCEPT, DEFER, QUEUE, AdmissionControl
+
+PlacedOrder = namedtuple('PlacedOrder', 'id restaurant_name')
+
+
+class FakeStore:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = 0
+
+    async def list_open_order_restaurants(self):
+        self.queries += 1
+        return self.rows
+
+
+def make_control(in_flight=0, limit=2, queue=2, prep_minutes=10, rows=None, shared=False):
+    rows = [(order_id, 'Grill') for order_id in range(in_flight)] if rows is None else rows
+    limits = {'Grill': {'limit': limit, 'queue': queue, 'prep_minutes': prep_minutes}}
+    return AdmissionControl(FakeStore(rows), limits=limits, shared=shared)
+
+
+def admit(control, restaurant_name='Grill', checkout=False):
+    return asyncio.run(control.admit(restaurant_name, checkout=checkout))
+
+
+def test_accepts_below_the_limit_with_one_round_eta():
+    assert admit(make_control(in_flight=1)) == (ACCEPT, 1, 10)
+
+
+def test_queues_past_the_limit_with_eta_per_round():
+    assert admit(make_control(in_flight=2)) == (QUEUE, 2, 20)
+    assert admit(make_control(in_flight=3)) == (QUEUE, 3, 20)
+
+
+def test_defers_once_the_queue_is_full():
+    assert admit(make_control(in_flight=4)) == (DEFER, 4, 10)
+    assert admit(make_control(in_flight=6)) == (DEFER, 6, 20)
+
+
+def test_zero_limit_turns_admission_off():
+    control = make_control(in_flight=50, limit=0, shared=True)
+    assert admit(control).decision == ACCEPT
+    assert control.max_open('Grill') is None
+
+
+def test_counts_follow_placed_and_closed_orders():
+    control = make_control(in_flight=0)
+    admit(control)
+    for order_id in (10, 11):
+        control.order_placed(PlacedOrder(order_id, 'Grill'))
+    assert admit(control).decision == QUEUE
+    control.status_changed([10], 'accepted')  # still in the kitchen
+    assert admit(control).decision == QUEUE
+    control.status_changed([10, 11], 'delivered')
+    assert admit(control) == (ACCEPT, 0, 10)
+    assert control.store.queries == 1  # decided from memory between syncs
+
+
+def test_single_process_leaves_the_store_check_out():
+    assert make_control().max_open('Grill') is None
+
+
+def test_checkout_stats_and_refusal_resync():
+    control = make_control(in_flight=0, shared=True)
+    admit(control, checkout=True)
+    assert control.stats['accepted'] == 1
+    assert control.max_open('Grill') == 4
+    # Another process filled the kitchen: the store refuses, the counts reload at once
+    control.store.rows = [(order_id, 'Grill') for order_id in range(4)]
+    assert asyncio.run(control.refused('Grill')).decision == DEFER
+    assert control.stats['refused'] == 1
+    assert control.store.queries == 2
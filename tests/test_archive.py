@@ -0,0 +1,74 @@
+import itertools
+from datetime import datetime, timedelta
+
+from conftest import run_with_store
+from storage import utc_timestamp
+
+ORDER_CODES = itertools.count(1000)
+OLD = utc_timestamp(datetime.utcnow() - timedelta(days=40))
+
+
+async def place(store, user_id, status, created_at, price=5.0, restaurant_name='Grill'):
+    order = await store.create_order(f"T{next(ORDER_CODES)}", user_id, restaurant_name, 'Burger', 1, price,
+                                     'Jane', '+100', 'A', 'B', '')
+    if status != 'pending':
+        await store.set_order_status(order.id, status)
+    await store.execute("UPDATE orders SET created_at = ? WHERE id = ?", (created_at, order.id))
+    return order.id
+
+
+def days_ago(days, minute=0):
+    return utc_timestamp(datetime.utcnow() - timedelta(days=days, minutes=minute))
+
+
+def test_archives_only_old_closed_orders(tmp_path):
+    async def scenario(store):
+        ids = {status: await place(store, 1, status, OLD)
+               for status in ('delivered', 'rejected', 'expired', 'pending', 'accepted')}
+        recent = await place(store, 1, 'delivered', days_ago(1))
+        moved = await store.archive_closed_orders(21)
+        live = {row[0] for row in await store.fetchall("SELECT id FROM orders")}
+        archived = {row[0] for row in await store.fetchall("SELECT id FROM orders_archive")}
+        return ids, recent, moved, live, archived
+
+    ids, recent, moved, live, archived = run_with_store(tmp_path, scenario)
+    assert moved == 3
+    assert archived == {ids['delivered'], ids['rejected'], ids['expired']}
+    assert live == {ids['pending'], ids['accepted'], recent}
+
+
+def test_history_pages_continue_into_the_archive(tmp_path):
+    async def scenario(store):
+        # Newest first: 3 live orders (one still pending), then 4 archived ones
+        newest_first = [await place(store, 7, 'pending', days_ago(0, 1))]
+        newest_first += [await place(store, 7, 'delivered', days_ago(1, minute)) for minute in range(2)]
+        newest_first += [await place(store, 7, 'rejected', days_ago(30, minute)) for minute in range(4)]
+        await place(store, 8, 'delivered', days_ago(30))  # someone else's
+        await store.archive_closed_orders(21)
+        pages = [await store.get_user_orders_page(7, page, page_size=2) for page in range(4)]
+        return newest_first, pages
+
+    newest_first, pages = run_with_store(tmp_path, scenario)
+    assert [[entry.id for entry in entries] for entries, _ in pages] == [
+        newest_first[0:2], newest_first[2:4], newest_first[4:6], newest_first[6:7],
+    ]
+    assert [has_more for _, has_more in pages] == [True, True, True, False]
+
+
+def test_stats_totals_survive_archiving(tmp_path):
+    async def scenario(store):
+        for price in (5.0, 7.5):
+            await place(store, 1, 'delivered', OLD, price=price)
+        await place(store, 2, 'rejected', OLD, price=9.0)
+        await place(store, 2, 'expired', OLD, price=3.0)
+        await place(store, 3, 'pending', OLD, price=4.0)
+        await place(store, 3, 'delivered', days_ago(1), price=2.0)
+        before = (await store.get_stats(), await store.count_orders(), await store.get_daily_summaries())
+        await store.archive_closed_orders(21)
+        after = (await store.get_stats(), await store.count_orders(), await store.get_daily_summaries())
+        return before, after, await store.get_archived_totals()
+
+    before, after, archived_totals = run_with_store(tmp_path, scenario)
+    assert after == before
+    assert before[0]['orders'] == 6 and before[0]['delivered'] == 3 and before[0]['revenue'] == 14.5
+    assert tuple(archived_totals) == (4, 2, 12.5)
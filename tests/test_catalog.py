@@ -0,0 +1,23 @@
+from catalog import CatalogCache
+from conftest import run_with_store
+
+
+def test_active_restaurant_without_available_items_is_still_listed(tmp_path):
+    async def scenario(store):
+        await store.apply_catalog_changes(add_restaurants=['Cafe', 'Closed'],
+                                          add_items=[('Cafe', 'Latte', 4.0), ('Closed', 'Tea', 2.0)])
+        rows = {row[1]: row for row in await store.get_catalog()}
+        await store.apply_catalog_changes(
+            update_items=[('Latte', 4.0, False, rows['Cafe'][3])],
+            restaurant_active=[(False, rows['Closed'][0])],
+        )
+        catalog = CatalogCache(store)
+        await catalog.refresh()
+        return catalog
+
+    catalog = run_with_store(tmp_path, scenario)
+    names = {restaurant_id: name for restaurant_id, name in catalog.restaurants}
+    assert sorted(names.values()) == ['Cafe', 'Grill']
+    menus = {names[restaurant_id]: [item.name for item in items] for restaurant_id, items in catalog.menus.items()}
+    assert menus == {'Grill': ['Burger'], 'Cafe': []}
+    assert None not in catalog.items
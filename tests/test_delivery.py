@@ -0,0 +1,26 @@
+from delivery import plan_delivery_runs, room_sort_key
+from models import DeliveryStop
+
+
+def stop(order_id, restaurant_name='Grill', dorm='A', block='1', room='101'):
+    return DeliveryStop(order_id, 1000 + order_id, f"T{order_id}", restaurant_name, 'Burger', 1, dorm, block, room)
+
+
+def test_rooms_sort_naturally():
+    assert sorted(['10A', '2B', 'lobby', '2A'], key=room_sort_key) == ['2A', '2B', '10A', 'lobby']
+
+
+def test_runs_group_by_building_and_restaurant():
+    runs = plan_delivery_runs([
+        stop(1, dorm='B'), stop(2), stop(3, restaurant_name='Cafe'), stop(4, dorm=' a ', room='12'),
+    ])
+    assert [(run.dorm, run.restaurant_name, [o.id for o in run.orders]) for run in runs] == [
+        ('A', 'Cafe', [3]),
+        ('A', 'Grill', [4, 2]),  # ' a ' is the same building; room 12 comes before 101
+        ('B', 'Grill', [1]),
+    ]
+
+
+def test_runs_are_capped_at_the_batch_size():
+    runs = plan_delivery_runs([stop(i, room=str(i)) for i in range(1, 8)], batch_size=3)
+    assert [[o.id for o in run.orders] for run in runs] == [[1, 2, 3], [4, 5, 6], [7]]
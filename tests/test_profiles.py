@@ -0,0 +1,37 @@
+import asyncio
+
+from profiles import ProfileCache
+
+
+class CountingStore:
+    def __init__(self):
+        self.users = {}
+        self.calls = []
+
+    async def get_user(self, user_id):
+        self.calls.append('get_user')
+        return self.users.get(user_id)
+
+    async def save_user(self, user_id, username, full_name):
+        self.calls.append('save_user')
+        if user_id in self.users:
+            return None
+        self.users[user_id] = (user_id, username, full_name)
+        return self.users[user_id]
+
+
+def test_returning_user_costs_one_read_after_the_ttl():
+    store = CountingStore()
+    store.users[1] = (1, 'jane', 'Jane')
+    cache = ProfileCache(store, ttl=0)  # every entry already expired
+    asyncio.run(cache.save_user(1, 'jane', 'Jane'))
+    assert store.calls == ['get_user']
+
+
+def test_new_user_is_inserted_then_cached():
+    store = CountingStore()
+    cache = ProfileCache(store)
+    asyncio.run(cache.save_user(2, 'sam', 'Sam'))
+    asyncio.run(cache.save_user(2, 'sam', 'Sam'))
+    assert store.calls == ['get_user', 'save_user']
+    assert store.users[2] == (2, 'sam', 'Sam')
@@ -0,0 +1,31 @@
+import asyncio
+import threading
+import time
+
+from profiling import MONITOR_THREAD, LoopMonitor
+
+
+def watchers():
+    return sum(thread.name == MONITOR_THREAD for thread in threading.enumerate())
+
+
+def test_monitor_restarts_on_a_new_event_loop():
+    monitor = LoopMonitor(threshold_ms=20, tick=0.005)
+
+    async def run(block_seconds):
+        monitor.start()
+        monitor.start()  # a second job on the same loop is a no-op
+        await asyncio.sleep(0.05)
+        time.sleep(block_seconds)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run(0))
+    time.sleep(0.05)
+    assert not monitor.metrics()['running']
+    before = watchers()
+
+    # Like main()'s restart loop after a crash: a fresh asyncio.run
+    asyncio.run(run(0.1))
+    assert monitor.stats['stalls'] == 1
+    time.sleep(0.05)
+    assert watchers() <= before
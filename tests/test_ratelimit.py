@@ -0,0 +1,68 @@
+import asyncio
+
+from telegram.ext import ApplicationHandlerStop
+
+from ratelimit import RateLimiter
+
+
+def test_burst_then_throttled():
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.allow(1, now=0.0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_refills_at_rate_up_to_burst():
+    limiter = RateLimiter(rate=2, burst=3)
+    for _ in range(3):
+        limiter.allow(1, now=0.0)
+    assert limiter.allow(1, now=0.5)  # one token back after 1/rate seconds
+    assert not limiter.allow(1, now=0.5)
+    # A long pause refills to the burst, not beyond it
+    assert [limiter.allow(1, now=100.0) for _ in range(4)] == [True, True, True, False]
+
+
+def test_buckets_are_per_user():
+    limiter = RateLimiter(rate=1, burst=1)
+    assert limiter.allow(1, now=0.0)
+    assert not limiter.allow(1, now=0.0)
+    assert limiter.allow(2, now=0.0)
+
+
+def test_sweep_drops_only_refilled_buckets():
+    limiter = RateLimiter(rate=2, burst=4)  # full again 2 s after the last update
+    limiter.allow(1, now=0.0)
+    limiter.allow(2, now=1.5)
+    assert limiter.sweep(now=2.0) == 1
+    assert list(limiter.buckets) == [2]
+    assert limiter.stats['evicted'] == 1
+
+
+class FakeQuery:
+    def __init__(self):
+        self.answers = []
+
+    async def answer(self, text=None):
+        self.answers.append(text)
+
+
+class FakeUpdate:
+    def __init__(self, user_id, query):
+        self.effective_user = type('User', (), {'id': user_id})()
+        self.callback_query = query
+        self.message = None
+
+
+def test_every_throttled_tap_is_answered_but_noticed_once():
+    limiter = RateLimiter(rate=0.001, burst=1)
+    query = FakeQuery()
+
+    async def taps(count):
+        for _ in range(count):
+            try:
+                await limiter.check(FakeUpdate(1, query), None)
+            except ApplicationHandlerStop:
+                pass
+
+    asyncio.run(taps(4))
+    assert query.answers == ["⏳ Slow down a little!", None, None]
+    assert limiter.stats['throttled_callbacks'] == 3
+    assert limiter.stats['notices_sent'] == 1
@@ -0,0 +1,65 @@
+import asyncio
+
+from sessions import IdleSessions
+
+
+class FakeApplication:
+    def __init__(self):
+        self.dropped = []
+
+    def drop_user_data(self, user_id):
+        self.dropped.append(user_id)
+
+
+class FakeContext:
+    def __init__(self):
+        self.application = FakeApplication()
+
+
+def run_ticks(wheel, context, ticks):
+    for _ in range(ticks):
+        asyncio.run(wheel.tick_job(context))
+
+
+def test_idle_user_evicted_after_one_turn():
+    wheel = IdleSessions(idle_seconds=40, slots=4)
+    wheel.touch(1)
+    assert wheel.advance() == [] and wheel.advance() == [] and wheel.advance() == []
+    assert wheel.advance() == [1]
+    assert wheel.last_seen == {}
+
+
+def test_active_user_moves_to_the_slot_of_their_last_update():
+    wheel = IdleSessions(idle_seconds=40, slots=4)
+    wheel.touch(1)
+    wheel.advance()
+    wheel.advance()
+    wheel.touch(1)  # seen at tick 2
+    assert wheel.advance() == []
+    assert wheel.advance() == []  # slot 0 comes due: user 1 moves to slot 2
+    assert wheel.stats['moved'] == 1
+    assert wheel.advance() == []
+    assert wheel.advance() == [1]  # tick 6: one full turn after tick 2
+
+
+def test_tick_job_drops_idle_sessions():
+    wheel = IdleSessions(idle_seconds=40, slots=4)
+    context = FakeContext()
+    wheel.touch(1)
+    wheel.touch(2)
+    run_ticks(wheel, context, 4)
+    assert sorted(context.application.dropped) == [1, 2]
+    assert wheel.stats['evicted'] == 2
+
+
+def test_users_of_other_replicas_are_never_dropped():
+    wheel = IdleSessions(idle_seconds=40, slots=4)
+    context = FakeContext()
+    for user_id in range(6):
+        wheel.touch(user_id)
+    wheel.forget_users(lambda user_id: user_id % 2 == 0)  # their shard moved away
+    assert sorted(wheel.last_seen) == [1, 3, 5]
+    wheel.owns = lambda user_id: user_id != 5  # and 5's shard expired without a release
+    run_ticks(wheel, context, 4)
+    assert sorted(context.application.dropped) == [1, 3]
+    assert wheel.last_seen == {}
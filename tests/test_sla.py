@@ -0,0 +1,58 @@
+import asyncio
+
+from sla import EXPIRE, REMIND, OrderDeadlines
+
+
+class FakeJob:
+    def schedule_removal(self):
+        pass
+
+
+class FakeJobQueue:
+    def run_once(self, callback, when, name=None):
+        return FakeJob()
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, reply_markup=None):
+        self.sent.append((chat_id, text))
+
+
+class FailingStore:
+    async def expire_orders(self, order_ids):
+        raise RuntimeError("database is locked")
+
+    async def filter_pending_orders(self, order_ids):
+        raise RuntimeError("database is locked")
+
+
+class FakeContext:
+    def __init__(self):
+        self.bot = FakeBot()
+
+
+def make_deadlines(store):
+    deadlines = OrderDeadlines(store, admin_id=1, remind_after=60, expire_after=120)
+    deadlines.job_queue = FakeJobQueue()
+    # Placed long ago: both deadlines are due
+    deadlines.track(7, 100, 'TAP7', 'Grill', '2020-01-01 00:00:00')
+    return deadlines
+
+
+def test_failed_expiry_and_reminder_stay_on_the_heap():
+    deadlines = make_deadlines(FailingStore())
+    asyncio.run(deadlines._on_due(FakeContext()))
+    assert 7 in deadlines.pending
+    assert sorted((order_id, stage) for _, order_id, stage in deadlines.heap) == [(7, EXPIRE), (7, REMIND)]
+
+
+def test_reminder_skips_orders_resolved_meanwhile():
+    deadlines = make_deadlines(FailingStore())
+    deadlines.resolve(7)
+    bot = FakeBot()
+    asyncio.run(deadlines._remind(bot, [7]))
+    assert bot.sent == []
+    assert deadlines.stats['reminded'] == 0
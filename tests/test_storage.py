@@ -0,0 +1,31 @@
+from conftest import run_with_store
+from storage import to_pg_sql
+
+
+def test_to_pg_sql_numbers_placeholders_in_order():
+    assert to_pg_sql("SELECT * FROM orders WHERE id = ? AND status IN (?, ?)") == (
+        "SELECT * FROM orders WHERE id = $1 AND status IN ($2, $3)"
+    )
+    assert to_pg_sql("SELECT 1") == "SELECT 1"
+
+
+def test_to_pg_sql_is_cached():
+    to_pg_sql.cache_clear()
+    to_pg_sql("UPDATE orders SET status = ? WHERE id = ?")
+    to_pg_sql("UPDATE orders SET status = ? WHERE id = ?")
+    assert to_pg_sql.cache_info().hits == 1
+
+
+def test_create_order_refuses_past_max_open(tmp_path):
+    async def scenario(store):
+        def checkout(code):
+            return store.create_order(code, 1, 'Grill', 'Burger', 1, 5.0, 'Jane', '+100', 'A', 'B', '', max_open=2)
+
+        placed = [await checkout(f"T{i}") for i in range(3)]
+        await store.set_order_status(placed[0].id, 'delivered')
+        return placed, await checkout("T9"), await store.list_open_order_restaurants()
+
+    placed, reopened, open_orders = run_with_store(tmp_path, scenario)
+    assert [order is not None for order in placed] == [True, True, False]
+    assert reopened is not None and reopened.status == 'pending'
+    assert sorted(order_id for order_id, _ in open_orders) == [placed[1].id, reopened.id]
@@ -0,0 +1,99 @@
+"""Web server for Railway: landing page, /health and operational endpoints.
+
+Imported by runtime.start_web_server() in its own thread, so Flask never sits
+on the bot's startup path.
+"""
+from datetime import datetime
+
+from flask import Flask, Response, abort, request
+
+from kitchen import KITCHEN_KEY, KITCHEN_PAGE, KITCHEN_SNAPSHOT_LIMIT
+from profiling import PROFILE_KEY, folded, sample_stacks
+
+import runtime
+
+# ===================== WEB SERVER FOR RAILWAY =====================
+app = Flask(__name__)
+
+@app.route('/')
+def home():
+    """Health check endpoint - root"""
+    store = runtime.store
+    try:
+        user_count = store.call_threadsafe(store.count_users)
+        order_count = store.call_threadsafe(store.count_orders)
+        return Response(
+            f"🤖 TAP&EAT Bot is running!\n\n👥 Users: {user_count}\n📦 Orders: {order_count}\n✅ Status: Online",
+            status=200,
+            mimetype='text/plain'
+        )
+    except Exception as e:
+        print(f"Health check error: {e}")
+        return Response(
+            "🤖 TAP&EAT Bot is running!\n⚠️ Database connection issue",
+            status=200,
+            mimetype='text/plain'
+        )
+
+@app.route('/workers')
+def workers_status():
+    """Per-worker metrics when running with WORKER_PROCESSES"""
+    if runtime.worker_pool is None:
+        return {"workers": []}, 200
+    return {"workers": runtime.worker_pool.metrics()}, 200
+
+@app.route('/metrics')
+def metrics():
+    """Counters and timings registered in runtime.metrics"""
+    return {name: collect() for name, collect in runtime.metrics.items()}, 200
+
+def check_kitchen_key():
+    # The display shows customer names and rooms - keep it behind KITCHEN_KEY
+    if not KITCHEN_KEY or request.args.get('key') != KITCHEN_KEY:
+        abort(404)
+
+@app.route('/kitchen')
+def kitchen_page():
+    """Live kitchen display"""
+    check_kitchen_key()
+    return Response(KITCHEN_PAGE, mimetype='text/html')
+
+@app.route('/kitchen/events')
+def kitchen_events():
+    """Server-Sent Events: open orders snapshot, then new orders and status changes"""
+    check_kitchen_key()
+    store = runtime.store
+    stream = runtime.kitchen.stream(
+        lambda: store.call_threadsafe(lambda: store.list_open_orders_full(KITCHEN_SNAPSHOT_LIMIT))
+    )
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/profile')
+def profile():
+    """Folded stacks from a sampling run of ?seconds= (default 10), for flame graphs"""
+    if not PROFILE_KEY or request.args.get('key') != PROFILE_KEY:
+        abort(404)
+    try:
+        seconds = float(request.args.get('seconds', 10))
+    except ValueError:
+        return {"error": "seconds must be a number"}, 400
+    return Response(folded(sample_stacks(seconds, loop=runtime.store.loop)), mimetype='text/plain')
+
+@app.route('/health')
+def health():
+    """Health check endpoint for Railway"""
+    if not runtime.ready.is_set():
+        # Railway keeps retrying until we are actually able to take updates
+        return {"status": "starting", "service": "tap-eat-bot"}, 503
+    try:
+        runtime.store.call_threadsafe(runtime.store.ping)
+        return {"status": "healthy", "service": "tap-eat-bot", "timestamp": datetime.now().isoformat()}, 200
+    except Exception as e:
+        print(f"Health check error: {e}")
+        return {"status": "unhealthy", "error": str(e)}, 500
+
+def run_flask(port):
+    """Run Flask server (called from the web thread)"""
+    print(f"🌐 Starting Flask server on port {port}...")
+    app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
@@ -0,0 +1,193 @@
+"""Multi-process worker pool for TAP&EAT.
+
+With WORKER_PROCESSES=N the main process becomes a lightweight front: it
+long-polls getUpdates itself and hands each update to worker
+user_id % N over a bounded multiprocessing queue. Every worker is a full
+Application (same handlers as boot.py) on its own core, sharing the store
+(SQLite in WAL mode, or PostgreSQL via DATABASE_URL).
+
+* Ordering  - a user's updates always go to the same worker, which handles
+              them one at a time.
+* Backpressure - when a worker's queue is full the front stops polling;
+              Telegram keeps the backlog until we ask for it.
+* Shutdown  - the front stops polling, confirms the last offset, sends each
+              worker a sentinel and waits for it to drain its queue.
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+from telegram import Bot, Update
+from telegram.error import TelegramError
+
+import runtime
+from kitchen import KITCHEN_BACKLOG
+from scaling import shard_for
+
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", 0))
+WORKER_QUEUE_SIZE = int(os.environ.get("WORKER_QUEUE_SIZE", 100))
+WORKER_STOP_TIMEOUT = float(os.environ.get("WORKER_STOP_TIMEOUT", 30))
+POLL_TIMEOUT = 5
+
+
+class WorkerPool:
+    """Front-side handle on the worker processes and their queues"""
+
+    def __init__(self, size, queue_size=WORKER_QUEUE_SIZE, recorder=None):
+        # spawn, not fork: the front already runs Flask and asyncio threads
+        ctx = multiprocessing.get_context("spawn")
+        self.size = size
+        self.queues = [ctx.Queue(maxsize=queue_size) for _ in range(size)]
+        # Each worker only writes its own slot, so no locks are needed
+        self.processed = ctx.Array('q', size, lock=False)
+        self.errors = ctx.Array('q', size, lock=False)
+        self.busy_ms = ctx.Array('q', size, lock=False)
+        # Kitchen display events from the workers, replayed into the front's feed
+        self.kitchen_events = ctx.Queue(maxsize=KITCHEN_BACKLOG)
+        self.dispatched = [0] * size
+        self.blocked_seconds = [0.0] * size
+        self.processes = [
+            ctx.Process(
+                target=worker_main,
+                args=(index, self.queues[index], self.processed, self.errors, self.busy_ms, self.kitchen_events),
+                name=f"tap-eat-worker-{index}",
+                daemon=True
+            )
+            for index in range(size)
+        ]
+        self.stopping = False
+        self.recorder = recorder  # recording.UpdateRecorder, when RECORD_UPDATES_FILE is set
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        threading.Thread(
+            target=runtime.kitchen.forward_from, args=(self.kitchen_events,), name="kitchen-events", daemon=True
+        ).start()
+        print(f"👷 Started {self.size} worker processes")
+
+    def _put(self, index, payload):
+        """Blocking put that gives up if the worker died or we're stopping"""
+        while True:
+            try:
+                self.queues[index].put(payload, timeout=1)
+                return True
+            except queue.Full:
+                if self.stopping or not self.processes[index].is_alive():
+                    return False
+
+    async def dispatch(self, update):
+        """Queue an update for the worker owning its user; waits while that queue is full"""
+        if self.recorder:
+            await self.recorder.record(update)
+        user = update.effective_user
+        index = shard_for(user.id if user else 0, self.size)
+        started = time.perf_counter()
+        if await asyncio.to_thread(self._put, index, update.to_dict()):
+            self.dispatched[index] += 1
+        else:
+            print(f"⚠️ Dropped update {update.update_id}: worker {index} unavailable")
+        self.blocked_seconds[index] += time.perf_counter() - started
+
+    async def run_front(self, token, stop_event):
+        """Long-poll Telegram and dispatch updates until stop_event is set"""
+        offset = None
+        async with Bot(token) as bot:
+            while not stop_event.is_set():
+                try:
+                    updates = await bot.get_updates(
+                        offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES
+                    )
+                except TelegramError as e:
+                    print(f"⚠️ getUpdates failed: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for update in updates:
+                    await self.dispatch(update)
+                    offset = update.update_id + 1
+            if offset is not None:
+                # Confirm what we already handed out so it isn't delivered again
+                await bot.get_updates(offset=offset, timeout=0)
+
+    def stop(self, timeout=WORKER_STOP_TIMEOUT):
+        """Let every worker drain its queue, then stop it"""
+        self.stopping = True
+        for index in range(self.size):
+            self._put(index, None)
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"⚠️ {process.name} did not stop in time, terminating")
+                process.terminate()
+        self.kitchen_events.put(None)
+        print("👷 Worker processes stopped")
+
+    def metrics(self):
+        """Per-worker counters for the /workers endpoint"""
+        stats = []
+        for index, process in enumerate(self.processes):
+            try:
+                queued = self.queues[index].qsize()
+            except NotImplementedError:  # macOS
+                queued = None
+            stats.append({
+                "worker": index,
+                "alive": process.is_alive(),
+                "queued": queued,
+                "dispatched": self.dispatched[index],
+                "processed": self.processed[index],
+                "errors": self.errors[index],
+                "busy_seconds": round(self.busy_ms[index] / 1000, 3),
+                "blocked_seconds": round(self.blocked_seconds[index], 3),
+            })
+        return stats
+
+
+def worker_main(index, updates, processed, errors, busy_ms, kitchen_events):
+    """Worker process entry point"""
+    # The front handles Ctrl+C/SIGTERM and tells us to stop via the queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    runtime.kitchen.forward = kitchen_events
+    asyncio.run(_worker_loop(index, updates, processed, errors, busy_ms))
+
+
+async def _worker_loop(index, updates, processed, errors, busy_ms):
+    import boot  # Imported here so the front never loads handlers it doesn't run
+
+    # Only the first worker runs scheduled jobs
+    application = boot.build_application(schedule_jobs=(index == 0), with_updater=False)
+
+    async def count_error(update, context):
+        # process_update hands handler exceptions to the error handlers instead of raising them
+        errors[index] += 1
+        update_id = update.update_id if isinstance(update, Update) else None
+        print(f"❌ Worker {index} failed on update {update_id}: {context.error}")
+
+    application.add_error_handler(count_error)
+    await boot.init_database()
+    loop = asyncio.get_running_loop()
+    try:
+        async with application:
+            await application.start()
+            print(f"👷 Worker {index} ready (pid {os.getpid()})")
+            while True:
+                payload = await loop.run_in_executor(None, updates.get)
+                if payload is None:
+                    break
+                started = time.perf_counter()
+                try:
+                    await application.process_update(Update.de_json(payload, application.bot))
+                except Exception as e:
+                    errors[index] += 1
+                    print(f"❌ Worker {index} failed on update {payload.get('update_id')}: {e}")
+                processed[index] += 1
+                busy_ms[index] += int((time.perf_counter() - started) * 1000)
+            await application.stop()
+    finally:
+        await boot.store.close()